@@ -0,0 +1,11 @@
+"""Sinh dữ liệu giả lập và đo tải cho cửa hàng.
+
+Chạy trên một CSDL test riêng (không đụng ``db.sqlite3``)::
+
+    python -m benchmarks --products 100000 --cart-items 1000000 --output bench.json
+    python -m benchmarks --baseline bench.json          # so sánh với lần chạy trước
+    python -m benchmarks --asgi --concurrency 32        # một worker ASGI: view đồng bộ và async
+
+Kết quả là JSON: với mỗi kịch bản có p50/p95/p99 (ms), số request/giây và số
+truy vấn SQL trung bình mỗi request.
+"""
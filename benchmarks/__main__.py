@@ -0,0 +1,130 @@
+"""Dòng lệnh: ``python -m benchmarks [tùy chọn]`` (xem ``--help``)."""
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description=__doc__)
+    parser.add_argument('--categories', type=int, default=50)
+    parser.add_argument('--products', type=int, default=100_000)
+    parser.add_argument('--cart-items', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=200, help='Số request mỗi kịch bản')
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Số luồng gửi request (với --asgi: số request đồng thời)')
+    parser.add_argument('--asgi', action='store_true',
+                        help='Gửi request qua ứng dụng ASGI trong một event loop, đo cả view '
+                             'đồng bộ lẫn view async (kết quả "sync:<kịch bản>", "async:<kịch bản>")')
+    parser.add_argument('--scenario', action='append',
+                        help='Chỉ chạy kịch bản này (lặp lại để chọn nhiều)')
+    parser.add_argument('--database', metavar='FILE',
+                        help='File SQLite cho CSDL benchmark; dùng lại dữ liệu nếu đã có '
+                             '(mặc định: CSDL trong bộ nhớ, sinh lại mỗi lần)')
+    parser.add_argument('--no-page-cache', action='store_true',
+                        help='Tắt cache trang catalog để đo đường đi qua CSDL')
+    parser.add_argument('--profile-templates', action='store_true',
+                        help='Sau khi đo, chạy lại mỗi kịch bản trong một luồng và ghi thời gian '
+                             'render theo template/thẻ/biến (kết quả "template_profile")')
+    parser.add_argument('--output', metavar='FILE', help='Ghi kết quả JSON ra file (mặc định stdout)')
+    parser.add_argument('--baseline', metavar='FILE', help='So sánh với kết quả JSON trước đó')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='Phần trăm xấu đi tối đa so với baseline trước khi báo lỗi')
+    return parser.parse_args(argv)
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vegetable_store.settings')
+    if args.asgi:
+        # Như vegetable_store/asgi.py: không giữ kết nối CSDL giữa các request
+        os.environ['DJANGO_ASGI'] = '1'
+    import django
+    django.setup()
+
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import override_settings, setup_test_environment
+
+    from benchmarks import asgi, data, load
+    from products.models import Product
+
+    setup_test_environment(debug=False)
+    if args.database:
+        settings.DATABASES['default'].setdefault('TEST', {})['NAME'] = args.database
+    overrides = {}
+    if args.no_page_cache:
+        overrides['CACHES'] = dict(settings.CACHES, catalog={
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache',
+        })
+    # Không ghi cảnh báo "vượt ngân sách" cho mỗi request
+    overrides['QUERY_BUDGETS'] = {}
+
+    old_name = connection.creation.create_test_db(verbosity=0, keepdb=bool(args.database))
+    try:
+        with override_settings(**overrides):
+            if not Product.objects.exists():
+                started = time.perf_counter()
+                counts = data.generate(
+                    categories=args.categories, products=args.products,
+                    cart_items=args.cart_items, seed=args.seed, log=log,
+                )
+                log(f'Sinh dữ liệu trong {time.perf_counter() - started:.1f}s: {counts}')
+            scenarios = load.default_scenarios(seed=args.seed)
+            if args.scenario:
+                scenarios = [s for s in scenarios if s.name in args.scenario]
+            if args.asgi:
+                results = asgi.run(scenarios, args.requests, args.concurrency, args.seed, log=log)
+            else:
+                results = load.run(scenarios, args.requests, args.concurrency, args.seed, log=log)
+            profiles = None
+            if args.profile_templates:
+                profiles = load.profile_scenarios(scenarios, min(args.requests, 50), args.seed, log=log)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=bool(args.database))
+
+    report = {
+        'meta': {
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'server': 'asgi' if args.asgi else 'wsgi',
+            'seed': args.seed,
+            'page_cache': not args.no_page_cache,
+            'dataset': {
+                'categories': args.categories, 'products': args.products, 'cart_items': args.cart_items,
+            },
+        },
+        'results': results,
+    }
+    if profiles is not None:
+        report['template_profile'] = profiles
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        deltas, regressions = load.compare(results, baseline.get('results', {}), args.threshold)
+        report['baseline'] = {'file': args.baseline, 'delta_percent': deltas, 'regressions': regressions}
+        for line in regressions:
+            log('Xấu đi: ' + line)
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+    return exit_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""Đo tải qua ``ASGIHandler`` trong một event loop, như một worker uvicorn.
+
+Mỗi kịch bản của ``load.default_scenarios`` chạy hai lần trên cùng ứng dụng
+ASGI: với view đồng bộ (``vegetable_store.urls``, Django đẩy mỗi request sang
+thread) và với view async (``vegetable_store.urls_async``). ``concurrency`` là
+số request đang xử lý cùng lúc trên event loop; ngoài p50/p95/rps, kết quả có
+``peak_threads`` là số thread lớn nhất của tiến trình trong lúc đo.
+"""
+import asyncio
+import random
+import threading
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.middleware.csrf import CSRF_SECRET_LENGTH
+from django.test.utils import override_settings
+from django.utils.crypto import get_random_string
+
+from vegetable_store.querystats import registry
+from .load import summarize
+
+URLCONFS = {
+    'sync': 'vegetable_store.urls',
+    'async': 'vegetable_store.urls_async',
+}
+
+
+class AsgiClient:
+    """Client tối giản gửi request HTTP thẳng vào ứng dụng ASGI, giữ cookie.
+
+    Khác ``django.test.Client``, request đi qua kiểm tra CSRF thật nên client tự
+    đặt cookie CSRF và gửi lại nó trong header.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.cookies = SimpleCookie()
+        self.csrf_token = get_random_string(CSRF_SECRET_LENGTH)
+        self.cookies[settings.CSRF_COOKIE_NAME] = self.csrf_token
+
+    def build_scope(self, method, url, data, extra):
+        path, _, query = url.partition('?')
+        content_type = extra.pop('content_type', None)
+        body = b''
+        if method == 'get' and data:
+            query = '&'.join(filter(None, [query, urlencode(data, doseq=True)]))
+        elif data is not None:
+            if isinstance(data, str):
+                body = data.encode('utf-8')
+            else:
+                body = urlencode(data, doseq=True).encode('utf-8')
+                content_type = content_type or 'application/x-www-form-urlencoded'
+
+        headers = [(b'host', b'testserver')]
+        if method != 'get':
+            extra.setdefault(settings.CSRF_HEADER_NAME, self.csrf_token)
+        for key, value in extra.items():
+            if key.startswith('HTTP_'):
+                headers.append((key[5:].replace('_', '-').lower().encode(), value.encode()))
+        if content_type:
+            headers.append((b'content-type', content_type.encode()))
+        if body:
+            headers.append((b'content-length', str(len(body)).encode()))
+        cookies = '; '.join(f'{name}={morsel.value}' for name, morsel in self.cookies.items() if morsel.value)
+        if cookies:
+            headers.append((b'cookie', cookies.encode()))
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': method.upper(), 'scheme': 'http', 'path': path,
+            'raw_path': path.encode(), 'query_string': query.encode(), 'root_path': '',
+            'headers': headers, 'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        return scope, body
+
+    async def request(self, method, url, data=None, **extra):
+        """Gửi một request, trả về mã trạng thái."""
+        scope, body = self.build_scope(method, url, data, extra)
+        pending = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        status = None
+
+        async def receive():
+            if pending:
+                return pending.pop()
+            # Client không bao giờ ngắt kết nối; Django hủy tác vụ chờ khi xong
+            await asyncio.Event().wait()
+
+        async def send(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                for name, value in message.get('headers', []):
+                    if name.lower() == b'set-cookie':
+                        self.cookies.load(value.decode('latin-1'))
+
+        await self.application(scope, receive, send)
+        return status
+
+    # API đồng bộ giống ``django.test.Client`` cho ``Scenario.prepare``
+    def get(self, url, data=None, **extra):
+        return async_to_sync(self.request)('get', url, data, **extra)
+
+    def post(self, url, data=None, **extra):
+        return async_to_sync(self.request)('post', url, data, **extra)
+
+
+async def _sample_threads(peak, stop):
+    while not stop.is_set():
+        peak[0] = max(peak[0], threading.active_count())
+        await asyncio.sleep(0.005)
+
+
+async def _drive(scenario, clients, per_client, seed):
+    latencies, errors = [], 0
+    peak, stop = [threading.active_count()], asyncio.Event()
+
+    async def worker(index):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + index)
+        for _ in range(per_client[index]):
+            method, url, data, extra = scenario.build(rng)
+            started = time.perf_counter()
+            status = await clients[index].request(method, url, data, **dict(extra))
+            latencies.append((time.perf_counter() - started) * 1000)
+            if status is None or status >= 400:
+                errors += 1
+
+    sampler = asyncio.create_task(_sample_threads(peak, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(index) for index in range(len(clients))))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await sampler
+    return latencies, errors, elapsed, peak[0]
+
+
+def run_scenario(application, scenario, requests=200, concurrency=16, seed=42):
+    """Chạy ``requests`` request của một kịch bản với ``concurrency`` request đồng thời."""
+    clients = [AsgiClient(application) for _ in range(concurrency)]
+    if scenario.prepare:
+        for client in clients:
+            scenario.prepare(client)
+    per_client = [requests // concurrency + (1 if i < requests % concurrency else 0)
+                  for i in range(concurrency)]
+
+    registry.reset()
+    # Event loop mới làm chương trình ngoài cùng như uvicorn (không qua async_to_sync),
+    # để Django cấp cho mỗi request một thread riêng cho code đồng bộ
+    latencies, errors, elapsed, peak_threads = asyncio.run(_drive(scenario, clients, per_client, seed))
+    result = summarize(latencies, [], errors, elapsed)
+    totals = registry.snapshot().values()
+    served = sum(stats['requests'] for stats in totals)
+    result['queries_per_request'] = round(sum(stats['queries'] for stats in totals) / served, 2) if served else 0.0
+    result['peak_threads'] = peak_threads
+    return result
+
+
+def run(scenarios, requests=200, concurrency=16, seed=42, modes=('sync', 'async'), log=None):
+    """Kết quả phẳng theo ``'<chế độ>:<kịch bản>'`` để dùng được với ``load.compare``."""
+    application = get_asgi_application()
+    results = {}
+    for mode in modes:
+        with override_settings(ROOT_URLCONF=URLCONFS[mode]):
+            for scenario in scenarios:
+                name = f'{mode}:{scenario.name}'
+                results[name] = result = run_scenario(application, scenario, requests, concurrency, seed)
+                if log:
+                    log(f"{name:<28} p50={result['p50_ms']:>8.2f}ms p95={result['p95_ms']:>8.2f}ms "
+                        f"rps={result['rps']:>8.1f} threads={result['peak_threads']}")
+    return results
@@ -0,0 +1,75 @@
+"""Sinh catalog và giỏ hàng giả lập có thể lặp lại (cùng ``seed`` cho cùng dữ liệu)."""
+import random
+
+from cart.models import Cart, CartItem
+from products.cards import refresh_card_data
+from products.models import Category, Product
+from products.search import get_search_backend
+from vegetable_store.utils import chunked
+
+VEGETABLES = [
+    'Cà rốt', 'Bắp cải', 'Xà lách', 'Cải thìa', 'Rau muống', 'Cà chua', 'Khoai tây',
+    'Hành lá', 'Bí đỏ', 'Dưa leo', 'Su hào', 'Củ cải', 'Ớt chuông', 'Súp lơ', 'Rau dền',
+]
+ORIGINS = ['Đà Lạt', 'Lâm Đồng', 'Mộc Châu', 'Củ Chi', 'hữu cơ', 'Sapa', 'Tiền Giang']
+GROUPS = ['Rau ăn lá', 'Củ quả', 'Rau gia vị', 'Nấm', 'Trái cây', 'Đậu', 'Rau thơm']
+UNITS = ['kg', 'bó', 'củ', 'gói']
+
+
+def generate(categories=50, products=100_000, cart_items=1_000_000, items_per_cart=5,
+             seed=42, batch_size=5000, log=None):
+    """Tạo dữ liệu bằng ``bulk_create`` theo lô; trả về dict số lượng đã tạo."""
+    rng = random.Random(seed)
+    log = log or (lambda message: None)
+
+    Category.objects.bulk_create([
+        Category(name=f'{GROUPS[i % len(GROUPS)]} {i + 1}', description='Danh mục giả lập')
+        for i in range(categories)
+    ])
+    category_ids = list(Category.objects.order_by('pk').values_list('pk', flat=True))
+    log(f'{len(category_ids)} danh mục')
+
+    def product_rows():
+        for i in range(products):
+            vegetable = rng.choice(VEGETABLES)
+            yield Product(
+                name=f'{vegetable} {rng.choice(ORIGINS)} {i + 1}',
+                sku=f'BENCH-{i + 1:07d}',
+                category_id=rng.choice(category_ids),
+                description=f'{vegetable} tươi, thu hoạch trong ngày',
+                price=rng.randrange(5, 200) * 1000,
+                stock=rng.randint(0, 500),
+                unit=rng.choice(UNITS),
+                is_available=rng.random() < 0.95,
+                is_featured=rng.random() < 0.02,
+                image=f'products/bench-{i % 50}.jpg',
+            )
+
+    for batch in chunked(product_rows(), batch_size):
+        Product.objects.bulk_create(batch)
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    log(f'{len(product_ids)} sản phẩm')
+    # bulk_create không phát post_save nên dựng chỉ mục tìm kiếm và dữ liệu thẻ một lần
+    get_search_backend().rebuild(batch_size=batch_size)
+    for batch in chunked(Product.objects.order_by('pk').iterator(chunk_size=batch_size), batch_size):
+        refresh_card_data(batch)
+
+    carts = cart_items // items_per_cart if product_ids else 0
+    for batch in chunked((Cart(session_key=f'bench-{i}') for i in range(carts)), batch_size):
+        Cart.objects.bulk_create(batch)
+    cart_ids = list(
+        Cart.objects.filter(session_key__startswith='bench-').order_by('pk').values_list('pk', flat=True)
+    )
+
+    def item_rows():
+        for cart_id in cart_ids:
+            for product_id in rng.sample(product_ids, min(items_per_cart, len(product_ids))):
+                yield CartItem(cart_id=cart_id, product_id=product_id, quantity=rng.randint(1, 5))
+
+    items = 0
+    for batch in chunked(item_rows(), batch_size):
+        CartItem.objects.bulk_create(batch)
+        items += len(batch)
+    Cart.objects.filter(session_key__startswith='bench-').refresh_totals()
+    log(f'{carts} giỏ hàng, {items} dòng')
+    return {'categories': len(category_ids), 'products': len(product_ids), 'carts': carts, 'cart_items': items}
@@ -0,0 +1,211 @@
+"""Bộ tạo tải cục bộ dùng ``django.test.Client`` trên nhiều luồng.
+
+Mỗi kịch bản chạy riêng với ``concurrency`` luồng, mỗi luồng một client (giỏ
+cookie riêng). Số truy vấn mỗi request lấy từ ``request.query_stats`` do
+``QueryStatsMiddleware`` gắn vào.
+"""
+import json
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.test import Client
+from django.urls import reverse
+
+from products.facets import PRICE_RANGES
+from products.models import Category, Product
+from vegetable_store.templateprofile import profile_templates
+
+XHR = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+SEARCH_TERMS = ['ca rot', 'bắp cải', 'rau', 'da lat', 'khoai', 'nấm']
+
+
+class Scenario:
+    """Một loại request; ``build(rng)`` trả về ``(method, url, data, extra)``."""
+
+    def __init__(self, name, build, prepare=None):
+        self.name = name
+        self.build = build
+        # Chạy một lần cho mỗi client trước khi đo (ví dụ: bỏ hàng vào giỏ)
+        self.prepare = prepare
+
+
+def default_scenarios(sample_size=1000, seed=42):
+    rng = random.Random(seed)
+    available = Product.objects.filter(is_available=True, stock__gt=0)
+    product_ids = list(available.order_by('?').values_list('pk', flat=True)[:sample_size]) or [0]
+    category_ids = list(Category.objects.values_list('pk', flat=True)) or [0]
+    first_page = Client().get(reverse('products:product_list'))
+    page_obj = first_page.context['page_obj'] if first_page.context else None
+    next_cursor = getattr(page_obj, 'next_cursor', None)
+
+    def fill_cart(client):
+        for product_id in rng.sample(product_ids, min(3, len(product_ids))):
+            client.post(reverse('cart:add_to_cart', args=[product_id]), **XHR)
+
+    def batch_payload(r):
+        return json.dumps({'operations': [
+            {'op': 'add', 'product_id': r.choice(product_ids), 'quantity': 1} for _ in range(3)
+        ]})
+
+    scenarios = [
+        Scenario('home', lambda r: ('get', reverse('products:home'), None, {})),
+        Scenario('product_list', lambda r: ('get', reverse('products:product_list'), None, {})),
+        Scenario('product_list_search', lambda r: (
+            'get', reverse('products:product_list'), {'search': r.choice(SEARCH_TERMS)}, {}
+        )),
+        Scenario('product_list_category', lambda r: (
+            'get', reverse('products:product_list'), {'category': r.choice(category_ids)}, {}
+        )),
+        Scenario('product_list_facets', lambda r: (
+            'get', reverse('products:product_list'), {
+                'category': r.choice(category_ids), 'price': r.choice(PRICE_RANGES)[0], 'in_stock': '1',
+            }, {}
+        )),
+        Scenario('product_detail', lambda r: (
+            'get', reverse('products:product_detail', args=[r.choice(product_ids)]), None, {}
+        )),
+        Scenario('category_detail', lambda r: (
+            'get', reverse('products:category_detail', args=[r.choice(category_ids)]), None, {}
+        )),
+        Scenario('cart_view', lambda r: ('get', reverse('cart:cart_view'), None, {}), prepare=fill_cart),
+        Scenario('add_to_cart', lambda r: (
+            'post', reverse('cart:add_to_cart', args=[r.choice(product_ids)]), {'quantity': 1}, XHR
+        )),
+        Scenario('batch_update', lambda r: (
+            'post', reverse('cart:batch_update'), batch_payload(r),
+            dict(XHR, content_type='application/json'),
+        )),
+    ]
+    if next_cursor:
+        scenarios.insert(2, Scenario('product_list_page2', lambda r: (
+            'get', reverse('products:product_list'), {'cursor': next_cursor}, {}
+        )))
+    return scenarios
+
+
+def percentile(sorted_values, fraction):
+    """Phân vị theo nội suy tuyến tính trên danh sách đã sắp xếp."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def run_scenario(scenario, requests=200, concurrency=4, seed=42, client_factory=Client):
+    """Chạy ``requests`` request của một kịch bản, trả về dict thống kê."""
+    latencies, queries, errors = [], [], 0
+    lock = threading.Lock()
+    per_worker = [requests // concurrency + (1 if i < requests % concurrency else 0)
+                  for i in range(concurrency)]
+
+    def worker(index):
+        nonlocal errors
+        rng = random.Random(seed * 1000 + index)
+        client = client_factory()
+        try:
+            if scenario.prepare:
+                scenario.prepare(client)
+            local_latencies, local_queries, local_errors = [], [], 0
+            for _ in range(per_worker[index]):
+                method, url, data, extra = scenario.build(rng)
+                started = time.perf_counter()
+                response = getattr(client, method)(url, data, **extra)
+                local_latencies.append((time.perf_counter() - started) * 1000)
+                stats = getattr(response.wsgi_request, 'query_stats', None)
+                local_queries.append(stats.count if stats else 0)
+                if response.status_code >= 400:
+                    local_errors += 1
+            with lock:
+                latencies.extend(local_latencies)
+                queries.extend(local_queries)
+                errors += local_errors
+        finally:
+            connections.close_all()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(worker, range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return summarize(latencies, queries, errors, elapsed)
+
+
+def summarize(latencies, queries, errors, elapsed):
+    """Dict thống kê từ danh sách độ trễ (ms) và số truy vấn của từng request."""
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p95_ms': round(percentile(latencies, 0.95), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        'rps': round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        'queries_per_request': round(statistics.fmean(queries), 2) if queries else 0.0,
+    }
+
+
+def run(scenarios, requests=200, concurrency=4, seed=42, log=None):
+    results = {}
+    for scenario in scenarios:
+        results[scenario.name] = run_scenario(scenario, requests, concurrency, seed)
+        if log:
+            result = results[scenario.name]
+            log(f"{scenario.name:<22} p50={result['p50_ms']:>8.2f}ms p95={result['p95_ms']:>8.2f}ms "
+                f"rps={result['rps']:>8.1f} q/req={result['queries_per_request']}")
+    return results
+
+
+def profile_scenarios(scenarios, requests=50, seed=42, limit=15, log=None):
+    """Chạy tuần tự ``requests`` request mỗi kịch bản dưới ``profile_templates``.
+
+    Trả về ``{kịch bản: các dòng của profiler}`` (xem ``vegetable_store/templateprofile.py``).
+    """
+    profiles = {}
+    for scenario in scenarios:
+        rng = random.Random(seed)
+        client = Client()
+        if scenario.prepare:
+            scenario.prepare(client)
+        with profile_templates() as profiler:
+            for _ in range(requests):
+                method, url, data, extra = scenario.build(rng)
+                getattr(client, method)(url, data, **extra)
+        profiles[scenario.name] = profiler.report(limit)
+        if log:
+            log(f'Template của {scenario.name} ({requests} request):\n{profiler.format_report(limit)}')
+    return profiles
+
+
+COMPARED = ('p50_ms', 'p95_ms', 'p99_ms', 'rps', 'queries_per_request')
+HIGHER_IS_BETTER = {'rps'}
+
+
+def compare(results, baseline, threshold=10.0):
+    """So sánh với kết quả cũ; trả về ``(deltas, regressions)``.
+
+    ``deltas[tên][chỉ số]`` là phần trăm thay đổi. Một chỉ số xấu đi quá
+    ``threshold`` phần trăm được đưa vào ``regressions``.
+    """
+    deltas, regressions = {}, []
+    for name, result in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        deltas[name] = {}
+        for metric in COMPARED:
+            before, after = old.get(metric), result.get(metric)
+            if not before or after is None:
+                continue
+            change = (after - before) / before * 100
+            deltas[name][metric] = round(change, 1)
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > threshold:
+                regressions.append(f'{name}.{metric}: {before} -> {after} ({change:+.1f}%)')
+    return deltas, regressions
@@ -0,0 +1,51 @@
+from django.test import TestCase, TransactionTestCase
+
+from cart.models import Cart, CartItem
+from products.models import Category, Product
+from . import asgi, data, load
+
+
+class GenerateTests(TestCase):
+    def test_generation_is_reproducible(self):
+        counts = data.generate(categories=3, products=40, cart_items=30, items_per_cart=3, seed=7, batch_size=16)
+        self.assertEqual(counts, {'categories': 3, 'products': 40, 'carts': 10, 'cart_items': 30})
+        first = list(Product.objects.order_by('sku').values_list('name', 'price', 'stock'))
+        cart = Cart.objects.order_by('pk').first()
+        self.assertEqual(cart.total_items, sum(cart.cartitem_set.values_list('quantity', flat=True)))
+
+        CartItem.objects.all().delete()
+        Cart.objects.all().delete()
+        Product.objects.all().delete()
+        Category.objects.all().delete()
+        data.generate(categories=3, products=40, cart_items=30, items_per_cart=3, seed=7, batch_size=16)
+        self.assertEqual(first, list(Product.objects.order_by('sku').values_list('name', 'price', 'stock')))
+
+
+class LoadDriverTests(TransactionTestCase):
+    def test_scenarios_report_latency_and_queries(self):
+        data.generate(categories=3, products=30, cart_items=0, seed=1)
+        results = load.run(load.default_scenarios(seed=1), requests=6, concurrency=2)
+        self.assertIn('product_list_search', results)
+        for name, result in results.items():
+            self.assertEqual((result['requests'], result['errors']), (6, 0), name)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertGreater(results['product_detail']['queries_per_request'], 0)
+
+    def test_compare_flags_regressions(self):
+        baseline = {'home': {'p95_ms': 10.0, 'rps': 100.0}}
+        deltas, regressions = load.compare({'home': {'p95_ms': 10.5, 'rps': 80.0}}, baseline)
+        self.assertEqual(deltas['home'], {'p95_ms': 5.0, 'rps': -20.0})
+        self.assertEqual(regressions, ['home.rps: 100.0 -> 80.0 (-20.0%)'])
+
+
+class AsgiDriverTests(TransactionTestCase):
+    def test_sync_and_async_views_under_asgi(self):
+        data.generate(categories=3, products=30, cart_items=0, seed=1)
+        scenarios = [s for s in load.default_scenarios(seed=1)
+                     if s.name in ('home', 'product_detail', 'cart_view', 'add_to_cart', 'batch_update')]
+        results = asgi.run(scenarios, requests=8, concurrency=4, seed=1)
+        self.assertEqual(len(results), 2 * len(scenarios))
+        for name, result in results.items():
+            self.assertEqual((result['requests'], result['errors']), (8, 0), name)
+            self.assertGreater(result['peak_threads'], 0)
+        self.assertGreater(results['async:add_to_cart']['queries_per_request'], 0)
@@ -1,17 +1,51 @@
 from django.contrib import admin
-from .models import Cart, CartItem
+from django.db.models import Count, ExpressionWrapper, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from vegetable_store.paginators import EstimatedCountPaginator
+from .models import PRICE_FIELD, Cart, CartItem
 
 class CartItemInline(admin.TabularInline):
     model = CartItem
     extra = 0
+    # Không nạp cả danh sách sản phẩm vào mỗi ô chọn
+    autocomplete_fields = ['product']
 
 @admin.register(Cart)
 class CartAdmin(admin.ModelAdmin):
-    list_display = ['__str__', 'get_total_items', 'get_total_price', 'created_at']
+    list_display = ['__str__', 'line_count', 'total_items', 'total_price', 'created_at', 'updated_at']
     list_filter = ['created_at']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
     inlines = [CartItemInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        # Tổng số lượng/tổng tiền đã lưu sẵn trên Cart, chỉ cần đếm số dòng. Truy vấn con
+        # chỉ chạy cho các giỏ của trang hiện tại, không GROUP BY cả bảng như Count('cartitem')
+        lines = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart').annotate(n=Count('pk'))
+        return super().get_queryset(request).annotate(line_count=Coalesce(Subquery(lines.values('n')), 0))
+
+    @admin.display(description='Số mặt hàng', ordering='line_count')
+    def line_count(self, obj):
+        return obj.line_count
 
 @admin.register(CartItem)
 class CartItemAdmin(admin.ModelAdmin):
-    list_display = ['cart', 'product', 'quantity', 'get_total_price', 'created_at']
+    list_display = ['cart', 'product', 'quantity', 'line_total', 'created_at']
     list_filter = ['created_at', 'product__category']
+    list_select_related = ['cart__user', 'product']
+    raw_id_fields = ['cart']
+    autocomplete_fields = ['product']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            line_total=ExpressionWrapper(F('quantity') * F('product__price'), output_field=PRICE_FIELD),
+        )
+
+    @admin.display(description='Thành tiền', ordering='line_total')
+    def line_total(self, obj):
+        return obj.line_total
@@ -0,0 +1,64 @@
+"""Phiên bản async của các endpoint JSON của giỏ hàng, dùng khi chạy dưới ASGI.
+
+Sản phẩm và giỏ CSDL được lấy bằng ORM async; thao tác ghi (upsert, transaction
+của batch) vẫn là code đồng bộ nên chạy trong một lần ``sync_to_async``. Request
+không phải AJAX (cần ``messages`` và redirect) và trang giỏ hàng dùng lại view
+đồng bộ.
+"""
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.http import require_POST
+
+from products.models import Product
+from . import views
+from .storage import aget_cart
+from .views import (
+    add_json, batch_json, is_ajax, parse_batch, parse_quantity, remove_json, update_json,
+)
+
+cart_view = views.cart_view
+
+
+async def attach_cart(request):
+    # Gắn lại vào request để CartMiddleware ghi cookie khi giỏ cookie thay đổi
+    request.cart = await aget_cart(request)
+    return request.cart
+
+
+@require_POST
+async def add_to_cart(request, product_id):
+    """Thêm sản phẩm vào giỏ hàng"""
+    if not is_ajax(request):
+        return await sync_to_async(views.add_to_cart)(request, product_id)
+    product = await aget_object_or_404(Product, id=product_id, is_available=True)
+    cart = await attach_cart(request)
+    quantity = max(parse_quantity(request.POST.get('quantity'), 1), 1)
+    return await sync_to_async(add_json)(cart, product, quantity)
+
+
+@require_POST
+async def update_cart_item(request, item_id):
+    """Cập nhật số lượng sản phẩm trong giỏ hàng"""
+    if not is_ajax(request):
+        return await sync_to_async(views.update_cart_item)(request, item_id)
+    cart = await attach_cart(request)
+    quantity = parse_quantity(request.POST.get('quantity'), 1)
+    return await sync_to_async(update_json)(cart, item_id, quantity)
+
+
+async def remove_from_cart(request, item_id):
+    """Xóa sản phẩm khỏi giỏ hàng"""
+    if not is_ajax(request):
+        return await sync_to_async(views.remove_from_cart)(request, item_id)
+    cart = await attach_cart(request)
+    return await sync_to_async(remove_json)(cart, item_id)
+
+
+@require_POST
+async def batch_update(request):
+    """Áp dụng nhiều thao tác thêm/sửa/xóa trong một request JSON"""
+    operations, error = parse_batch(request)
+    if error is not None:
+        return error
+    cart = await attach_cart(request)
+    return await sync_to_async(batch_json)(cart, operations)
@@ -0,0 +1,102 @@
+"""Áp dụng nhiều thao tác giỏ hàng trong một request và một transaction.
+
+Mỗi thao tác là một dict:
+
+* ``{"op": "add", "product_id": 5, "quantity": 2}`` cộng thêm vào dòng của sản phẩm
+* ``{"op": "set", "item_id": 12, "quantity": 3}`` đặt số lượng (0 là xóa)
+* ``{"op": "remove", "item_id": 12}`` xóa dòng
+
+Số lượng luôn bị chặn bởi tồn kho như ``CartItem.objects.add_quantity``.
+"""
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Least
+
+from products.models import Product
+from .models import CartItem, deferred_totals
+
+MAX_OPERATIONS = 100
+OPERATIONS = ('add', 'set', 'remove')
+
+
+class BatchError(ValueError):
+    """Dữ liệu thao tác không hợp lệ."""
+
+
+def _positive_int(value, field):
+    if isinstance(value, bool) or not isinstance(value, int) or value < 0:
+        raise BatchError(f'"{field}" phải là số nguyên không âm')
+    return value
+
+
+def parse_operations(payload):
+    """Kiểm tra và chuẩn hóa ``payload["operations"]``; lỗi thì ném ``BatchError``."""
+    operations = payload.get('operations') if isinstance(payload, dict) else None
+    if not isinstance(operations, list) or not operations:
+        raise BatchError('Thiếu danh sách "operations"')
+    if len(operations) > MAX_OPERATIONS:
+        raise BatchError(f'Tối đa {MAX_OPERATIONS} thao tác mỗi lần')
+
+    parsed = []
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get('op') not in OPERATIONS:
+            raise BatchError('Thao tác phải là một trong: ' + ', '.join(OPERATIONS))
+        op = operation['op']
+        if op == 'add':
+            parsed.append({
+                'op': op,
+                'product_id': _positive_int(operation.get('product_id'), 'product_id'),
+                'quantity': _positive_int(operation.get('quantity', 1), 'quantity'),
+            })
+        elif op == 'set':
+            parsed.append({
+                'op': op,
+                'item_id': _positive_int(operation.get('item_id'), 'item_id'),
+                'quantity': _positive_int(operation.get('quantity'), 'quantity'),
+            })
+        else:
+            parsed.append({'op': op, 'item_id': _positive_int(operation.get('item_id'), 'item_id')})
+    return parsed
+
+
+def apply_operations(cart, operations):
+    """Áp dụng ``operations`` (đã qua ``parse_operations``) lên giỏ hàng ``cart``.
+
+    Mỗi thao tác là một câu lệnh nguyên tử nên không mất cập nhật khi nhiều
+    request cùng sửa một giỏ: ``add`` dùng upsert của
+    ``CartItem.objects.add_quantity``, ``set`` là một ``UPDATE`` chặn theo tồn
+    kho, ``remove`` là một ``DELETE``. Tổng giỏ được tính lại một lần ở cuối.
+    Trả về ``(items, removed_ids, errors)``.
+    """
+    product_ids = {op['product_id'] for op in operations if op['op'] == 'add'}
+    with transaction.atomic(), deferred_totals():
+        products = Product.objects.filter(pk__in=product_ids, is_available=True).in_bulk()
+        touched, removed, errors = set(), set(), []
+        for op in operations:
+            if op['op'] == 'add':
+                product = products.get(op['product_id'])
+                item = product and CartItem.objects.add_quantity(
+                    cart, product, op['quantity'], refresh=False,
+                )
+                if item is None:
+                    errors.append({'product_id': op['product_id'], 'message': 'Sản phẩm đã hết hàng'})
+                    continue
+                touched.add(item.pk)
+                removed.discard(item.pk)
+                continue
+
+            lines = CartItem.objects.filter(pk=op['item_id'], cart=cart)
+            if op['op'] == 'set' and op['quantity'] > 0:
+                stock = Product.objects.filter(pk=OuterRef('product_id')).order_by().values('stock')
+                if lines.filter(product__stock__gt=0).update(quantity=Least(op['quantity'], Subquery(stock))):
+                    touched.add(op['item_id'])
+                    continue
+            # set 0, remove, hoặc sản phẩm đã hết hàng
+            deleted, _ = lines.delete()
+            if deleted:
+                removed.add(op['item_id'])
+            else:
+                errors.append({'item_id': op['item_id'], 'message': 'Không tìm thấy sản phẩm trong giỏ'})
+        cart.refresh_totals()
+        items = list(cart.cartitem_set.filter(pk__in=touched - removed).select_related('product'))
+    return items, sorted(removed), errors
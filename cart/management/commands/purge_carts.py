@@ -0,0 +1,120 @@
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from cart.models import DB_SESSION_ENGINES, Cart, CartItem
+
+
+class Command(BaseCommand):
+    help = ('Xóa giỏ hàng của khách bị bỏ quên (phiên hết hạn hoặc không hoạt động '
+            'quá N ngày) cùng các phiên đã hết hạn, theo từng lô nhỏ')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30,
+                            help='Số ngày không hoạt động trước khi xóa giỏ (mặc định 30)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Số giỏ hàng/phiên xóa mỗi transaction (mặc định 500)')
+        parser.add_argument('--sleep', type=float, default=0,
+                            help='Nghỉ giữa các lô (giây) để nhường khóa ghi cho site')
+        parser.add_argument('--archive', metavar='FILE',
+                            help='Ghi nối các giỏ (kèm dòng) vào file JSONL trước khi xóa')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Chỉ đếm, không xóa và không ghi archive')
+        parser.add_argument('--skip-sessions', action='store_true',
+                            help='Không xóa các phiên đã hết hạn')
+
+    def handle(self, *args, **options):
+        if options['days'] < 0 or options['batch_size'] <= 0:
+            raise CommandError('--days phải >= 0 và --batch-size phải > 0')
+        self.batch_size = options['batch_size']
+        self.sleep = options['sleep']
+        self.dry_run = options['dry_run']
+
+        now = timezone.now()
+        stale = Cart.objects.abandoned(now - timedelta(days=options['days']), now=now)
+
+        archive = None
+        if options['archive'] and not self.dry_run:
+            archive = open(options['archive'], 'a', encoding='utf-8')
+        try:
+            carts, items = self.purge_carts(stale, archive)
+        finally:
+            if archive is not None:
+                archive.close()
+
+        sessions = 0
+        if not options['skip_sessions'] and settings.SESSION_ENGINE in DB_SESSION_ENGINES:
+            sessions = self.purge_sessions(now)
+
+        verb = 'Sẽ xóa' if self.dry_run else 'Đã xóa'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {carts} giỏ hàng, {items} dòng và {sessions} phiên hết hạn'
+        ))
+
+    def batches(self, queryset):
+        """Duyệt id theo thứ tự tăng dần, mỗi lần tối đa ``batch_size`` id."""
+        last = None
+        while True:
+            page = queryset.order_by('pk')
+            if last is not None:
+                page = page.filter(pk__gt=last)
+            ids = list(page.values_list('pk', flat=True)[:self.batch_size])
+            if not ids:
+                return
+            last = ids[-1]
+            yield ids
+
+    def report(self, label, done, started):
+        elapsed = time.perf_counter() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(f'  {label}: {done} ({rate:.0f}/s)')
+
+    def purge_carts(self, stale, archive):
+        started = time.perf_counter()
+        carts = items = 0
+        for ids in self.batches(stale):
+            if self.dry_run:
+                carts += len(ids)
+                items += CartItem.objects.filter(cart_id__in=ids).count()
+            else:
+                with transaction.atomic():
+                    # Kiểm tra lại trong transaction: giỏ có thể vừa được dùng lại
+                    ids = list(stale.filter(pk__in=ids).values_list('pk', flat=True))
+                    if archive is not None:
+                        self.archive(ids, archive)
+                    # Xóa thẳng, không phát signal cập nhật tổng cho giỏ sắp bị xóa
+                    items += CartItem.objects.filter(cart_id__in=ids)._raw_delete(CartItem.objects.db)
+                    carts += Cart.objects.filter(pk__in=ids)._raw_delete(Cart.objects.db)
+                if self.sleep:
+                    time.sleep(self.sleep)
+            self.report('giỏ hàng', carts, started)
+        return carts, items
+
+    def archive(self, ids, stream):
+        lines = {}
+        for item in CartItem.objects.filter(cart_id__in=ids).values('cart_id', 'product_id', 'quantity'):
+            lines.setdefault(item.pop('cart_id'), []).append(item)
+        fields = ('id', 'session_key', 'created_at', 'updated_at', 'total_items', 'total_price')
+        for cart in Cart.objects.filter(pk__in=ids).order_by('pk').values(*fields):
+            cart['items'] = lines.get(cart['id'], [])
+            stream.write(json.dumps(cart, default=str, ensure_ascii=False) + '\n')
+
+    def purge_sessions(self, now):
+        started = time.perf_counter()
+        expired = Session.objects.filter(expire_date__lt=now)
+        deleted = 0
+        for keys in self.batches(expired):
+            if self.dry_run:
+                deleted += len(keys)
+            else:
+                deleted += Session.objects.filter(pk__in=keys, expire_date__lt=now)._raw_delete(Session.objects.db)
+                if self.sleep:
+                    time.sleep(self.sleep)
+            self.report('phiên', deleted, started)
+        return deleted
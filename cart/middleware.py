@@ -0,0 +1,44 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject, empty
+
+from .storage import COOKIE_NAME, get_cart
+
+
+class CartMiddleware:
+    """Gắn ``request.cart`` (lười) và ghi lại cookie giỏ hàng khi nó thay đổi.
+
+    View async không đọc ``request.cart`` (nạp giỏ CSDL là code đồng bộ) mà gán
+    lại nó bằng ``aget_cart``; phần ghi cookie bên dưới dùng chung cho cả hai.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.cart = SimpleLazyObject(lambda: get_cart(request))
+        return self.save_cart(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        request.cart = SimpleLazyObject(lambda: get_cart(request))
+        return self.save_cart(request, await self.get_response(request))
+
+    def save_cart(self, request, response):
+        if getattr(request, 'cart_cookie_merged', False):
+            # Giỏ cookie đã được gộp vào giỏ CSDL khi đăng nhập
+            response.delete_cookie(COOKIE_NAME)
+            return response
+        cart = request.cart
+        if isinstance(cart, SimpleLazyObject):
+            if cart._wrapped is empty:
+                return response
+            cart = cart._wrapped
+        if getattr(cart, 'modified', False):
+            cart.save(response)
+        return response
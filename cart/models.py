@@ -1,37 +1,190 @@
-from django.db import models
+from contextlib import contextmanager
+from contextvars import ContextVar
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.db.models import DecimalField, Exists, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.contrib.auth.models import User
+from django.utils import timezone
 from products.models import Product
 
+PRICE_FIELD = DecimalField(max_digits=12, decimal_places=2)
+# Các SESSION_ENGINE lưu phiên trong bảng django_session
+DB_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.db',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+_totals_deferred = ContextVar('cart_totals_deferred', default=False)
+
+
+@contextmanager
+def deferred_totals():
+    """Trong khối này signal của CartItem không tính lại tổng giỏ sau mỗi dòng.
+
+    Dùng khi sửa/xóa nhiều dòng liên tiếp; người gọi tự gọi ``refresh_totals``
+    một lần sau cùng.
+    """
+    token = _totals_deferred.set(True)
+    try:
+        yield
+    finally:
+        _totals_deferred.reset(token)
+
+
+def totals_deferred():
+    return _totals_deferred.get()
+
+
+class CartQuerySet(models.QuerySet):
+    def abandoned(self, idle_before, now=None):
+        """Giỏ của khách không hoạt động từ trước ``idle_before`` hoặc có phiên đã hết hạn.
+
+        Chỉ xét phiên khi ``SESSION_ENGINE`` lưu phiên trong CSDL; với engine khác
+        (cache, file, cookie) bảng ``django_session`` trống và mọi giỏ sẽ bị coi là bỏ quên.
+        """
+        stale = Q(updated_at__lt=idle_before)
+        if settings.SESSION_ENGINE in DB_SESSION_ENGINES:
+            from django.contrib.sessions.models import Session
+
+            live_session = Session.objects.filter(
+                session_key=OuterRef('session_key'), expire_date__gt=now or timezone.now()
+            )
+            stale |= ~Exists(live_session)
+        return self.filter(user__isnull=True).filter(stale)
+
+    def refresh_totals(self):
+        """Tính lại tổng của mọi giỏ hàng trong queryset bằng một câu UPDATE"""
+        items = CartItem.objects.filter(cart=OuterRef('pk')).order_by().values('cart')
+        return self.update(
+            total_items=Coalesce(
+                Subquery(items.annotate(n=Sum('quantity')).values('n')), 0
+            ),
+            total_price=Coalesce(
+                Subquery(items.annotate(
+                    s=Sum(F('quantity') * F('product__price'), output_field=PRICE_FIELD)
+                ).values('s')),
+                Value(Decimal('0')),
+                output_field=PRICE_FIELD,
+            ),
+        )
+
+
 class Cart(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True)
-    session_key = models.CharField(max_length=50, null=True, blank=True)
+    session_key = models.CharField(max_length=50, null=True, blank=True, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
-    
+    # Lần cuối giỏ thay đổi, dùng để dọn giỏ bị bỏ quên (lệnh purge_carts)
+    updated_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # Tổng được lưu sẵn, cập nhật sau mỗi thay đổi CartItem (xem cart/signals.py)
+    total_items = models.PositiveIntegerField(default=0, verbose_name="Tổng số lượng")
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Tổng tiền")
+
+    objects = CartQuerySet.as_manager()
+
     def __str__(self):
         if self.user:
             return f"Giỏ hàng của {self.user.username}"
         return f"Giỏ hàng khách (Session: {self.session_key})"
-    
+
+    def compute_totals(self):
+        """Tính (tổng số lượng, tổng tiền) bằng một truy vấn aggregate"""
+        totals = self.cartitem_set.aggregate(
+            items=Sum('quantity'),
+            price=Sum(F('quantity') * F('product__price'), output_field=PRICE_FIELD),
+        )
+        return totals['items'] or 0, totals['price'] or Decimal('0')
+
+    def refresh_totals(self):
+        """Tính lại tổng và lưu vào cả đối tượng lẫn CSDL"""
+        self.total_items, self.total_price = self.compute_totals()
+        self.updated_at = timezone.now()
+        Cart.objects.filter(pk=self.pk).update(
+            total_items=self.total_items, total_price=self.total_price,
+            updated_at=self.updated_at,
+        )
+
     def get_total_price(self):
-        total = 0
-        for item in self.cartitem_set.all():
-            total += item.get_total_price()
-        return total
-    
+        return self.total_price
+
     def get_total_items(self):
-        return sum(item.quantity for item in self.cartitem_set.all())
+        return self.total_items
+
+class CartItemManager(models.Manager):
+    def add_quantity(self, cart, product, quantity, refresh=True):
+        """Cộng thêm ``quantity`` vào dòng (cart, product) một cách nguyên tử.
+
+        Dùng một câu ``INSERT ... ON CONFLICT DO UPDATE`` nên không mất cập nhật
+        khi nhiều request cùng thêm một sản phẩm, và số lượng luôn bị chặn bởi
+        ``Product.stock``. Trả về ``CartItem`` với số lượng mới, hoặc ``None``
+        nếu sản phẩm đã hết hàng. ``refresh=False`` bỏ qua bước tính lại tổng giỏ
+        (khi người gọi tự tính một lần sau nhiều thao tác).
+        """
+        connection = connections[self.db]
+        # Không tạo savepoint khi đã ở trong transaction (apply_operations gọi nhiều lần)
+        with transaction.atomic(using=self.db, savepoint=False):
+            if connection.vendor in ('sqlite', 'postgresql'):
+                item = self._upsert(connection, cart, product, quantity)
+            else:
+                item = self._add_with_lock(cart, product, quantity)
+            # Câu upsert không phát signal post_save nên tự cập nhật tổng giỏ hàng
+            if refresh:
+                cart.refresh_totals()
+        return item
+
+    def _upsert(self, connection, cart, product, quantity):
+        least = 'MIN' if connection.vendor == 'sqlite' else 'LEAST'
+        qn = connection.ops.quote_name
+        items = qn(self.model._meta.db_table)
+        products = qn(Product._meta.db_table)
+        sql = (
+            f'INSERT INTO {items} ("cart_id", "product_id", "quantity", "created_at") '
+            f'SELECT %s, p."id", {least}(%s, p."stock"), %s FROM {products} p '
+            f'WHERE p."id" = %s AND p."stock" > 0 '
+            f'ON CONFLICT ("cart_id", "product_id") DO UPDATE SET "quantity" = {least}('
+            f'{items}."quantity" + %s, '
+            f'(SELECT "stock" FROM {products} WHERE "id" = {items}."product_id")) '
+            f'RETURNING "id", "quantity"'
+        )
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        params = [cart.pk, quantity, now, product.pk, quantity]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        item = self.model(pk=row[0], cart=cart, product=product, quantity=row[1])
+        item._state.adding = False
+        item._state.db = self.db
+        return item
+
+    def _add_with_lock(self, cart, product, quantity):
+        stock = Product.objects.select_for_update().values_list('stock', flat=True).get(pk=product.pk)
+        if stock <= 0:
+            return None
+        item = self.select_for_update().filter(cart=cart, product=product).first()
+        if item is None:
+            item = self.model(cart=cart, product=product, quantity=0)
+        item.quantity = min(item.quantity + quantity, stock)
+        item.save()
+        return item
+
 
 class CartItem(models.Model):
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
     created_at = models.DateTimeField(auto_now_add=True)
-    
+
+    objects = CartItemManager()
+
     class Meta:
         unique_together = ('cart', 'product')
-    
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
-    
+
     def get_total_price(self):
         return self.quantity * self.product.price
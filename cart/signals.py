@@ -0,0 +1,61 @@
+from django.contrib.auth.signals import user_logged_in
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from products.models import Product
+from products.signals import products_bulk_saved
+from .models import Cart, CartItem, totals_deferred
+from .storage import merge_cookie_cart
+
+
+def _refresh_cart_of(item):
+    if totals_deferred():
+        return
+    # Nếu view đã có sẵn đối tượng giỏ hàng thì cập nhật luôn đối tượng đó
+    if CartItem.cart.is_cached(item):
+        item.cart.refresh_totals()
+    else:
+        Cart.objects.filter(pk=item.cart_id).refresh_totals()
+
+
+@receiver(post_save, sender=CartItem)
+def sync_totals_on_save(sender, instance, raw=False, **kwargs):
+    """Cập nhật tổng giỏ hàng khi thêm/sửa CartItem"""
+    if not raw:
+        _refresh_cart_of(instance)
+
+
+@receiver(post_delete, sender=CartItem)
+def sync_totals_on_delete(sender, instance, origin=None, **kwargs):
+    """Cập nhật tổng giỏ hàng khi xóa CartItem (bỏ qua nếu đang xóa cả giỏ)"""
+    if isinstance(origin, Cart) or (isinstance(origin, QuerySet) and origin.model is Cart):
+        return
+    _refresh_cart_of(instance)
+
+
+@receiver(post_save, sender=Product)
+def sync_totals_on_price_change(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """Giá sản phẩm thay đổi thì tổng tiền các giỏ chứa nó cũng đổi
+
+    Bỏ qua các lần lưu không đổi giá (tồn kho, mô tả...); không rõ giá cũ thì vẫn tính lại.
+    """
+    if created or raw or (update_fields is not None and 'price' not in update_fields):
+        return
+    if instance.saved_value('price') == instance.price:
+        return
+    Cart.objects.filter(cartitem__product=instance).refresh_totals()
+
+
+@receiver(user_logged_in)
+def merge_anonymous_cart(sender, request, user, **kwargs):
+    """Gộp giỏ hàng cookie của khách vào giỏ CSDL khi đăng nhập"""
+    if request is not None:
+        merge_cookie_cart(request, user)
+
+
+@receiver(products_bulk_saved, sender=Product)
+def sync_totals_on_bulk_price_change(sender, updated, fields, **kwargs):
+    """Như trên, cho các sản phẩm được cập nhật giá hàng loạt (import_catalog)"""
+    if 'price' in fields and updated:
+        Cart.objects.filter(cartitem__product__in=[p.pk for p in updated]).refresh_totals()
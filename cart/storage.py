@@ -0,0 +1,278 @@
+"""Nơi lưu giỏ hàng.
+
+Người dùng đăng nhập dùng ``DatabaseCart`` (bảng ``Cart``/``CartItem``). Khách
+mặc định dùng ``CookieCart``: nội dung giỏ nằm trong một cookie ký số, nên xem
+và thêm hàng không tạo dòng nào trong ``django_session`` hay ``cart_cart``.
+Khi khách đăng nhập, giỏ cookie được gộp vào giỏ CSDL (xem ``cart/signals.py``).
+
+Cả hai lớp có chung API: ``get_items``, ``get_item``, ``add``,
+``set_quantity``, ``remove``, ``clear``, ``apply_operations``,
+``get_total_items`` và ``get_total_price``.
+"""
+import secrets
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+
+from products.models import Product
+from .batch import apply_operations
+from .models import Cart, CartItem, deferred_totals
+
+COOKIE_NAME = getattr(settings, 'CART_COOKIE_NAME', 'cart')
+COOKIE_AGE = getattr(settings, 'CART_COOKIE_AGE', 60 * 60 * 24 * 30)
+COOKIE_SALT = 'cart.storage.CookieCart'
+MAX_COOKIE_LINES = 50
+# Khóa của mã giỏ trong cookie (các khóa còn lại là id sản phẩm)
+TOKEN_KEY = 'token'
+CART_FULL_MESSAGE = f'Giỏ hàng đã đầy (tối đa {MAX_COOKIE_LINES} sản phẩm)'
+
+
+class CartFullError(Exception):
+    """Giỏ cookie đã đủ ``MAX_COOKIE_LINES`` sản phẩm, không thêm được sản phẩm mới."""
+
+
+class DatabaseCart:
+    """Giỏ hàng lưu trong CSDL, bọc một đối tượng ``Cart``."""
+
+    def __init__(self, cart):
+        self.cart = cart
+
+    def get_total_items(self):
+        return self.cart.get_total_items()
+
+    def get_total_price(self):
+        return self.cart.get_total_price()
+
+    def get_items(self):
+        return list(self.cart.cartitem_set.select_related('product', 'product__category'))
+
+    def get_item(self, item_id):
+        return self.cart.cartitem_set.select_related('product').filter(pk=item_id).first()
+
+    def add(self, product, quantity):
+        return CartItem.objects.add_quantity(self.cart, product, quantity)
+
+    def set_quantity(self, item, quantity):
+        """Đặt số lượng (chặn theo tồn kho); về 0 thì xóa dòng. Trả về số lượng mới."""
+        quantity = min(quantity, item.product.stock)
+        if quantity > 0:
+            item.quantity = quantity
+            item.save()
+        else:
+            item.delete()
+        return max(quantity, 0)
+
+    def remove(self, item):
+        item.delete()
+
+    def clear(self):
+        """Xóa mọi dòng và tính lại tổng một lần."""
+        with deferred_totals():
+            self.cart.cartitem_set.all().delete()
+        self.cart.refresh_totals()
+
+    def apply_operations(self, operations):
+        return apply_operations(self.cart, operations)
+
+
+class CookieCartItem:
+    """Một dòng của giỏ cookie; ``id`` chính là id sản phẩm."""
+
+    def __init__(self, product, quantity):
+        self.product = product
+        self.quantity = quantity
+
+    @property
+    def id(self):
+        return self.product.pk
+
+    @property
+    def product_id(self):
+        return self.product.pk
+
+    def get_total_price(self):
+        return self.quantity * self.product.price
+
+
+class CookieCart:
+    """Giỏ hàng của khách, lưu ``{product_id: quantity}`` và mã giỏ trong cookie ký số."""
+
+    def __init__(self, request):
+        self.lines, self.token = self._load(request.COOKIES.get(COOKIE_NAME))
+        self.modified = False
+        self._product_map = None
+
+    @staticmethod
+    def _load(raw):
+        if not raw:
+            return {}, None
+        try:
+            data = signing.loads(raw, salt=COOKIE_SALT, max_age=COOKIE_AGE)
+            token = data.pop(TOKEN_KEY, None)
+            return {int(pk): int(quantity) for pk, quantity in data.items() if int(quantity) > 0}, token
+        except (signing.BadSignature, AttributeError, TypeError, ValueError):
+            return {}, None
+
+    @property
+    def checkout_token(self):
+        """Mã của giỏ này, dùng làm khóa idempotency khi đặt hàng.
+
+        Giỏ được tạo mới (sau ``clear``) thì có mã mới; gửi lại form hay đặt từ
+        tab khác với cùng giỏ dùng chung một mã nên chỉ tạo được một đơn.
+        """
+        if self.token is None and self.lines:
+            # Cookie cũ chưa có mã: tạo và ghi lại cookie
+            self.token = secrets.token_urlsafe(16)
+            self.modified = True
+        return self.token
+
+    def _products(self, extra_ids=()):
+        missing = (set(self.lines) | set(extra_ids)) - set(self._product_map or {})
+        if self._product_map is None or missing:
+            self._product_map = dict(self._product_map or {})
+            if missing:
+                products = Product.objects.filter(pk__in=missing, is_available=True)
+                self._product_map.update(products.select_related('category').in_bulk())
+        return self._product_map
+
+    def get_items(self):
+        products = self._products()
+        return [
+            CookieCartItem(products[pk], quantity)
+            for pk, quantity in self.lines.items() if pk in products
+        ]
+
+    def get_total_items(self):
+        return sum(item.quantity for item in self.get_items())
+
+    def get_total_price(self):
+        return sum((item.get_total_price() for item in self.get_items()), Decimal('0'))
+
+    def get_item(self, item_id):
+        if item_id not in self.lines:
+            return None
+        product = self._products().get(item_id)
+        return CookieCartItem(product, self.lines[item_id]) if product else None
+
+    def add(self, product, quantity):
+        """Như ``DatabaseCart.add``; ném ``CartFullError`` nếu giỏ đã đầy."""
+        if product.stock <= 0:
+            return None
+        if product.pk not in self.lines and len(self.lines) >= MAX_COOKIE_LINES:
+            raise CartFullError(CART_FULL_MESSAGE)
+        if not self.lines:
+            self.token = secrets.token_urlsafe(16)
+        self.lines[product.pk] = min(self.lines.get(product.pk, 0) + quantity, product.stock)
+        if self._product_map is not None:
+            self._product_map[product.pk] = product
+        self.modified = True
+        return CookieCartItem(product, self.lines[product.pk])
+
+    def set_quantity(self, item, quantity):
+        quantity = min(quantity, item.product.stock)
+        if quantity > 0:
+            self.lines[item.id] = item.quantity = quantity
+        else:
+            self.lines.pop(item.id, None)
+        self.modified = True
+        return max(quantity, 0)
+
+    def remove(self, item):
+        self.lines.pop(item.id, None)
+        self.modified = True
+
+    def clear(self):
+        self.lines = {}
+        self.token = None
+        self.modified = True
+
+    def apply_operations(self, operations):
+        """Như ``cart.batch.apply_operations`` nhưng trên cookie; ``item_id`` là id sản phẩm."""
+        products = self._products(op['product_id'] for op in operations if op['op'] == 'add')
+        removed, errors = set(), []
+        for op in operations:
+            if op['op'] == 'add':
+                product = products.get(op['product_id'])
+                try:
+                    item = product and self.add(product, op['quantity'])
+                except CartFullError as error:
+                    errors.append({'product_id': op['product_id'], 'message': str(error)})
+                    continue
+                if item is None:
+                    errors.append({'product_id': op['product_id'], 'message': 'Sản phẩm đã hết hàng'})
+                else:
+                    removed.discard(product.pk)
+                continue
+            item = self.get_item(op['item_id'])
+            if item is None:
+                errors.append({'item_id': op['item_id'], 'message': 'Không tìm thấy sản phẩm trong giỏ'})
+                continue
+            quantity = 0 if op['op'] == 'remove' else op['quantity']
+            if self.set_quantity(item, quantity) == 0:
+                removed.add(item.id)
+        return self.get_items(), sorted(removed), errors
+
+    def save(self, response):
+        """Ghi giỏ vào cookie của ``response`` (xóa cookie nếu giỏ trống)."""
+        if not self.lines:
+            response.delete_cookie(COOKIE_NAME)
+            return
+        data = {str(pk): quantity for pk, quantity in self.lines.items()}
+        data[TOKEN_KEY] = self.checkout_token
+        value = signing.dumps(data, salt=COOKIE_SALT, compress=True)
+        response.set_cookie(
+            COOKIE_NAME, value, max_age=COOKIE_AGE, httponly=True, samesite='Lax',
+            secure=settings.SESSION_COOKIE_SECURE,
+        )
+
+
+def get_or_create_cart(request):
+    """Lấy hoặc tạo giỏ hàng CSDL cho user hoặc session"""
+    if request.user.is_authenticated:
+        cart, created = Cart.objects.get_or_create(user=request.user)
+    else:
+        if not request.session.session_key:
+            request.session.create()
+        cart, created = Cart.objects.get_or_create(session_key=request.session.session_key)
+    return cart
+
+
+def get_cart(request):
+    """Giỏ hàng của request theo ``settings.CART_ANONYMOUS_STORAGE``.
+
+    ``'cookie'`` (mặc định) lưu giỏ của khách trong cookie; ``'database'`` giữ
+    cách cũ, tạo phiên và dòng ``Cart`` cho mỗi khách.
+    """
+    if (request.user.is_authenticated
+            or getattr(settings, 'CART_ANONYMOUS_STORAGE', 'cookie') == 'database'):
+        return DatabaseCart(get_or_create_cart(request))
+    return CookieCart(request)
+
+
+async def aget_cart(request):
+    """Như ``get_cart`` nhưng cho view async (dùng ``request.auser()``)."""
+    user = await request.auser()
+    if user.is_authenticated:
+        cart, created = await Cart.objects.aget_or_create(user=user)
+        return DatabaseCart(cart)
+    if getattr(settings, 'CART_ANONYMOUS_STORAGE', 'cookie') == 'database':
+        # Cần tạo phiên (session backend chưa có API async)
+        return await sync_to_async(get_cart)(request)
+    return CookieCart(request)
+
+
+def merge_cookie_cart(request, user):
+    """Gộp giỏ cookie của khách vào giỏ CSDL của ``user`` vừa đăng nhập."""
+    cookie_cart = CookieCart(request)
+    if not cookie_cart.lines:
+        return None
+    cart, created = Cart.objects.get_or_create(user=user)
+    apply_operations(cart, [
+        {'op': 'add', 'product_id': pk, 'quantity': quantity}
+        for pk, quantity in cookie_cart.lines.items()
+    ])
+    request.cart = DatabaseCart(cart)
+    request.cart_cookie_merged = True
+    return cart
@@ -1,3 +1,609 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth import login
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from products.models import Category, Product
+from vegetable_store.paginators import EstimatedCountPaginator
+from vegetable_store.testing import QueryBudgetMixin, QueryPlanMixin
+from .batch import apply_operations
+from .models import Cart, CartItem
+from .storage import COOKIE_NAME
+
+XHR = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+
+def make_product(category, name, price=10000, stock=50, **kwargs):
+    return Product.objects.create(
+        category=category, name=name, description='Rau sạch', price=price,
+        stock=stock, image='products/test.jpg', **kwargs
+    )
+
+
+class CartTestCase(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Rau')
+        self.carrot = make_product(self.category, 'Cà rốt', price=15000)
+        self.cabbage = make_product(self.category, 'Bắp cải', price=20000)
+
+    def login(self):
+        self.user = User.objects.create_user('khach', password='matkhau123')
+        self.client.force_login(self.user)
+
+    def user_cart(self):
+        return Cart.objects.get(user=self.user)
+
+
+class CartTotalsTests(CartTestCase):
+    def test_compute_totals_in_one_query(self):
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=self.carrot, quantity=2)
+        CartItem.objects.create(cart=cart, product=self.cabbage, quantity=3)
+        with self.assertNumQueries(1):
+            self.assertEqual(cart.compute_totals(), (5, Decimal('90000')))
+
+    def test_summary_follows_item_mutations(self):
+        cart = Cart.objects.create()
+        item = CartItem.objects.create(cart=cart, product=self.carrot, quantity=2)
+        CartItem.objects.create(cart=cart, product=self.cabbage, quantity=1)
+        cart.refresh_from_db()
+        self.assertEqual((cart.total_items, cart.total_price), (3, Decimal('50000')))
+
+        item.quantity = 4
+        item.save()
+        cart.refresh_from_db()
+        self.assertEqual((cart.get_total_items(), cart.get_total_price()), (5, Decimal('80000')))
+
+        item.delete()
+        cart.refresh_from_db()
+        self.assertEqual((cart.total_items, cart.total_price), (1, Decimal('20000')))
+
+    def test_summary_follows_price_change(self):
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=self.carrot, quantity=2)
+        self.carrot.price = 12000
+        self.carrot.save()
+        cart.refresh_from_db()
+        self.assertEqual(cart.total_price, Decimal('24000'))
+
+        # Lưu không đổi giá thì không tính lại tổng giỏ
+        product = Product.objects.get(pk=self.carrot.pk)
+        product.stock = 3
+        with CaptureQueriesContext(connection) as context:
+            product.save()
+        self.assertFalse(any('"cart_cart"' in query['sql'] for query in context.captured_queries))
+
+    def test_ajax_responses_report_totals(self):
+        self.login()
+        response = self.client.post(
+            reverse('cart:add_to_cart', args=[self.carrot.pk]), {'quantity': 2}, **XHR
+        )
+        self.assertEqual(response.json()['cart_total_items'], 2)
+        response = self.client.post(
+            reverse('cart:add_to_cart', args=[self.cabbage.pk]), {'quantity': 1}, **XHR
+        )
+        self.assertEqual(response.json()['cart_total_price'], 50000.0)
+
+        item = self.user_cart().cartitem_set.get(product=self.carrot)
+        response = self.client.post(
+            reverse('cart:update_cart_item', args=[item.pk]), {'quantity': 5}, **XHR
+        )
+        self.assertEqual(response.json()['cart_total_items'], 6)
+        response = self.client.get(reverse('cart:remove_from_cart', args=[item.pk]), **XHR)
+        self.assertEqual(response.json()['cart_total_price'], 20000.0)
+
+    def test_cart_page_query_count_does_not_grow_with_lines(self):
+        self.login()
+        self.client.post(reverse('cart:add_to_cart', args=[self.carrot.pk]))
+        # phiên, user, giỏ hàng, các dòng (kèm sản phẩm và danh mục)
+        with self.assertNumQueries(4):
+            self.client.get(reverse('cart:cart_view'))
+        for i in range(10):
+            product = make_product(self.category, f'Rau {i}')
+            self.client.post(reverse('cart:add_to_cart', args=[product.pk]))
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('cart:cart_view'))
+        self.assertContains(response, '11 sản phẩm')
+
+
+class CartQueryBudgetTests(QueryBudgetMixin, CartTestCase):
+    def test_cart_views_stay_within_budget(self):
+        self.login()
+        # Lần thêm đầu tiên còn tạo giỏ hàng, vẫn phải nằm trong ngân sách
+        self.assertQueryBudget(reverse('cart:add_to_cart', args=[self.carrot.pk]), 'post', **XHR)
+        self.assertQueryBudget(
+            reverse('cart:add_to_cart', args=[self.cabbage.pk]), 'post', {'quantity': 1}, **XHR
+        )
+        self.assertQueryBudget(reverse('cart:cart_view'))
+        item = self.user_cart().cartitem_set.get(product=self.carrot)
+        self.assertQueryBudget(
+            reverse('cart:update_cart_item', args=[item.pk]), 'post', {'quantity': 3}, **XHR
+        )
+        self.assertQueryBudget(reverse('cart:remove_from_cart', args=[item.pk]), **XHR)
+
+
+    @override_settings(CART_ANONYMOUS_STORAGE='database')
+    def test_first_add_of_database_guest_cart_stays_within_budget(self):
+        # Tạo phiên (không tính) và giỏ hàng trong cùng request
+        with self.assertNoLogs('vegetable_store.querystats', 'WARNING'):
+            self.assertQueryBudget(reverse('cart:add_to_cart', args=[self.carrot.pk]), 'post', **XHR)
+            self.assertQueryBudget(reverse('cart:cart_view'))
+
+
+class CartQueryPlanTests(QueryPlanMixin, CartTestCase):
+    def test_user_cart_queries_use_indexes(self):
+        self.login()
+        self.client.post(reverse('cart:add_to_cart', args=[self.carrot.pk]))
+        self.assertNoFullScans(reverse('cart:cart_view'))
+        item = self.user_cart().cartitem_set.get()
+        self.assertNoFullScans(
+            reverse('cart:update_cart_item', args=[item.pk]), 'post', {'quantity': 2}, **XHR
+        )
+
+    @override_settings(CART_ANONYMOUS_STORAGE='database')
+    def test_session_cart_lookup_uses_index(self):
+        self.client.post(reverse('cart:add_to_cart', args=[self.carrot.pk]))
+        plans = self.assertNoFullScans(reverse('cart:cart_view'))
+        self.assertTrue(any('cart_cart' in plan and 'session_key' in plan for sql, plan in plans))
+
+
+class AtomicAddToCartTests(CartTestCase):
+    def test_add_quantity_increments_and_caps_at_stock(self):
+        cart = Cart.objects.create()
+        self.assertEqual(CartItem.objects.add_quantity(cart, self.carrot, 3).quantity, 3)
+        item = CartItem.objects.add_quantity(cart, self.carrot, 4)
+        self.assertEqual(item.quantity, 7)
+        self.assertEqual(CartItem.objects.add_quantity(cart, self.carrot, 100).quantity, 50)
+        self.assertEqual(CartItem.objects.get(pk=item.pk).quantity, 50)
+        self.assertEqual((cart.total_items, cart.total_price), (50, Decimal('750000')))
+
+    def test_out_of_stock_product_is_not_added(self):
+        cart = Cart.objects.create()
+        self.carrot.stock = 0
+        self.carrot.save()
+        self.assertIsNone(CartItem.objects.add_quantity(cart, self.carrot, 1))
+        self.assertFalse(cart.cartitem_set.exists())
+        response = self.client.post(reverse('cart:add_to_cart', args=[self.carrot.pk]), **XHR)
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(response.json()['success'])
+
+    def test_update_is_capped_at_stock(self):
+        self.login()
+        self.client.post(reverse('cart:add_to_cart', args=[self.carrot.pk]))
+        item = self.user_cart().cartitem_set.get()
+        self.client.post(reverse('cart:update_cart_item', args=[item.pk]), {'quantity': 999})
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 50)
+
+    def test_invalid_quantity_defaults_to_one(self):
+        response = self.client.post(
+            reverse('cart:add_to_cart', args=[self.carrot.pk]), {'quantity': 'abc'}, **XHR
+        )
+        self.assertEqual(response.json()['cart_total_items'], 1)
+
+
+class ConcurrentAddToCartTests(TransactionTestCase):
+    workers = 8
+    adds_per_worker = 25
+
+    def hammer(self, cart, product, batch_workers=0):
+        def worker(index):
+            done = 0
+            try:
+                while done < self.adds_per_worker:
+                    try:
+                        if index < batch_workers:
+                            apply_operations(cart, [{'op': 'add', 'product_id': product.pk, 'quantity': 1}])
+                        else:
+                            CartItem.objects.add_quantity(cart, product, 1)
+                    except OperationalError:
+                        # SQLite khóa ghi theo cả CSDL: thử lại như một client thật
+                        continue
+                    done += 1
+            finally:
+                connection.close()
+            return done
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return sum(pool.map(worker, range(self.workers)))
+
+    def test_no_lost_increments(self):
+        category = Category.objects.create(name='Rau')
+        product = make_product(category, 'Cà rốt', stock=10_000)
+        cart = Cart.objects.create()
+        total = self.hammer(cart, product)
+        item = CartItem.objects.get(cart=cart, product=product)
+        self.assertEqual(item.quantity, total)
+        self.assertEqual(total, self.workers * self.adds_per_worker)
+
+    def test_batch_and_single_adds_do_not_lose_updates(self):
+        category = Category.objects.create(name='Rau')
+        product = make_product(category, 'Cà rốt', stock=10_000)
+        cart = Cart.objects.create()
+        total = self.hammer(cart, product, batch_workers=self.workers // 2)
+        self.assertEqual(CartItem.objects.get(cart=cart, product=product).quantity, total)
+        cart.refresh_from_db()
+        self.assertEqual(cart.total_items, total)
+
+    def test_concurrent_adds_never_exceed_stock(self):
+        category = Category.objects.create(name='Rau')
+        product = make_product(category, 'Cà rốt', stock=60)
+        cart = Cart.objects.create()
+        self.hammer(cart, product)
+        self.assertEqual(CartItem.objects.get(cart=cart, product=product).quantity, 60)
+
+
+class BatchUpdateTests(QueryBudgetMixin, CartTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login()
+
+    def batch(self, *operations, budget=None):
+        return self.assertQueryBudget(
+            reverse('cart:batch_update'), 'post',
+            json.dumps({'operations': list(operations)}),
+            budget=budget, content_type='application/json', **XHR
+        )
+
+    def test_applies_mixed_operations_in_one_request(self):
+        self.client.post(reverse('cart:add_to_cart', args=[self.carrot.pk]), {'quantity': 2})
+        carrot_line = self.user_cart().cartitem_set.get()
+        lettuce = make_product(self.category, 'Xà lách', price=5000, stock=3)
+
+        data = self.batch(
+            {'op': 'set', 'item_id': carrot_line.pk, 'quantity': 4},
+            {'op': 'add', 'product_id': self.cabbage.pk, 'quantity': 1},
+            {'op': 'add', 'product_id': self.cabbage.pk, 'quantity': 2},
+            {'op': 'add', 'product_id': lettuce.pk, 'quantity': 10},
+        ).json()
+
+        self.assertTrue(data['success'])
+        lines = {item['product_id']: item for item in data['items']}
+        self.assertEqual(lines[self.carrot.pk]['quantity'], 4)
+        self.assertEqual(lines[self.cabbage.pk]['line_total'], 60000.0)
+        self.assertEqual(lines[lettuce.pk]['quantity'], 3)
+        self.assertEqual(data['cart_total_items'], 10)
+        self.assertEqual(data['cart_total_price'], 135000.0)
+        cart = self.user_cart()
+        self.assertEqual((cart.total_items, cart.total_price), (10, Decimal('135000')))
+
+    def test_set_zero_and_remove_delete_lines(self):
+        self.client.post(reverse('cart:add_to_cart', args=[self.carrot.pk]))
+        self.client.post(reverse('cart:add_to_cart', args=[self.cabbage.pk]))
+        carrot_line, cabbage_line = self.user_cart().cartitem_set.order_by('pk')
+        data = self.batch(
+            {'op': 'set', 'item_id': carrot_line.pk, 'quantity': 0},
+            {'op': 'remove', 'item_id': cabbage_line.pk},
+        ).json()
+        self.assertEqual(data['removed'], [carrot_line.pk, cabbage_line.pk])
+        self.assertEqual(data['cart_total_items'], 0)
+        self.assertFalse(CartItem.objects.exists())
+
+    def test_reports_per_operation_errors(self):
+        self.client.post(reverse('cart:add_to_cart', args=[self.cabbage.pk]))
+        self.carrot.stock = 0
+        self.carrot.save()
+        data = self.batch(
+            {'op': 'add', 'product_id': self.carrot.pk},
+            {'op': 'remove', 'item_id': 999},
+        ).json()
+        self.assertFalse(data['success'])
+        self.assertEqual(len(data['errors']), 2)
+
+    def test_rejects_malformed_payload(self):
+        for body in ('không phải json', '{}', '{"operations": [{"op": "drop"}]}',
+                     '{"operations": [{"op": "set", "item_id": 1, "quantity": -1}]}'):
+            response = self.client.post(reverse('cart:batch_update'), body, content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+
+
+class CookieCartTests(QueryBudgetMixin, CartTestCase):
+    def add(self, product, quantity=1):
+        return self.client.post(
+            reverse('cart:add_to_cart', args=[product.pk]), {'quantity': quantity}, **XHR
+        )
+
+    def test_anonymous_cart_writes_nothing_to_database(self):
+        # chỉ đọc sản phẩm: không phiên, không giỏ hàng CSDL
+        with self.assertMaxQueries(5) as context:
+            data = self.add(self.carrot, 2).json()
+            self.add(self.cabbage).json()
+            self.client.get(reverse('cart:cart_view'))
+        self.assertFalse(any(
+            query['sql'].split()[0] in ('INSERT', 'UPDATE', 'DELETE')
+            for query in context.captured_queries
+        ))
+        self.assertEqual(data['cart_total_items'], 2)
+        self.assertFalse(Cart.objects.exists())
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, self.client.cookies)
+        self.assertIn(COOKIE_NAME, self.client.cookies)
+
+    def test_cookie_cart_api_matches_database_cart(self):
+        self.add(self.carrot, 2)
+        data = self.add(self.cabbage).json()
+        self.assertEqual((data['cart_total_items'], data['cart_total_price']), (3, 50000.0))
+
+        response = self.client.get(reverse('cart:cart_view'))
+        self.assertContains(response, '3 sản phẩm')
+        self.assertContains(response, self.carrot.name)
+
+        response = self.client.post(
+            reverse('cart:update_cart_item', args=[self.carrot.pk]), {'quantity': 999}, **XHR
+        )
+        self.assertEqual(response.json()['cart_total_items'], 51)
+        response = self.client.get(reverse('cart:remove_from_cart', args=[self.cabbage.pk]), **XHR)
+        self.assertEqual(response.json()['cart_total_price'], 750000.0)
+        response = self.client.get(reverse('cart:remove_from_cart', args=[self.cabbage.pk]), **XHR)
+        self.assertEqual(response.status_code, 404)
+
+    def test_batch_operations_on_cookie_cart(self):
+        self.add(self.carrot)
+        response = self.client.post(
+            reverse('cart:batch_update'),
+            json.dumps({'operations': [
+                {'op': 'set', 'item_id': self.carrot.pk, 'quantity': 0},
+                {'op': 'add', 'product_id': self.cabbage.pk, 'quantity': 3},
+            ]}),
+            content_type='application/json', **XHR
+        )
+        data = response.json()
+        self.assertEqual(data['removed'], [self.carrot.pk])
+        self.assertEqual(data['items'][0]['product_id'], self.cabbage.pk)
+        self.assertEqual(data['cart_total_price'], 60000.0)
+
+    @mock.patch('cart.storage.MAX_COOKIE_LINES', 1)
+    def test_full_cookie_cart_is_not_reported_as_out_of_stock(self):
+        self.add(self.carrot)
+        response = self.add(self.cabbage)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('Giỏ hàng đã đầy', response.json()['message'])
+        # Sản phẩm đã có trong giỏ vẫn cộng thêm được
+        self.assertEqual(self.add(self.carrot).json()['cart_total_items'], 2)
+
+        response = self.client.post(
+            reverse('cart:add_to_cart', args=[self.cabbage.pk]), {'quantity': 1}, follow=True,
+        )
+        self.assertContains(response, 'Giỏ hàng đã đầy')
+        self.assertNotContains(response, 'đã hết hàng')
+
+        response = self.client.post(
+            reverse('cart:batch_update'),
+            json.dumps({'operations': [{'op': 'add', 'product_id': self.cabbage.pk, 'quantity': 1}]}),
+            content_type='application/json', **XHR
+        )
+        self.assertIn('Giỏ hàng đã đầy', response.json()['errors'][0]['message'])
+
+    def test_tampered_cookie_is_ignored(self):
+        self.add(self.carrot)
+        self.client.cookies[COOKIE_NAME] = self.client.cookies[COOKIE_NAME].value + 'x'
+        response = self.client.get(reverse('cart:cart_view'))
+        self.assertContains(response, 'đang trống')
+
+    def test_cookie_cart_is_merged_on_login(self):
+        user = User.objects.create_user('khach', password='matkhau123')
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.create(cart=cart, product=self.carrot, quantity=1)
+        self.add(self.carrot, 2)
+        self.add(self.cabbage)
+
+        request = RequestFactory().get('/')
+        request.COOKIES[COOKIE_NAME] = self.client.cookies[COOKIE_NAME].value
+        request.session = self.client.session
+        login(request, user)
+
+        cart.refresh_from_db()
+        self.assertEqual((cart.total_items, cart.total_price), (4, Decimal('65000')))
+        self.assertTrue(request.cart_cookie_merged)
+        self.assertEqual(request.cart.get_total_items(), 4)
+
+    @override_settings(CART_ANONYMOUS_STORAGE='database')
+    def test_database_storage_for_anonymous_visitors(self):
+        self.add(self.carrot, 2)
+        cart = Cart.objects.get(session_key=self.client.session.session_key)
+        self.assertEqual(cart.total_items, 2)
+        self.assertNotIn(COOKIE_NAME, self.client.cookies)
+
+
+class CartAdminTests(CartTestCase):
+    def setUp(self):
+        super().setUp()
+        admin = User.objects.create_superuser('quantri', 'admin@example.com', 'matkhau123')
+        self.client.force_login(admin)
+
+    def add_carts(self, count):
+        for i in range(count):
+            cart = Cart.objects.create(user=User.objects.create_user(f'khach{Cart.objects.count()}'))
+            CartItem.objects.create(cart=cart, product=self.carrot, quantity=2)
+            CartItem.objects.create(cart=cart, product=self.cabbage)
+
+    def changelist_queries(self, name):
+        # Đo khi số đếm cả bảng của EstimatedCountPaginator chưa có trong cache
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(reverse(f'admin:cart_{name}_changelist'))
+        self.assertEqual(response.status_code, 200)
+        return response, len(context)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        self.add_carts(2)
+        counts = [self.changelist_queries('cart')[1], self.changelist_queries('cartitem')[1]]
+        self.add_carts(10)
+        response, carts = self.changelist_queries('cart')
+        self.assertEqual([carts, self.changelist_queries('cartitem')[1]], counts)
+        self.assertEqual(response.context['cl'].result_list[0].line_count, 2)
+
+        url = reverse('admin:cart_cartitem_changelist')
+        response = self.client.get(url, {'o': '-4'})
+        self.assertEqual(response.context['cl'].result_list[0].line_total, Decimal('30000'))
+
+    def test_cart_change_form_uses_autocomplete_for_products(self):
+        self.add_carts(1)
+        response = self.client.get(reverse('admin:cart_cart_change', args=[Cart.objects.get().pk]))
+        self.assertContains(response, 'admin-autocomplete')
+        self.assertContains(self.client.get(reverse('admin:products_product_changelist')), 'Cà rốt')
+
+    def test_estimated_count_for_unfiltered_changelist(self):
+        self.add_carts(5)
+        Cart.objects.filter(pk__in=list(Cart.objects.order_by('pk').values_list('pk', flat=True)[:2])).delete()
+        cache.clear()
+        paginator = EstimatedCountPaginator(Cart.objects.order_by('pk'), 2)
+        paginator.exact_count_below = 0
+        # Không có sqlite_stat1: COUNT(*) cả bảng, lưu cache
+        self.assertEqual(paginator.count, 3)
+        Cart.objects.bulk_create([Cart(session_key=f'khach-{i}') for i in range(2)])
+        with self.assertNumQueries(1):
+            paginator = EstimatedCountPaginator(Cart.objects.order_by('pk'), 2)
+            paginator.exact_count_below = 0
+            self.assertEqual(paginator.count, 3)
+        filtered = EstimatedCountPaginator(Cart.objects.filter(total_items__gt=0).order_by('pk'), 2)
+        filtered.exact_count_below = 0
+        self.assertEqual(filtered.count, 3)
+        self.assertEqual(EstimatedCountPaginator(Cart.objects.order_by('pk'), 2).count, 5)
+
+    def test_estimated_count_is_clamped_when_last_page_is_empty(self):
+        self.add_carts(3)
+        cache.clear()
+        paginator = EstimatedCountPaginator(Cart.objects.order_by('pk'), 2)
+        paginator.exact_count_below = 0
+        self.assertEqual(paginator.num_pages, 2)
+        Cart.objects.filter(pk__in=list(Cart.objects.order_by('pk').values_list('pk', flat=True)[:2])).delete()
+        # Số đếm trong cache đã cũ: trang 2 rỗng thì đếm lại và trả về trang cuối thật
+        paginator = EstimatedCountPaginator(Cart.objects.order_by('pk'), 2)
+        paginator.exact_count_below = 0
+        page = paginator.page(2)
+        self.assertEqual((paginator.count, paginator.num_pages, page.number), (1, 1, 1))
+        self.assertEqual(len(page.object_list), 1)
+        fresh = EstimatedCountPaginator(Cart.objects.order_by('pk'), 2)
+        fresh.exact_count_below = 0
+        self.assertEqual(fresh.count, 1)
+
+
+class PurgeCartsTests(CartTestCase):
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        live = SessionStore()
+        live.create()
+        self.live = Cart.objects.create(session_key=live.session_key)
+        self.idle = Cart.objects.create(session_key=live.session_key)
+        self.expired = Cart.objects.create(session_key='het-han')
+        Session.objects.create(session_key='het-han', session_data='', expire_date=now - timedelta(days=1))
+        self.user_cart = Cart.objects.create(user=User.objects.create_user('khach'))
+        for cart in (self.live, self.idle, self.expired, self.user_cart):
+            CartItem.objects.create(cart=cart, product=self.carrot, quantity=1)
+        Cart.objects.exclude(pk=self.live.pk).update(updated_at=now - timedelta(days=40))
+
+    def purge(self, *args):
+        out = StringIO()
+        call_command('purge_carts', '--batch-size', '1', *args, stdout=out)
+        return out.getvalue()
+
+    def test_deletes_idle_and_expired_guest_carts_in_batches(self):
+        output = self.purge('--days', '30')
+        self.assertIn('Đã xóa 2 giỏ hàng, 2 dòng và 1 phiên hết hạn', output)
+        self.assertEqual(
+            set(Cart.objects.values_list('pk', flat=True)), {self.live.pk, self.user_cart.pk}
+        )
+        self.assertEqual(CartItem.objects.count(), 2)
+        self.assertFalse(Session.objects.filter(session_key='het-han').exists())
+
+    def test_dry_run_changes_nothing(self):
+        output = self.purge('--dry-run')
+        self.assertIn('Sẽ xóa 2 giỏ hàng, 2 dòng và 1 phiên hết hạn', output)
+        self.assertEqual(Cart.objects.count(), 4)
+        self.assertEqual(Session.objects.count(), 2)
+
+    def test_archives_carts_before_deleting(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'carts.jsonl')
+            self.purge('--archive', path, '--skip-sessions')
+            with open(path, encoding='utf-8') as archive:
+                rows = [json.loads(line) for line in archive]
+        self.assertEqual([row['id'] for row in rows], [self.idle.pk, self.expired.pk])
+        self.assertEqual(rows[0]['items'], [{'product_id': self.carrot.pk, 'quantity': 1}])
+        self.assertEqual(Session.objects.count(), 2)
+
+    def test_cart_activity_postpones_purge(self):
+        self.idle.refresh_totals()
+        self.purge('--skip-sessions')
+        self.assertTrue(Cart.objects.filter(pk=self.idle.pk).exists())
+
+    @override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cache')
+    def test_session_table_is_ignored_without_database_sessions(self):
+        # Phiên nằm trong cache: giỏ mới không bị coi là bỏ quên vì thiếu dòng django_session
+        fresh = Cart.objects.create(session_key='trong-cache')
+        output = self.purge('--days', '30')
+        self.assertIn('Đã xóa 2 giỏ hàng, 2 dòng và 0 phiên hết hạn', output)
+        self.assertTrue(Cart.objects.filter(pk=fresh.pk).exists())
+        self.assertTrue(Cart.objects.filter(pk=self.live.pk).exists())
+
+
+@override_settings(ROOT_URLCONF='vegetable_store.urls_async')
+class AsyncCartEndpointTests(CartTestCase):
+    headers = {'X-Requested-With': 'XMLHttpRequest'}
+
+    async def add(self, product, quantity=1, **kwargs):
+        kwargs.setdefault('headers', self.headers)
+        return await self.async_client.post(
+            reverse('cart:add_to_cart', args=[product.pk]), {'quantity': quantity}, **kwargs
+        )
+
+    async def test_cookie_cart_round_trip(self):
+        response = await self.add(self.carrot, 2)
+        self.assertTrue(iscoroutinefunction(response.resolver_match.func))
+        self.assertEqual(response.json()['cart_total_items'], 2)
+        self.assertIn(COOKIE_NAME, response.cookies)
+        self.assertEqual((await self.add(self.cabbage)).json()['cart_total_items'], 3)
+
+        url = reverse('cart:update_cart_item', args=[self.carrot.pk])
+        response = await self.async_client.post(url, {'quantity': 5}, headers=self.headers)
+        self.assertEqual(response.json()['cart_total_items'], 6)
+        url = reverse('cart:remove_from_cart', args=[self.cabbage.pk])
+        response = await self.async_client.get(url, headers=self.headers)
+        self.assertEqual(response.json()['cart_total_items'], 5)
+        self.assertFalse(await Cart.objects.aexists())
+
+    async def test_logged_in_cart_uses_database(self):
+        user = await User.objects.acreate_user('khach', password='matkhau123')
+        await self.async_client.aforce_login(user)
+        cart = await Cart.objects.acreate(user=user)
+        await self.add(self.carrot, 2)
+        response = await self.async_client.post(
+            reverse('cart:batch_update'),
+            json.dumps({'operations': [{'op': 'add', 'product_id': self.cabbage.pk, 'quantity': 3}]}),
+            content_type='application/json', headers=self.headers,
+        )
+        self.assertEqual(response.json()['cart_total_items'], 5)
+        await cart.arefresh_from_db()
+        self.assertEqual(cart.total_items, 5)
+
+    async def test_errors_and_non_ajax_fallback(self):
+        self.carrot.stock = 0
+        await self.carrot.asave()
+        self.assertEqual((await self.add(self.carrot)).status_code, 409)
+        response = await self.async_client.get(
+            reverse('cart:update_cart_item', args=[self.cabbage.pk]), headers=self.headers
+        )
+        self.assertEqual(response.status_code, 405)
+        # Form thường: view đồng bộ ghi messages rồi chuyển về trang giỏ hàng
+        response = await self.add(self.cabbage, headers={})
+        self.assertRedirects(response, reverse('cart:cart_view'), fetch_redirect_response=False)
+        self.assertIn(COOKIE_NAME, response.cookies)
@@ -1,11 +1,19 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'cart'
 
-urlpatterns = [
-    path('', views.cart_view, name='cart_view'),
-    path('add/<int:product_id>/', views.add_to_cart, name='add_to_cart'),
-    path('update/<int:item_id>/', views.update_cart_item, name='update_cart_item'),
-    path('remove/<int:item_id>/', views.remove_from_cart, name='remove_from_cart'),
-]
+
+def build_urlpatterns(module):
+    return [
+        path('', module.cart_view, name='cart_view'),
+        path('add/<int:product_id>/', module.add_to_cart, name='add_to_cart'),
+        path('update/<int:item_id>/', module.update_cart_item, name='update_cart_item'),
+        path('remove/<int:item_id>/', module.remove_from_cart, name='remove_from_cart'),
+        path('batch/', module.batch_update, name='batch_update'),
+    ]
+
+
+# Dưới ASGI (settings.ASYNC_VIEWS) dùng endpoint async, WSGI giữ view đồng bộ
+urlpatterns = build_urlpatterns(async_views if settings.ASYNC_VIEWS else views)
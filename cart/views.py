@@ -1,97 +1,152 @@
+import json
+
 from django.shortcuts import render, get_object_or_404, redirect
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.contrib import messages
 from django.views.decorators.http import require_POST
-from .models import Cart, CartItem
+from .batch import BatchError, parse_operations
+from .storage import CartFullError
 from products.models import Product
 
-def get_or_create_cart(request):
-    """Lấy hoặc tạo giỏ hàng cho user hoặc session"""
-    if request.user.is_authenticated:
-        cart, created = Cart.objects.get_or_create(user=request.user)
-    else:
-        if not request.session.session_key:
-            request.session.create()
-        cart, created = Cart.objects.get_or_create(session_key=request.session.session_key)
-    return cart
+def is_ajax(request):
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
+
+def cart_totals(cart):
+    return {
+        'cart_total_items': cart.get_total_items(),
+        'cart_total_price': float(cart.get_total_price()),
+    }
+
+def parse_quantity(value, default):
+    """Đọc số lượng từ dữ liệu form, sai định dạng thì dùng ``default``"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
 
 def cart_view(request):
     """Hiển thị giỏ hàng"""
-    cart = get_or_create_cart(request)
-    cart_items = CartItem.objects.filter(cart=cart)
+    cart = request.cart
     
     context = {
         'cart': cart,
-        'cart_items': cart_items,
+        'cart_items': cart.get_items(),
     }
     return render(request, 'cart/cart.html', context)
 
+def add_result(cart, product, quantity):
+    """Thêm vào giỏ, trả về ``(thành công, thông báo)``"""
+    # Số lượng bị chặn bởi tồn kho (giỏ CSDL dùng upsert nguyên tử)
+    try:
+        cart_item = cart.add(product, quantity)
+    except CartFullError as error:
+        return False, str(error)
+    if cart_item is None:
+        return False, f"{product.name} đã hết hàng"
+    return True, f"Đã thêm {product.name} vào giỏ hàng (hiện có {cart_item.quantity} {product.unit})"
+
+def add_json(cart, product, quantity):
+    """Response cho request AJAX thêm vào giỏ (dùng chung cho view đồng bộ và async)"""
+    success, message = add_result(cart, product, quantity)
+    if not success:
+        return JsonResponse({'success': False, 'message': message}, status=409)
+    return JsonResponse({'success': True, 'message': message, **cart_totals(cart)})
+
 @require_POST
 def add_to_cart(request, product_id):
     """Thêm sản phẩm vào giỏ hàng"""
     product = get_object_or_404(Product, id=product_id, is_available=True)
-    cart = get_or_create_cart(request)
-    quantity = int(request.POST.get('quantity', 1))
-    
-    try:
-        cart_item = CartItem.objects.get(cart=cart, product=product)
-        cart_item.quantity += quantity
-        cart_item.save()
-        message = f"Đã cập nhật số lượng {product.name} trong giỏ hàng"
-    except CartItem.DoesNotExist:
-        cart_item = CartItem.objects.create(cart=cart, product=product, quantity=quantity)
-        message = f"Đã thêm {product.name} vào giỏ hàng"
+    cart = request.cart
+    quantity = max(parse_quantity(request.POST.get('quantity'), 1), 1)
     
-    messages.success(request, message)
-    
-    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        return JsonResponse({
-            'success': True,
-            'message': message,
-            'cart_total_items': cart.get_total_items(),
-            'cart_total_price': float(cart.get_total_price())
-        })
+    # Request AJAX tự hiển thị thông báo, không ghi vào messages
+    if is_ajax(request):
+        return add_json(cart, product, quantity)
     
+    success, message = add_result(cart, product, quantity)
+    if success:
+        messages.success(request, message)
+    else:
+        messages.error(request, message)
     return redirect('cart:cart_view')
 
+def get_cart_item_or_404(cart, item_id):
+    cart_item = cart.get_item(item_id)
+    if cart_item is None:
+        raise Http404("Không tìm thấy sản phẩm trong giỏ hàng")
+    return cart_item
+
+def update_json(cart, item_id, quantity):
+    """Response cho request AJAX cập nhật số lượng"""
+    cart.set_quantity(get_cart_item_or_404(cart, item_id), quantity)
+    return JsonResponse({'success': True, **cart_totals(cart)})
+
+def remove_json(cart, item_id):
+    """Response cho request AJAX xóa dòng"""
+    cart.remove(get_cart_item_or_404(cart, item_id))
+    return JsonResponse({'success': True, **cart_totals(cart)})
+
 @require_POST
 def update_cart_item(request, item_id):
     """Cập nhật số lượng sản phẩm trong giỏ hàng"""
-    cart = get_or_create_cart(request)
-    cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-    quantity = int(request.POST.get('quantity', 1))
+    cart = request.cart
+    quantity = parse_quantity(request.POST.get('quantity'), 1)
+    if is_ajax(request):
+        return update_json(cart, item_id, quantity)
+    
+    cart_item = get_cart_item_or_404(cart, item_id)
+    # Không cho vượt quá tồn kho; hết hàng thì dòng bị xóa
+    quantity = cart.set_quantity(cart_item, quantity)
     
     if quantity > 0:
-        cart_item.quantity = quantity
-        cart_item.save()
         messages.success(request, f"Đã cập nhật số lượng {cart_item.product.name}")
     else:
-        cart_item.delete()
         messages.success(request, f"Đã xóa {cart_item.product.name} khỏi giỏ hàng")
-    
-    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        return JsonResponse({
-            'success': True,
-            'cart_total_items': cart.get_total_items(),
-            'cart_total_price': float(cart.get_total_price())
-        })
-    
     return redirect('cart:cart_view')
 
 def remove_from_cart(request, item_id):
     """Xóa sản phẩm khỏi giỏ hàng"""
-    cart = get_or_create_cart(request)
-    cart_item = get_object_or_404(CartItem, id=item_id, cart=cart)
-    product_name = cart_item.product.name
-    cart_item.delete()
-    
-    messages.success(request, f"Đã xóa {product_name} khỏi giỏ hàng")
-    
-    if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        return JsonResponse({
-            'success': True,
-            'cart_total_items': cart.get_total_items(),
-            'cart_total_price': float(cart.get_total_price())
-        })
+    cart = request.cart
+    if is_ajax(request):
+        return remove_json(cart, item_id)
     
+    cart_item = get_cart_item_or_404(cart, item_id)
+    cart.remove(cart_item)
+    messages.success(request, f"Đã xóa {cart_item.product.name} khỏi giỏ hàng")
     return redirect('cart:cart_view')
+
+def parse_batch(request):
+    """Đọc thao tác từ body JSON; trả về ``(operations, response lỗi 400 hoặc None)``"""
+    try:
+        return parse_operations(json.loads(request.body)), None
+    except (ValueError, UnicodeDecodeError) as exc:
+        message = str(exc) if isinstance(exc, BatchError) else 'Dữ liệu JSON không hợp lệ'
+        return None, JsonResponse({'success': False, 'message': message}, status=400)
+
+def batch_json(cart, operations):
+    """Áp dụng thao tác và trả về response JSON (dùng chung cho view đồng bộ và async)"""
+    items, removed, errors = cart.apply_operations(operations)
+    
+    return JsonResponse({
+        'success': not errors,
+        'items': [
+            {
+                'id': item.id,
+                'product_id': item.product_id,
+                'quantity': item.quantity,
+                'line_total': float(item.get_total_price()),
+            }
+            for item in items
+        ],
+        'removed': removed,
+        'errors': errors,
+        **cart_totals(cart),
+    })
+
+@require_POST
+def batch_update(request):
+    """Áp dụng nhiều thao tác thêm/sửa/xóa trong một request JSON"""
+    operations, error = parse_batch(request)
+    if error is not None:
+        return error
+    return batch_json(request.cart, operations)
@@ -0,0 +1,22 @@
+from django.contrib import admin
+
+from vegetable_store.paginators import EstimatedCountPaginator
+from .models import Order, OrderLine
+
+class OrderLineInline(admin.TabularInline):
+    model = OrderLine
+    extra = 0
+    raw_id_fields = ['product']
+    readonly_fields = ['product_name', 'unit_price', 'quantity']
+
+@admin.register(Order)
+class OrderAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'full_name', 'phone', 'total_items', 'total_price', 'created_at']
+    list_filter = ['created_at']
+    search_fields = ['full_name', 'phone']
+    list_select_related = ['user']
+    raw_id_fields = ['user']
+    readonly_fields = ['total_items', 'total_price', 'created_at']
+    inlines = [OrderLineInline]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
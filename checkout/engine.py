@@ -0,0 +1,147 @@
+"""Đặt hàng: trừ tồn kho nguyên tử và tạo ``Order`` trong một transaction.
+
+Mỗi dòng trừ kho bằng một câu ``UPDATE ... SET stock = stock - q WHERE id = ?
+AND stock >= q``: điều kiện nằm trong chính câu ghi (không đọc rồi mới ghi), nên
+hai đơn đặt cùng lúc không thể cùng lấy phần hàng cuối cùng, câu đến sau đơn
+giản là không khớp dòng nào. Các dòng được trừ theo id sản phẩm tăng dần để mọi
+transaction khóa dòng theo cùng một thứ tự, tránh deadlock trên CSDL khóa theo
+dòng (PostgreSQL, MySQL); SQLite khóa cả CSDL khi ghi nên không gặp vấn đề này.
+
+Nếu có dòng không đủ hàng, cả transaction bị hủy và ``CheckoutError.failures``
+liệt kê từng dòng thiếu cùng số lượng còn lại để khách sửa giỏ.
+
+Với giỏ CSDL, các dòng giỏ hàng bị xóa trong cùng transaction: request đặt lại
+cùng giỏ (gửi form hai lần, hai tab) không còn dòng nào để xóa và bị từ chối,
+và không thể có đơn đã đặt mà giỏ vẫn còn nguyên. Giỏ cookie không có gì để xóa
+trong CSDL nên dùng mã giỏ (``checkout_token``, duy nhất trên ``Order``) làm khóa
+idempotency: đơn thứ hai với cùng mã bị từ chối và cả transaction bị hủy.
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from cart.models import Cart, CartItem, deferred_totals
+from products.cache import bump_products
+from products.models import Product
+from .models import Order, OrderLine
+
+
+class CheckoutError(Exception):
+    """Không đặt được hàng; ``failures`` là các dòng thiếu hàng."""
+
+    def __init__(self, message, failures=()):
+        super().__init__(message)
+        self.failures = list(failures)
+
+
+class DuplicateOrderError(CheckoutError):
+    """Giỏ (theo ``token``) đã tạo một đơn trước đó."""
+
+    def __init__(self):
+        super().__init__('Giỏ hàng này đã được đặt hàng')
+
+
+def reserve_stock(quantities, now=None):
+    """Trừ kho cho ``{product_id: số lượng}``; trả về danh sách id không đủ hàng.
+
+    Phải gọi trong transaction: các dòng đã trừ chỉ được giữ nếu không dòng nào thiếu.
+    """
+    now = now or timezone.now()
+    failed = []
+    for product_id in sorted(quantities):
+        quantity = quantities[product_id]
+        updated = Product.objects.filter(
+            pk=product_id, is_available=True, stock__gte=quantity,
+        ).update(stock=F('stock') - quantity, updated_at=now)
+        if not updated:
+            failed.append(product_id)
+    return failed
+
+
+def availability_failures(product_ids, quantities):
+    products = Product.objects.in_bulk(product_ids)
+    failures = []
+    for product_id in product_ids:
+        product = products.get(product_id)
+        available = max(product.stock, 0) if product and product.is_available else 0
+        failures.append({
+            'product_id': product_id,
+            'name': product.name if product else '',
+            'requested': quantities[product_id],
+            'available': available,
+        })
+    return failures
+
+
+def claim_cart_items(cart_items):
+    """Xóa các dòng ``cart_items`` (đã đọc từ giỏ CSDL) trước khi đặt hàng.
+
+    Phải gọi trong transaction. Ném ``CheckoutError`` nếu có dòng đã bị xóa hoặc
+    đặt hàng bởi request khác.
+    """
+    with deferred_totals():
+        deleted, _ = CartItem.objects.filter(pk__in=[item.pk for item in cart_items]).delete()
+    if deleted != len(cart_items):
+        raise CheckoutError('Giỏ hàng đã thay đổi, vui lòng kiểm tra lại')
+    Cart.objects.filter(pk__in={item.cart_id for item in cart_items}).refresh_totals()
+
+
+def place_order(lines, user=None, cart_items=None, token=None, **details):
+    """Tạo đơn từ ``lines`` (``[(product_id, số lượng)]``), trả về ``Order``.
+
+    ``details`` là thông tin giao hàng của ``Order`` (``full_name``, ``phone``,
+    ``address``, ``note``). ``cart_items`` là các ``CartItem`` tạo nên đơn (giỏ
+    CSDL); chúng bị xóa trong cùng transaction với đơn hàng. ``token`` là mã giỏ
+    cookie; mỗi mã chỉ tạo được một đơn. Ném ``CheckoutError`` nếu giỏ trống, đã
+    thay đổi, đã được đặt hoặc thiếu hàng.
+    """
+    quantities = Counter()
+    for product_id, quantity in lines:
+        if quantity > 0:
+            quantities[product_id] += quantity
+    if not quantities:
+        raise CheckoutError('Giỏ hàng đang trống')
+
+    try:
+        return _create_order(quantities, user, cart_items, token, details)
+    except IntegrityError:
+        # Request khác cùng mã giỏ vừa ghi đơn trước (transaction này đã bị hủy)
+        if token and Order.objects.filter(checkout_token=token).exists():
+            raise DuplicateOrderError
+        raise
+
+
+def _create_order(quantities, user, cart_items, token, details):
+    with transaction.atomic():
+        if token and Order.objects.filter(checkout_token=token).exists():
+            raise DuplicateOrderError
+        if cart_items is not None:
+            claim_cart_items(cart_items)
+        failed = reserve_stock(quantities)
+        if failed:
+            # Đọc số còn lại trước khi hủy transaction (các dòng thiếu không bị trừ)
+            raise CheckoutError('Không đủ hàng cho một số sản phẩm', availability_failures(failed, quantities))
+
+        # Giá đọc sau khi trừ kho, trong cùng transaction với đơn hàng
+        products = Product.objects.in_bulk(list(quantities))
+        order_lines = [
+            OrderLine(
+                product=products[product_id], product_name=products[product_id].name,
+                unit_price=products[product_id].price, quantity=quantity,
+            )
+            for product_id, quantity in sorted(quantities.items())
+        ]
+        order = Order.objects.create(
+            user=user, checkout_token=token,
+            total_items=sum(quantities.values()),
+            total_price=sum(line.get_total_price() for line in order_lines),
+            **details,
+        )
+        for line in order_lines:
+            line.order = order
+        OrderLine.objects.bulk_create(order_lines)
+        # UPDATE không phát post_save: tự làm mới cache trang có hiển thị tồn kho
+        transaction.on_commit(lambda: bump_products(products.values()))
+    return order
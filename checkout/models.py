@@ -0,0 +1,41 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import models
+from products.models import Product
+
+
+class Order(models.Model):
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    full_name = models.CharField(max_length=100, verbose_name="Họ tên")
+    phone = models.CharField(max_length=20, verbose_name="Số điện thoại")
+    address = models.CharField(max_length=255, verbose_name="Địa chỉ giao hàng")
+    note = models.TextField(blank=True, verbose_name="Ghi chú")
+    total_items = models.PositiveIntegerField(default=0, verbose_name="Tổng số lượng")
+    total_price = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Tổng tiền")
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Mã giỏ cookie đã tạo đơn này: một giỏ chỉ đặt được một đơn (gửi lại form, hai tab)
+    checkout_token = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False)
+
+    class Meta:
+        verbose_name = "Đơn hàng"
+        verbose_name_plural = "Đơn hàng"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Đơn hàng #{self.pk}"
+
+
+class OrderLine(models.Model):
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='lines')
+    # Giữ dòng đơn khi sản phẩm bị xóa; tên và giá được chép lại lúc đặt hàng
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True)
+    product_name = models.CharField(max_length=200, verbose_name="Tên sản phẩm")
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Đơn giá")
+    quantity = models.PositiveIntegerField(verbose_name="Số lượng")
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_name}"
+
+    def get_total_price(self):
+        return (self.unit_price or Decimal('0')) * self.quantity
@@ -0,0 +1,191 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from cart.models import Cart, CartItem
+from cart.storage import COOKIE_NAME
+from products.models import Category, Product
+from .engine import CheckoutError, place_order
+from .models import Order, OrderLine
+
+SHIPPING = {'full_name': 'Nguyễn Văn A', 'phone': '0901234567', 'address': '1 Lê Lợi, Q1'}
+
+
+def make_product(category, name, price=10000, stock=50, **kwargs):
+    return Product.objects.create(
+        category=category, name=name, description='Rau sạch', price=price,
+        stock=stock, image='products/test.jpg', **kwargs
+    )
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Rau')
+        self.carrot = make_product(self.category, 'Cà rốt', price=15000, stock=10)
+        self.cabbage = make_product(self.category, 'Bắp cải', price=20000, stock=5)
+
+    def add(self, product, quantity):
+        self.client.post(reverse('cart:add_to_cart', args=[product.pk]), {'quantity': quantity})
+
+    def test_guest_checkout_places_order_and_clears_cart(self):
+        self.add(self.carrot, 3)
+        self.add(self.cabbage, 2)
+        self.assertContains(self.client.get(reverse('checkout:checkout')), '85000 VNĐ')
+        response = self.client.post(reverse('checkout:checkout'), SHIPPING)
+
+        order = Order.objects.get()
+        self.assertRedirects(response, reverse('checkout:order_detail', args=[order.pk]))
+        self.assertEqual((order.total_items, order.total_price), (5, Decimal('85000')))
+        self.assertEqual(
+            list(order.lines.values_list('product_name', 'unit_price', 'quantity')),
+            [('Cà rốt', Decimal('15000'), 3), ('Bắp cải', Decimal('20000'), 2)],
+        )
+        self.carrot.refresh_from_db()
+        self.cabbage.refresh_from_db()
+        self.assertEqual((self.carrot.stock, self.cabbage.stock), (7, 3))
+        self.assertEqual(response.cookies[COOKIE_NAME].value, '')
+
+        self.assertContains(self.client.get(reverse('checkout:order_detail', args=[order.pk])), 'Lê Lợi')
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get(reverse('checkout:order_detail', args=[order.pk])).status_code, 404)
+
+    def test_resubmitted_cookie_cart_checkout_places_one_order(self):
+        self.add(self.carrot, 3)
+        cookie = self.client.cookies[COOKIE_NAME].value
+        self.client.post(reverse('checkout:checkout'), SHIPPING)
+        # Gửi lại form (hoặc tab khác) với cookie giỏ cũ
+        self.client.cookies[COOKIE_NAME] = cookie
+        response = self.client.post(reverse('checkout:checkout'), SHIPPING, follow=True)
+        self.assertContains(response, 'đã được đặt hàng')
+        self.assertEqual(Order.objects.count(), 1)
+        self.carrot.refresh_from_db()
+        self.assertEqual(self.carrot.stock, 7)
+
+        # Giỏ mới có mã mới nên đặt được đơn tiếp theo
+        self.add(self.carrot, 1)
+        self.assertNotEqual(self.client.cookies[COOKIE_NAME].value, cookie)
+        self.client.post(reverse('checkout:checkout'), SHIPPING)
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_same_token_is_rejected_in_order_transaction(self):
+        place_order([(self.carrot.pk, 1)], token='gio-1', **SHIPPING)
+        with self.assertRaises(CheckoutError):
+            place_order([(self.carrot.pk, 1)], token='gio-1', **SHIPPING)
+        self.carrot.refresh_from_db()
+        self.assertEqual((Order.objects.count(), self.carrot.stock), (1, 9))
+
+    def test_short_stock_rolls_back_every_line(self):
+        self.add(self.carrot, 4)
+        self.add(self.cabbage, 5)
+        Product.objects.filter(pk=self.cabbage.pk).update(stock=2)
+        response = self.client.post(reverse('checkout:checkout'), SHIPPING)
+
+        self.assertContains(response, 'chỉ còn 2')
+        self.assertEqual(response.context['failures'], [{
+            'product_id': self.cabbage.pk, 'name': 'Bắp cải', 'requested': 5, 'available': 2,
+        }])
+        self.assertFalse(Order.objects.exists())
+        self.carrot.refresh_from_db()
+        self.assertEqual(self.carrot.stock, 10)
+
+    def test_logged_in_checkout_empties_database_cart(self):
+        user = User.objects.create_user('khach', password='matkhau123', first_name='An')
+        self.client.force_login(user)
+        self.add(self.carrot, 1)
+        self.assertEqual(self.client.get(reverse('checkout:checkout')).context['form']['full_name'].value(), 'An')
+        self.client.post(reverse('checkout:checkout'), SHIPPING)
+
+        cart = Cart.objects.get(user=user)
+        self.assertFalse(CartItem.objects.filter(cart=cart).exists())
+        self.assertEqual(cart.total_items, 0)
+        self.assertEqual(Order.objects.get().user, user)
+
+    def test_database_cart_is_claimed_in_the_order_transaction(self):
+        user = User.objects.create_user('khach', password='matkhau123')
+        cart = Cart.objects.create(user=user)
+        CartItem.objects.add_quantity(cart, self.carrot, 2)
+        CartItem.objects.add_quantity(cart, self.cabbage, 1)
+        # Hai request (gửi form hai lần, hai tab) cùng đọc một giỏ
+        items = list(cart.cartitem_set.all())
+        lines = [(item.product_id, item.quantity) for item in items]
+
+        Product.objects.filter(pk=self.cabbage.pk).update(stock=0)
+        with self.assertRaises(CheckoutError):
+            place_order(lines, user=user, cart_items=items, **SHIPPING)
+        self.assertEqual(cart.cartitem_set.count(), 2)
+
+        Product.objects.filter(pk=self.cabbage.pk).update(stock=5)
+        place_order(lines, user=user, cart_items=items, **SHIPPING)
+        with self.assertRaisesMessage(CheckoutError, 'đã thay đổi'):
+            place_order(lines, user=user, cart_items=items, **SHIPPING)
+        self.assertEqual(Order.objects.count(), 1)
+        self.carrot.refresh_from_db()
+        self.assertEqual(self.carrot.stock, 8)
+        cart.refresh_from_db()
+        self.assertFalse(cart.cartitem_set.exists())
+        self.assertEqual((cart.total_items, cart.total_price), (0, Decimal('0')))
+
+    def test_empty_cart_redirects(self):
+        self.assertRedirects(self.client.get(reverse('checkout:checkout')), reverse('cart:cart_view'))
+
+    def test_stock_is_decremented_in_product_id_order(self):
+        with CaptureQueriesContext(connection) as context:
+            place_order([(self.cabbage.pk, 1), (self.carrot.pk, 1), (self.cabbage.pk, 1)], **SHIPPING)
+        updates = [query['sql'] for query in context.captured_queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+        self.assertIn(f'"id" = {self.carrot.pk}', updates[0])
+        self.assertIn(f'"id" = {self.cabbage.pk}', updates[1])
+        self.assertEqual(OrderLine.objects.get(product=self.cabbage).quantity, 2)
+
+        with self.assertRaisesMessage(CheckoutError, 'trống'):
+            place_order([(self.carrot.pk, 0)], **SHIPPING)
+
+
+class ConcurrentCheckoutTests(TransactionTestCase):
+    workers = 8
+    max_retries = 200
+
+    def test_parallel_checkouts_never_oversell(self):
+        category = Category.objects.create(name='Khuyến mãi')
+        hot = [make_product(category, f'Rau nổi bật {i}', stock=40, is_featured=True) for i in range(2)]
+
+        def worker(seed):
+            rng = random.Random(seed)
+            placed = sold_out = retries = 0
+            try:
+                while sold_out < 20:
+                    # Mỗi đơn lấy cả hai sản phẩm, liệt kê theo thứ tự ngẫu nhiên
+                    lines = [(product.pk, rng.randint(1, 3)) for product in rng.sample(hot, 2)]
+                    try:
+                        place_order(lines, **SHIPPING)
+                    except CheckoutError:
+                        sold_out += 1
+                    except OperationalError:
+                        # SQLite khóa ghi theo cả CSDL: thử lại như một client thật, có giới hạn
+                        retries += 1
+                        if retries > self.max_retries:
+                            raise
+                        time.sleep(rng.uniform(0, 0.005) * min(retries, 10))
+                    else:
+                        placed += 1
+            finally:
+                connection.close()
+            return placed
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            placed = sum(pool.map(worker, range(self.workers)))
+
+        self.assertGreater(placed, 0)
+        self.assertEqual(Order.objects.count(), placed)
+        for product in hot:
+            product.refresh_from_db()
+            sold = sum(OrderLine.objects.filter(product=product).values_list('quantity', flat=True))
+            self.assertGreaterEqual(product.stock, 0)
+            self.assertEqual(product.stock + sold, 40)
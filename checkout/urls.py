@@ -0,0 +1,9 @@
+from django.urls import path
+from . import views
+
+app_name = 'checkout'
+
+urlpatterns = [
+    path('', views.checkout, name='checkout'),
+    path('orders/<int:order_id>/', views.order_detail, name='order_detail'),
+]
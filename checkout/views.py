@@ -0,0 +1,71 @@
+from django.contrib import messages
+from django.http import Http404
+from django.shortcuts import get_object_or_404, redirect, render
+
+from cart.storage import DatabaseCart
+from .engine import CheckoutError, DuplicateOrderError, place_order
+from .forms import CheckoutForm
+from .models import Order
+
+# Khóa session chứa id các đơn khách (chưa đăng nhập) vừa đặt, để xem lại đơn
+SESSION_ORDERS_KEY = 'checkout_orders'
+
+def checkout(request):
+    """Xác nhận giỏ hàng, nhập thông tin giao hàng và đặt hàng"""
+    cart = request.cart
+    items = cart.get_items()
+    if not items:
+        messages.info(request, "Giỏ hàng đang trống")
+        return redirect('cart:cart_view')
+
+    failures = []
+    user = request.user if request.user.is_authenticated else None
+    if request.method == 'POST':
+        form = CheckoutForm(request.POST)
+        if form.is_valid():
+            # Dòng của giỏ CSDL được xóa cùng transaction với đơn; giỏ cookie xóa sau
+            # và dựa vào mã giỏ để không đặt trùng
+            database_cart = isinstance(cart, DatabaseCart)
+            cart_items = items if database_cart else None
+            try:
+                order = place_order(
+                    [(item.product_id, item.quantity) for item in items], user=user,
+                    cart_items=cart_items, token=None if database_cart else cart.checkout_token,
+                    **form.cleaned_data
+                )
+            except CheckoutError as exc:
+                messages.error(request, str(exc))
+                if not exc.failures:
+                    # Giỏ đã đổi hoặc đã được đặt (gửi lại form, tab khác): xem lại giỏ
+                    if isinstance(exc, DuplicateOrderError):
+                        cart.clear()
+                    return redirect('cart:cart_view')
+                failures = exc.failures
+            else:
+                if cart_items is None:
+                    cart.clear()
+                if user is None:
+                    request.session[SESSION_ORDERS_KEY] = request.session.get(SESSION_ORDERS_KEY, [])[-9:] + [order.pk]
+                messages.success(request, f"Đặt hàng thành công! Mã đơn hàng: #{order.pk}")
+                return redirect('checkout:order_detail', order_id=order.pk)
+    else:
+        form = CheckoutForm(initial={'full_name': user.get_full_name()} if user else None)
+
+    context = {
+        'form': form,
+        'cart': cart,
+        'cart_items': items,
+        'failures': failures,
+    }
+    return render(request, 'checkout/checkout.html', context)
+
+def order_detail(request, order_id):
+    """Chi tiết đơn hàng (của user đang đăng nhập hoặc vừa đặt trong phiên này)"""
+    order = get_object_or_404(Order.objects.prefetch_related('lines'), pk=order_id)
+    if order.user_id is not None:
+        allowed = order.user_id == request.user.pk
+    else:
+        allowed = order.pk in request.session.get(SESSION_ORDERS_KEY, [])
+    if not allowed:
+        raise Http404
+    return render(request, 'checkout/order_detail.html', {'order': order})
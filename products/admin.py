@@ -1,4 +1,5 @@
 from django.contrib import admin
+from vegetable_store.paginators import EstimatedCountPaginator
 from .models import Category, Product
 
 @admin.register(Category)
@@ -9,8 +10,11 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'price', 'stock', 'unit', 'is_available', 'is_featured', 'created_at']
+    list_display = ['name', 'sku', 'category', 'price', 'stock', 'unit', 'is_available', 'is_featured', 'created_at']
     list_filter = ['category', 'is_available', 'is_featured', 'created_at']
-    search_fields = ['name', 'description']
+    search_fields = ['name', 'sku', 'description']
     list_editable = ['price', 'stock', 'is_available', 'is_featured']
     readonly_fields = ['created_at', 'updated_at']
+    list_select_related = ['category']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
@@ -0,0 +1,8 @@
+"""API JSON chỉ đọc cho catalog (ứng dụng di động, đối tác đồng bộ dữ liệu).
+
+``/api/products/``, ``/api/products/<id>/``, ``/api/categories/`` và
+``/api/categories/<id>/``. Mọi response có ETag mạnh tính từ phiên bản cache
+catalog (``products/cache.py``), nên ``If-None-Match`` trùng được trả 304 mà
+không chạy truy vấn hay serialize gì; danh sách sản phẩm còn có
+``Last-Modified`` lấy từ ``MAX(updated_at)`` (một truy vấn trên chỉ mục).
+"""
@@ -0,0 +1,303 @@
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from ..cache import get_versions, last_deleted
+from ..models import Category, Product
+from ..pagination import KeysetPaginator
+
+# Tăng khi đổi định dạng response để ETag cũ không còn khớp
+API_VERSION = 1
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+
+# tên trường API: (các trường model cần nạp, hàm lấy giá trị)
+PRODUCT_FIELDS = {
+    'id': ((), lambda p: p.pk),
+    'sku': (('sku',), lambda p: p.sku),
+    'name': (('name',), lambda p: p.name),
+    'description': (('description',), lambda p: p.description),
+    'price': (('price',), lambda p: str(p.price)),
+    'unit': (('unit',), lambda p: p.unit),
+    'stock': (('stock',), lambda p: p.stock),
+    'is_available': (('is_available',), lambda p: p.is_available),
+    'is_featured': (('is_featured',), lambda p: p.is_featured),
+    'category': (('category',), lambda p: p.category_id),
+    'category_name': (('category__name',), lambda p: p.category.name),
+    'image': (('image',), lambda p: p.image.url if p.image else None),
+    'url': ((), lambda p: reverse('products:product_detail', args=[p.pk])),
+    'created_at': (('created_at',), lambda p: p.created_at.isoformat()),
+    'updated_at': (('updated_at',), lambda p: p.updated_at.isoformat()),
+}
+DEFAULT_FIELDS = ('id', 'name', 'price', 'unit', 'stock', 'category', 'image', 'updated_at')
+# Danh sách được sắp theo (updated_at, id) để ``updated_since`` và con trỏ dùng chung chỉ mục
+ORDERING = ('updated_at', 'id')
+
+
+class BadRequest(ValueError):
+    """Tham số query không hợp lệ; trả về 400."""
+
+
+def error_response(message, status):
+    return JsonResponse({'error': message}, status=status)
+
+
+def catalog_etag(*scopes, state=None):
+    """ETag từ phiên bản cache của ``scopes``, tham số query và ``state``.
+
+    ``state`` là một truy vấn gộp rẻ trên CSDL (``MAX(updated_at)``, ``COUNT(*)``):
+    thay đổi không tăng phiên bản (``UPDATE`` trực tiếp, tiến trình dùng cache
+    khác) vẫn làm đổi ETag.
+    """
+    def etag(request, **kwargs):
+        versions = get_versions(*[scope.format(**kwargs) for scope in scopes])
+        fingerprint = state(request, **kwargs) if state else None
+        params = sorted((key, sorted(values)) for key, values in request.GET.lists())
+        raw = '%s|%s|%s|%s|%s' % (API_VERSION, request.path, params, versions, fingerprint)
+        return hashlib.md5(raw.encode('utf-8')).hexdigest()
+    return etag
+
+
+def conditional(etag_func, last_modified_func=None):
+    """Như ``django.views.decorators.http.condition`` nhưng không tính
+    ``Last-Modified`` khi có ``If-None-Match`` (header này được ưu tiên).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            etag = quote_etag(etag_func(request, *args, **kwargs))
+            last_modified = None
+            if last_modified_func and 'HTTP_IF_NONE_MATCH' not in request.META:
+                last_modified = last_modified_func(request, *args, **kwargs)
+            timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                if last_modified_func and last_modified is None:
+                    last_modified = last_modified_func(request, *args, **kwargs)
+                if last_modified:
+                    response.headers.setdefault('Last-Modified', http_date(timegm(last_modified.utctimetuple())))
+            response.headers.setdefault('ETag', etag)
+            # Client được giữ bản sao nhưng phải hỏi lại mỗi lần
+            patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+            return response
+        return wrapped
+    return decorator
+
+
+def request_state(func):
+    """Chỉ chạy ``func`` một lần mỗi request: ETag và ``Last-Modified`` dùng chung kết quả."""
+    @wraps(func)
+    def wrapped(request, **kwargs):
+        if not hasattr(request, 'catalog_state'):
+            request.catalog_state = func(request, **kwargs)
+        return request.catalog_state
+    return wrapped
+
+
+def api_view(view):
+    """Chuyển ``BadRequest`` thành 400 và ``Http404`` thành 404 dạng JSON."""
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except BadRequest as exc:
+            return error_response(str(exc), 400)
+        except Http404:
+            return error_response('Không tìm thấy', 404)
+    return wrapped
+
+
+def parse_fields(request):
+    raw = request.GET.get('fields')
+    if not raw:
+        return DEFAULT_FIELDS
+    fields = tuple(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in PRODUCT_FIELDS]
+    if unknown or not fields:
+        raise BadRequest('Trường không hợp lệ: %s (có: %s)' % (
+            ', '.join(unknown) or raw, ', '.join(PRODUCT_FIELDS)
+        ))
+    return fields
+
+
+def parse_updated_since(request):
+    raw = request.GET.get('updated_since')
+    if not raw:
+        return None
+    try:
+        value = parse_datetime(raw)
+    except ValueError:
+        value = None
+    if value is None:
+        raise BadRequest('"updated_since" phải là thời điểm ISO 8601')
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def parse_limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise BadRequest('"limit" phải là số nguyên')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def product_queryset(fields):
+    """Chỉ nạp các cột cần cho ``fields`` (và khóa sắp xếp)."""
+    columns = {'id', *ORDERING}
+    for name in fields:
+        columns.update(PRODUCT_FIELDS[name][0])
+    queryset = Product.objects.only(*sorted(columns))
+    if 'category_name' in fields:
+        queryset = queryset.select_related('category')
+    return queryset
+
+
+def serialize(product, fields):
+    return {name: PRODUCT_FIELDS[name][1](product) for name in fields}
+
+
+def product_page(request, queryset, fields):
+    """Một trang sản phẩm theo ``?updated_since=``, ``?limit=`` và ``?cursor=``."""
+    updated_since = parse_updated_since(request)
+    if updated_since is not None:
+        # Đồng bộ tăng dần: trả cả sản phẩm đã ngừng bán để client ẩn chúng đi
+        queryset = queryset.filter(updated_at__gt=updated_since)
+    else:
+        queryset = queryset.filter(is_available=True)
+
+    paginator = KeysetPaginator(queryset, parse_limit(request), ordering=ORDERING)
+    page = paginator.get_page(request.GET.get('cursor'))
+    next_url = None
+    if page.next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_url = '%s?%s' % (request.path, params.urlencode())
+    return {
+        'results': [serialize(product, fields) for product in page],
+        'next': next_url,
+    }
+
+
+def category_filter(request):
+    category_id = request.GET.get('category')
+    if not category_id:
+        return {}
+    if not category_id.isdigit():
+        raise BadRequest('"category" phải là id số')
+    return {'category_id': int(category_id)}
+
+
+def products_state(queryset):
+    return queryset.aggregate(last=Max('updated_at'), count=Count('pk'))
+
+
+def changed_at(state):
+    """``Last-Modified`` của một danh sách: sửa gần nhất hoặc xóa gần nhất (xóa không đổi ``MAX``)."""
+    if not state or state['last'] is None:
+        return None
+    return max(state['last'], last_deleted())
+
+
+@request_state
+def list_state(request):
+    try:
+        filters = category_filter(request)
+    except BadRequest:
+        return None
+    return products_state(Product.objects.filter(**filters))
+
+
+@request_state
+def category_state(request, category_id):
+    return products_state(Product.objects.filter(category_id=category_id))
+
+
+@request_state
+def product_state(request, product_id):
+    return Product.objects.filter(pk=product_id).values_list('updated_at', flat=True).first()
+
+
+@request_state
+def category_list_state(request):
+    return Category.objects.aggregate(last=Max('pk'), count=Count('pk'))
+
+
+def list_last_modified(request):
+    return changed_at(list_state(request))
+
+
+def category_last_modified(request, category_id):
+    return changed_at(category_state(request, category_id=category_id))
+
+
+def serialize_category(category):
+    return {
+        'id': category.pk,
+        'name': category.name,
+        'description': category.description,
+        'image': category.image.url if category.image else None,
+        'url': reverse('products:category_detail', args=[category.pk]),
+    }
+
+
+@require_safe
+@conditional(catalog_etag('all', state=list_state), list_last_modified)
+@api_view
+def product_list(request):
+    """Danh sách sản phẩm đang bán; lọc theo ``?category=``"""
+    fields = parse_fields(request)
+    queryset = product_queryset(fields).filter(**category_filter(request))
+    return JsonResponse(product_page(request, queryset, fields))
+
+
+@require_safe
+@conditional(catalog_etag('all', 'product:{product_id}', state=product_state), product_state)
+@api_view
+def product_detail(request, product_id):
+    """Một sản phẩm đang bán"""
+    fields = parse_fields(request)
+    product = product_queryset(fields).filter(pk=product_id, is_available=True).first()
+    if product is None:
+        raise Http404
+    return JsonResponse(serialize(product, fields))
+
+
+@require_safe
+@conditional(catalog_etag('all', state=category_list_state))
+@api_view
+def category_list(request):
+    """Tất cả danh mục"""
+    return JsonResponse({
+        'results': [serialize_category(category) for category in Category.objects.order_by('pk')],
+    })
+
+
+@require_safe
+@conditional(catalog_etag('category:{category_id}', state=category_state), category_last_modified)
+@api_view
+def category_detail(request, category_id):
+    """Danh mục cùng một trang sản phẩm của nó"""
+    category = Category.objects.filter(pk=category_id).first()
+    if category is None:
+        raise Http404
+    fields = parse_fields(request)
+    queryset = product_queryset(fields).filter(category=category)
+    return JsonResponse({
+        'category': serialize_category(category),
+        **product_page(request, queryset, fields),
+    })
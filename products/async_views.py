@@ -0,0 +1,78 @@
+"""Phiên bản async của các view catalog, dùng khi chạy dưới ASGI.
+
+Truy vấn dùng ORM async (``aget``, duyệt ``async for``); phần chưa có API
+async (phân trang, tìm kiếm FTS, render template) chạy qua ``sync_to_async``.
+``urls.py`` chọn module này khi ``settings.ASYNC_VIEWS`` bật, còn lại dùng
+``views.py``.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, render
+
+from . import views
+from .cache import cache_catalog_page
+from .models import Product, Category
+from .pagination import paginate_products, pagination_query
+from .recommendations import arelated_products
+from .views import product_list_context
+
+arender = sync_to_async(render)
+# Chỉ đọc chỉ mục trong bộ nhớ, không cần phiên bản async
+suggest = views.suggest
+
+
+async def alist(queryset):
+    return [obj async for obj in queryset]
+
+
+@cache_catalog_page('all')
+async def home(request):
+    """Trang chủ; sản phẩm nổi bật và danh mục được truy vấn đồng thời"""
+    featured_products, categories = await asyncio.gather(
+        alist(Product.objects.filter(is_featured=True, is_available=True)[:6]),
+        alist(Category.objects.all()[:4]),
+    )
+
+    context = {
+        'featured_products': featured_products,
+        'categories': categories,
+    }
+    return await arender(request, 'products/home.html', context)
+
+
+@cache_catalog_page('all')
+async def product_list(request):
+    """Danh sách tất cả sản phẩm"""
+    context = await sync_to_async(product_list_context)(request)
+    return await arender(request, 'products/product_list.html', context)
+
+
+@cache_catalog_page('all', 'product:{product_id}')
+async def product_detail(request, product_id):
+    """Chi tiết sản phẩm"""
+    product = await aget_object_or_404(
+        Product.objects.select_related('category'), id=product_id, is_available=True
+    )
+    related_products = await arelated_products(product)
+
+    context = {
+        'product': product,
+        'related_products': related_products,
+    }
+    return await arender(request, 'products/product_detail.html', context)
+
+
+@cache_catalog_page('category:{category_id}')
+async def category_detail(request, category_id):
+    """Sản phẩm theo danh mục"""
+    category = await aget_object_or_404(Category, id=category_id)
+    products = Product.objects.filter(category=category, is_available=True)
+    page_obj = await sync_to_async(paginate_products)(request, products, 12)
+
+    context = {
+        'category': category,
+        'page_obj': page_obj,
+        'pagination_query': pagination_query(request),
+    }
+    return await arender(request, 'products/category_detail.html', context)
@@ -0,0 +1,210 @@
+"""Cache trang và fragment của catalog với key có phiên bản.
+
+Mỗi phạm vi (``all``, ``category:<id>``, ``product:<id>``) có một số phiên bản
+lưu trong cache, được tăng bởi signal khi ``Product``/``Category`` thay đổi
+(xem ``products/signals.py``). Key của trang đã cache chứa các phiên bản nó phụ
+thuộc, nên tăng phiên bản là vô hiệu hóa ngay mà không cần xóa từng key.
+
+Cache ``catalog`` phải dùng chung giữa các tiến trình (FileBasedCache, Redis):
+lệnh quản trị và các worker khác tăng phiên bản qua chính cache đó. Phiên bản
+còn có hạn ``CATALOG_VERSION_TIMEOUT`` nên dù cấu hình sai, trang cũ cũng không
+sống mãi. Key phiên bản gắn với tên CSDL để test/benchmark không dùng lẫn trang
+của site khi chung thư mục cache.
+"""
+import hashlib
+import re
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils import timezone
+
+_CSRF_INPUT_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+
+
+def get_catalog_cache():
+    return caches[getattr(settings, 'CATALOG_CACHE_ALIAS', 'default')]
+
+
+class CacheStats:
+    """Đếm hit/miss của cache trang trong tiến trình hiện tại."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+stats = CacheStats()
+
+
+def _database_tag():
+    database = str(connections[DEFAULT_DB_ALIAS].settings_dict['NAME'])
+    return hashlib.md5(database.encode('utf-8')).hexdigest()[:8]
+
+
+def _version_key(scope):
+    return 'catalog:version:%s:%s' % (_database_tag(), scope)
+
+
+def _deleted_key():
+    return 'catalog:deleted:%s' % _database_tag()
+
+
+def _version_timeout():
+    return getattr(settings, 'CATALOG_VERSION_TIMEOUT', 600)
+
+
+def _initial_version():
+    # Khởi tạo theo thời gian để key cũ không bị dùng lại nếu phiên bản bị evict
+    return int(time.time() * 1000)
+
+
+def get_versions(*scopes):
+    """Phiên bản hiện tại của các phạm vi, đọc bằng một lần ``get_many``."""
+    cache = get_catalog_cache()
+    keys = [_version_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    versions = []
+    for key in keys:
+        if key not in found:
+            cache.add(key, _initial_version(), _version_timeout())
+            found[key] = cache.get(key)
+        versions.append(found[key])
+    return versions
+
+
+def bump(*scopes):
+    """Tăng phiên bản, làm mọi trang phụ thuộc các phạm vi này hết hiệu lực."""
+    cache = get_catalog_cache()
+    for scope in scopes:
+        key = _version_key(scope)
+        try:
+            cache.incr(key)
+            cache.touch(key, _version_timeout())
+        except ValueError:
+            cache.set(key, _initial_version(), _version_timeout())
+
+
+def mark_deleted(when=None):
+    """Ghi thời điểm xóa sản phẩm gần nhất (``MAX(updated_at)`` không đổi khi xóa)."""
+    get_catalog_cache().set(_deleted_key(), when or timezone.now(), None)
+
+
+def last_deleted():
+    """Thời điểm xóa sản phẩm gần nhất; không rõ (cache mới, bị evict) thì coi như vừa xóa."""
+    cache = get_catalog_cache()
+    value = cache.get(_deleted_key())
+    if value is None:
+        cache.add(_deleted_key(), timezone.now(), None)
+        value = cache.get(_deleted_key())
+    return value
+
+
+def bump_products(products):
+    """Vô hiệu hóa cache cho các sản phẩm (đã có ``category_id``) và danh mục của chúng."""
+    scopes = {'all'}
+    for product in products:
+        scopes.add('product:%s' % product.pk)
+        scopes.add('category:%s' % product.category_id)
+    bump(*sorted(scopes))
+
+
+def _has_pending_messages(request):
+    return hasattr(request, '_messages') and len(get_messages(request)) > 0
+
+
+def _lookup(request, user, scopes, kwargs):
+    """Trả về ``(key, response đã cache hoặc None)``; key là None nếu không dùng cache."""
+    if (request.method not in ('GET', 'HEAD')
+            or user.is_authenticated
+            or _has_pending_messages(request)):
+        return None, None
+
+    versions = get_versions(*[scope.format(**kwargs) for scope in scopes])
+    raw_key = '%s|%s' % (request.get_full_path(), versions)
+    key = 'catalog:page:%s' % hashlib.md5(raw_key.encode('utf-8')).hexdigest()
+
+    cached = get_catalog_cache().get(key)
+    if cached is None:
+        stats.record(hit=False)
+        request.catalog_cache_status = 'miss'
+        return key, None
+
+    stats.record(hit=True)
+    request.catalog_cache_status = 'hit'
+    token = get_token(request)
+    content = _CSRF_INPUT_RE.sub(
+        lambda m: m.group(1) + token + m.group(2), cached['content']
+    )
+    response = HttpResponse(content, content_type=cached['content_type'])
+    response['X-Catalog-Cache'] = 'hit'
+    return key, response
+
+
+def _store(request, key, response, timeout):
+    # Không cache trang đã hiển thị thông báo (messages) của người xem này
+    if (response.status_code == 200 and not response.streaming
+            and not getattr(get_messages(request), 'used', False)):
+        get_catalog_cache().set(key, {
+            'content': response.content.decode(response.charset),
+            'content_type': response['Content-Type'],
+        }, timeout if timeout is not None else getattr(settings, 'CATALOG_CACHE_TIMEOUT', 600))
+    response['X-Catalog-Cache'] = 'miss'
+
+
+def cache_catalog_page(*scopes, timeout=None):
+    """Cache toàn bộ response cho khách chưa đăng nhập.
+
+    ``scopes`` là các chuỗi định dạng theo tham số của view, ví dụ
+    ``'category:{category_id}'``. Token CSRF trong trang đã cache được thay
+    bằng token của người xem hiện tại trước khi trả về. Dùng được cho cả view
+    async: phần đọc/ghi cache (có thể chạm session) chạy qua ``sync_to_async``.
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def awrapped(request, *args, **kwargs):
+                user = await request.auser()
+                key, response = await sync_to_async(_lookup)(request, user, scopes, kwargs)
+                if response is not None:
+                    return response
+                response = await view(request, *args, **kwargs)
+                if key is not None:
+                    await sync_to_async(_store)(request, key, response, timeout)
+                return response
+            return awrapped
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            key, response = _lookup(request, request.user, scopes, kwargs)
+            if response is not None:
+                return response
+            response = view(request, *args, **kwargs)
+            if key is not None:
+                _store(request, key, response, timeout)
+            return response
+        return wrapped
+    return decorator
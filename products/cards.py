@@ -0,0 +1,96 @@
+"""Dữ liệu dựng sẵn cho thẻ sản phẩm ở các trang danh sách.
+
+Mỗi thẻ sản phẩm cần giá đã định dạng, mô tả rút gọn, hai URL (chi tiết, thêm
+vào giỏ) và ``srcset`` của ảnh thu nhỏ; tính những thứ đó bằng filter/thẻ cho
+12–48 thẻ mỗi trang tốn đáng kể CPU. ``build_card_data`` tính chúng một lần và
+lưu vào ``Product.card_data`` khi sản phẩm được lưu (signal trong
+``products/signals.py``, kể cả lưu hàng loạt); thẻ ``{% product_card %}`` chỉ
+việc đọc ra. Tồn kho, tên và cờ nổi bật vẫn đọc trực tiếp từ sản phẩm vì chúng
+đổi qua ``UPDATE`` không đi qua ``save()`` (đặt hàng trừ kho).
+
+Đổi nội dung ``build_card_data`` thì tăng ``CARD_DATA_VERSION``: dữ liệu cũ bị
+bỏ qua (tính lại khi render) cho tới khi chạy ``rebuild_product_cards``.
+
+URL được lưu không kèm script prefix (``product/1/`` thay vì ``/shop/product/1/``)
+và ``get_card_data`` gắn prefix của request hiện tại khi render, nên dữ liệu
+dựng từ lệnh quản trị vẫn đúng khi chạy dưới ``SCRIPT_NAME``.
+"""
+from django.urls import get_script_prefix, reverse
+from django.utils.text import Truncator
+
+from .images import picture_sources
+
+CARD_DATA_VERSION = 2
+# Các trường mà card_data phụ thuộc (ngoài khóa chính)
+CARD_FIELDS = frozenset({'price', 'unit', 'description', 'image'})
+SUMMARY_WORDS = 10
+URL_KEYS = ('url', 'add_url')
+IMAGE_URL_KEYS = ('url', 'src', 'srcset', 'webp')
+
+
+def format_price(price, unit):
+    return f"{price:,.0f} VNĐ/{unit}"
+
+
+def _strip_prefix(url, prefix):
+    # URL tuyệt đối (CDN, storage ngoài) không có prefix nên giữ nguyên
+    return url[len(prefix):] if url.startswith(prefix) else url
+
+
+def _add_prefix(url, prefix):
+    return url if url.startswith('/') or '://' in url else prefix + url
+
+
+def _map_urls(func, value, prefix):
+    # ``srcset`` là "URL 1x, URL 2x": URL luôn đứng đầu mỗi phần
+    return ', '.join(func(part, prefix) for part in value.split(', '))
+
+
+def _relocate(data, func):
+    prefix = get_script_prefix()
+    data = dict(data, **{key: func(data[key], prefix) for key in URL_KEYS})
+    if data['image']:
+        data['image'] = {
+            key: _map_urls(func, value, prefix) if key in IMAGE_URL_KEYS else value
+            for key, value in data['image'].items()
+        }
+    return data
+
+
+def build_card_data(product):
+    """``card_data`` của ``product`` (đã có khóa chính), URL không kèm script prefix."""
+    return _relocate({
+        'version': CARD_DATA_VERSION,
+        'url': reverse('products:product_detail', args=[product.pk]),
+        'add_url': reverse('cart:add_to_cart', args=[product.pk]),
+        'price': format_price(product.price, product.unit),
+        # Giống filter truncatewords
+        'summary': Truncator(product.description).words(SUMMARY_WORDS, truncate=' …'),
+        'image': picture_sources(product.image, 'card') if product.image else None,
+    }, _strip_prefix)
+
+
+def get_card_data(product):
+    """Dữ liệu thẻ để render, URL đã gắn script prefix hiện tại.
+
+    Dùng ``card_data`` đã lưu nếu còn đúng phiên bản, nếu không thì tính ngay (không ghi).
+    """
+    data = product.card_data
+    if not data or data.get('version') != CARD_DATA_VERSION:
+        data = build_card_data(product)
+    return _relocate(data, _add_prefix)
+
+
+def refresh_card_data(products, batch_size=500):
+    """Tính lại và ghi ``card_data`` của những sản phẩm có dữ liệu thay đổi; trả về số đã ghi."""
+    from .models import Product
+
+    changed = []
+    for product in products:
+        data = build_card_data(product)
+        if data != product.card_data:
+            product.card_data = data
+            changed.append(product)
+    if changed:
+        Product.objects.bulk_update(changed, ['card_data'], batch_size=batch_size)
+    return len(changed)
@@ -0,0 +1,236 @@
+"""Nhập/xuất catalog hàng loạt (CSV hoặc JSONL) cho lệnh ``import_catalog``/``export_catalog``.
+
+Dòng được đọc theo luồng và xử lý từng lô: mỗi lô đọc các sản phẩm hiện có
+bằng một truy vấn, so sánh từng trường rồi ghi bằng ``bulk_create``/
+``bulk_update`` trong một transaction. Vì các thao tác hàng loạt không phát
+``post_save``, cuối mỗi lô phát ``products_bulk_saved`` để cập nhật chỉ mục
+tìm kiếm, cache catalog và tổng giỏ hàng.
+"""
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Category, Product
+from .signals import products_bulk_saved
+
+EXPORT_FIELDS = (
+    'id', 'sku', 'name', 'category', 'description', 'price', 'stock', 'unit',
+    'is_available', 'is_featured', 'image',
+)
+# Các trường có thể cập nhật từ file; cột vắng mặt hoặc ô trống thì giữ nguyên giá trị cũ
+UPDATE_FIELDS = (
+    'name', 'category_id', 'description', 'price', 'stock', 'unit',
+    'is_available', 'is_featured', 'image',
+)
+REQUIRED_FOR_CREATE = ('name', 'category', 'price')
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'x', 'có', 'co'}
+FALSE_VALUES = {'0', 'false', 'no', 'n', '', 'không', 'khong'}
+
+
+class RowError(ValueError):
+    """Một dòng dữ liệu không hợp lệ; dòng đó bị bỏ qua."""
+
+
+def detect_format(path, fmt=None):
+    if fmt:
+        return fmt
+    return 'jsonl' if str(path).endswith(('.jsonl', '.ndjson', '.json')) else 'csv'
+
+
+def read_rows(stream, fmt):
+    """Sinh ``(số dòng, dict)`` từ file CSV (có header) hoặc JSONL."""
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(stream), start=2):
+            yield number, row
+        return
+    for number, line in enumerate(stream, start=1):
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError as exc:
+                yield number, RowError(f'JSON không hợp lệ: {exc}')
+
+
+def _text(value):
+    return '' if value is None else str(value).strip()
+
+
+def _bool(value):
+    if isinstance(value, bool):
+        return value
+    text = _text(value).lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise RowError(f'giá trị đúng/sai không hợp lệ: {value!r}')
+
+
+def _decimal(value):
+    try:
+        price = Decimal(_text(value).replace(',', ''))
+    except InvalidOperation:
+        raise RowError(f'giá không hợp lệ: {value!r}')
+    if price < 0 or not price.is_finite():
+        raise RowError(f'giá không hợp lệ: {value!r}')
+    return price.quantize(Decimal('0.01'))
+
+
+def _int(value):
+    try:
+        return int(_text(value))
+    except ValueError:
+        raise RowError(f'số lượng không hợp lệ: {value!r}')
+
+
+PARSERS = {
+    'name': _text, 'description': _text, 'unit': _text, 'image': _text,
+    'price': _decimal, 'stock': _int, 'is_available': _bool, 'is_featured': _bool,
+}
+
+
+class CatalogImporter:
+    """So sánh và ghi các dòng catalog theo lô; thống kê nằm trong ``self.stats``."""
+
+    def __init__(self, batch_size=1000, dry_run=False, create_categories=True):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.create_categories = create_categories
+        # Tên danh mục (không phân biệt hoa thường) -> id, nạp một lần
+        self.categories = {
+            name.casefold(): pk for pk, name in Category.objects.values_list('pk', 'name')
+        }
+        self.stats = {'rows': 0, 'created': 0, 'updated': 0, 'unchanged': 0, 'errors': 0}
+        self.errors = []
+
+    def run(self, rows, on_batch=None):
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return self.stats
+            self.import_batch(batch)
+            if on_batch is not None:
+                on_batch(self.stats)
+
+    def error(self, number, message):
+        self.stats['errors'] += 1
+        self.errors.append((number, str(message)))
+
+    def category_id(self, name):
+        key = name.casefold()
+        if key not in self.categories:
+            if not self.create_categories:
+                raise RowError(f'không có danh mục "{name}"')
+            if self.dry_run:
+                return None
+            self.categories[key] = Category.objects.create(name=name).pk
+        return self.categories[key]
+
+    def parse(self, row):
+        """Chuyển một dòng thô thành ``(khóa, dict trường)``; khóa là ``('sku', ...)`` hoặc ``('id', ...)``."""
+        if isinstance(row, RowError):
+            raise row
+        if not isinstance(row, dict):
+            raise RowError('dòng phải là một object')
+        values = {}
+        for field, parser in PARSERS.items():
+            # Ô trống (hay thiếu cột) nghĩa là giữ nguyên giá trị hiện có
+            if _text(row.get(field)) != '':
+                values[field] = parser(row[field])
+        if _text(row.get('category')):
+            values['category_id'] = self.category_id(_text(row['category']))
+        sku = _text(row.get('sku'))
+        if sku:
+            values['sku'] = sku
+            return ('sku', sku), values
+        if _text(row.get('id')):
+            return ('id', _int(row['id'])), values
+        raise RowError('thiếu cả "sku" lẫn "id"')
+
+    def import_batch(self, batch):
+        parsed = {}
+        for number, row in batch:
+            self.stats['rows'] += 1
+            try:
+                key, values = self.parse(row)
+            except RowError as exc:
+                self.error(number, exc)
+                continue
+            # Cùng một sản phẩm xuất hiện nhiều lần trong lô: dòng sau thắng
+            parsed.setdefault(key, (number, {}))[1].update(values)
+
+        skus = [value for kind, value in parsed if kind == 'sku']
+        ids = [value for kind, value in parsed if kind == 'id']
+        products = Product.objects.order_by()
+        existing = {('sku', p.sku): p for p in products.filter(sku__in=skus)}
+        existing.update({('id', p.pk): p for p in products.filter(pk__in=ids)})
+
+        now = timezone.now()
+        created, changed, changed_fields = [], [], set()
+        for key, (number, values) in parsed.items():
+            product = existing.get(key)
+            if product is None:
+                missing = [f for f in REQUIRED_FOR_CREATE
+                           if (f + '_id' if f == 'category' else f) not in values]
+                if key[0] == 'id' or missing:
+                    self.error(number, 'sản phẩm mới cần sku, ' + ', '.join(REQUIRED_FOR_CREATE))
+                    continue
+                created.append(Product(**values))
+                continue
+            fields = [f for f in UPDATE_FIELDS if f in values and getattr(product, f) != values[f]]
+            if not fields:
+                self.stats['unchanged'] += 1
+                continue
+            for field in fields:
+                setattr(product, field, values[field])
+            product.updated_at = now
+            changed.append(product)
+            changed_fields.update(fields)
+
+        self.stats['created'] += len(created)
+        self.stats['updated'] += len(changed)
+        if self.dry_run or not (created or changed):
+            return
+        with transaction.atomic():
+            if created:
+                Product.objects.bulk_create(created, batch_size=self.batch_size)
+            if changed:
+                Product.objects.bulk_update(
+                    changed, sorted(changed_fields) + ['updated_at'], batch_size=self.batch_size
+                )
+            products_bulk_saved.send(
+                sender=Product, created=created, updated=changed, fields=changed_fields
+            )
+
+
+def export_rows(queryset=None, chunk_size=2000):
+    """Sinh các dict theo ``EXPORT_FIELDS``, đọc CSDL theo từng khối."""
+    queryset = queryset if queryset is not None else Product.objects.all()
+    columns = [f if f != 'category' else 'category__name' for f in EXPORT_FIELDS]
+    rows = queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+    for values in rows:
+        row = dict(zip(EXPORT_FIELDS, values))
+        row['price'] = str(row['price'])
+        row['sku'] = row['sku'] or ''
+        yield row
+
+
+def write_rows(rows, stream, fmt):
+    """Ghi ``rows`` ra ``stream``; trả về số dòng đã ghi."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=EXPORT_FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow({k: int(v) if isinstance(v, bool) else v for k, v in row.items()})
+            count += 1
+        return count
+    for row in rows:
+        stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        count += 1
+    return count
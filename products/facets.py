@@ -0,0 +1,238 @@
+"""Lọc nhiều chiều (facet) cho trang danh sách sản phẩm.
+
+Mỗi ``Facet`` biết tham số GET của nó, biểu thức SQL cho giá trị của một sản
+phẩm và điều kiện lọc. ``FacetSet.table`` chạy một câu ``GROUP BY`` theo mọi
+facet trên các sản phẩm đang bán và lưu bảng đếm đó vào cache catalog theo phiên
+bản ``'all'``; số đếm của mọi tổ hợp bộ lọc được cộng từ bảng này trong Python,
+nên đổi bộ lọc không tốn thêm truy vấn. Với kết quả tìm kiếm, bảng đếm được gom
+trên mọi sản phẩm khớp (không giới hạn như danh sách kết quả) và không lưu cache.
+
+Số đếm của một facet tính theo bộ lọc của các facet *khác* để khách biết chọn
+giá trị khác sẽ được bao nhiêu sản phẩm.
+"""
+import hashlib
+from collections import Counter
+
+from django.db.models import Case, CharField, Count, F, Q, Value, When
+from django.db.models.functions import Cast
+
+from .cache import get_catalog_cache, get_versions
+
+FACET_CACHE_TIMEOUT = 60 * 60
+
+# (giá trị tham số, nhãn, giá từ, giá dưới)
+PRICE_RANGES = (
+    ('duoi-20k', 'Dưới 20.000đ', None, 20000),
+    ('20k-50k', '20.000đ - 50.000đ', 20000, 50000),
+    ('50k-100k', '50.000đ - 100.000đ', 50000, 100000),
+    ('tren-100k', 'Từ 100.000đ', 100000, None),
+)
+
+
+def _flag(condition):
+    return Case(When(condition, then=Value('1')), default=Value('0'), output_field=CharField())
+
+
+class Facet:
+    param = None
+    label = None
+
+    def expression(self):
+        """Giá trị facet của một sản phẩm, dạng chuỗi để so với tham số GET."""
+        raise NotImplementedError
+
+    def condition(self, value):
+        raise NotImplementedError
+
+    def clean(self, value):
+        """Giá trị hợp lệ của tham số, hoặc ``None`` để bỏ qua bộ lọc."""
+        return value or None
+
+    def choices(self, counts):
+        """``[(giá trị, nhãn)]`` để hiển thị; mặc định là các giá trị có trong bảng đếm."""
+        return [(value, value) for value in sorted(counts)]
+
+
+class CategoryFacet(Facet):
+    param = 'category'
+    label = 'Danh mục'
+
+    def __init__(self, categories):
+        self.categories = categories
+
+    def expression(self):
+        return Cast('category_id', CharField())
+
+    def condition(self, value):
+        return Q(category_id=int(value))
+
+    def clean(self, value):
+        return value if value and value.isdigit() else None
+
+    def choices(self, counts):
+        return [(str(category.pk), category.name) for category in self.categories]
+
+
+class PriceFacet(Facet):
+    param = 'price'
+    label = 'Khoảng giá'
+    ranges = {value: (low, high) for value, _, low, high in PRICE_RANGES}
+
+    def expression(self):
+        return Case(
+            *[When(self.condition(value), then=Value(value)) for value, *_ in PRICE_RANGES],
+            output_field=CharField(),
+        )
+
+    def condition(self, value):
+        low, high = self.ranges[value]
+        condition = Q()
+        if low is not None:
+            condition &= Q(price__gte=low)
+        if high is not None:
+            condition &= Q(price__lt=high)
+        return condition
+
+    def clean(self, value):
+        return value if value in self.ranges else None
+
+    def choices(self, counts):
+        return [(value, label) for value, label, _, _ in PRICE_RANGES]
+
+
+class FlagFacet(Facet):
+    """Facet bật/tắt (``?param=1``), chỉ hiển thị lựa chọn "có"."""
+
+    def __init__(self, param, label, choice_label, condition):
+        self.param = param
+        self.label = label
+        self.choice_label = choice_label
+        self._condition = condition
+
+    def expression(self):
+        return _flag(self._condition)
+
+    def condition(self, value):
+        return self._condition
+
+    def clean(self, value):
+        return '1' if value == '1' else None
+
+    def choices(self, counts):
+        return [('1', self.choice_label)]
+
+
+class UnitFacet(Facet):
+    param = 'unit'
+    label = 'Đơn vị'
+
+    def expression(self):
+        return F('unit')
+
+    def condition(self, value):
+        return Q(unit=value)
+
+
+def default_facets(categories):
+    return [
+        CategoryFacet(categories),
+        PriceFacet(),
+        FlagFacet('in_stock', 'Tình trạng', 'Còn hàng', Q(stock__gt=0)),
+        FlagFacet('featured', 'Nổi bật', 'Sản phẩm nổi bật', Q(is_featured=True)),
+        UnitFacet(),
+    ]
+
+
+class FacetSet:
+    """Bộ lọc đang chọn trong ``request.GET`` và số đếm của từng lựa chọn."""
+
+    def __init__(self, request, facets):
+        self.request = request
+        self.facets = facets
+        self.selected = {}
+        for facet in facets:
+            value = facet.clean(request.GET.get(facet.param))
+            if value is not None:
+                self.selected[facet.param] = value
+
+    def filter(self, queryset):
+        """Áp dụng mọi bộ lọc đang chọn trong một lần ``filter``."""
+        condition = Q()
+        for facet in self.facets:
+            if facet.param in self.selected:
+                condition &= facet.condition(self.selected[facet.param])
+        return queryset.filter(condition)
+
+    def expressions(self):
+        return {'f%d' % index: facet.expression() for index, facet in enumerate(self.facets)}
+
+    def table(self, queryset, cache=True):
+        """Bảng đếm ``[(giá trị của từng facet, số sản phẩm)]`` của ``queryset``.
+
+        ``cache=False`` luôn chạy truy vấn (kết quả tìm kiếm: mỗi từ khóa một bảng).
+        """
+        if not cache:
+            return self._group(queryset)
+        catalog_cache = get_catalog_cache()
+        version, = get_versions('all')
+        key = 'facets:%s:%s' % (version, hashlib.md5(str(queryset.query).encode('utf-8')).hexdigest())
+        rows = catalog_cache.get(key)
+        if rows is None:
+            rows = self._group(queryset)
+            catalog_cache.set(key, rows, FACET_CACHE_TIMEOUT)
+        return rows
+
+    def _group(self, queryset):
+        expressions = self.expressions()
+        grouped = queryset.order_by().values(**expressions).annotate(n=Count('pk'))
+        return [(tuple(row[name] for name in expressions), row['n']) for row in grouped]
+
+    def counts(self, rows):
+        """``(tổng số kết quả, {param: Counter})``; mỗi facet bỏ qua bộ lọc của chính nó."""
+        per_facet = [Counter() for _ in self.facets]
+        total = 0
+        for values, n in rows:
+            misses = [
+                index for index, facet in enumerate(self.facets)
+                if facet.param in self.selected and values[index] != self.selected[facet.param]
+            ]
+            if not misses:
+                total += n
+                for index, value in enumerate(values):
+                    per_facet[index][value] += n
+            elif len(misses) == 1:
+                per_facet[misses[0]][values[misses[0]]] += n
+        return total, {facet.param: counter for facet, counter in zip(self.facets, per_facet)}
+
+    def url(self, param, value):
+        params = self.request.GET.copy()
+        params.pop('page', None)
+        params.pop('cursor', None)
+        if self.selected.get(param) == value:
+            params.pop(param, None)
+        else:
+            params[param] = value
+        query = params.urlencode()
+        return '%s?%s' % (self.request.path, query) if query else self.request.path
+
+    def groups(self, rows):
+        """``(tổng số kết quả, danh sách nhóm facet)`` từ bảng đếm, cho template."""
+        total, counts = self.counts(rows)
+        groups = []
+        for facet in self.facets:
+            counter = counts[facet.param]
+            groups.append({
+                'param': facet.param,
+                'label': facet.label,
+                'choices': [
+                    {
+                        'value': value,
+                        'label': label,
+                        'count': counter.get(value, 0),
+                        'selected': self.selected.get(facet.param) == value,
+                        'url': self.url(facet.param, value),
+                    }
+                    for value, label in facet.choices(counter)
+                ],
+            })
+        return total, groups
@@ -0,0 +1,171 @@
+"""Ảnh thu nhỏ (card, dòng giỏ hàng, trang chi tiết) ở dạng WebP và JPEG.
+
+Mỗi ảnh gốc ``products/ca-rot.jpg`` sinh ra các file
+``variants/products/ca-rot-card.webp``, ``...-card-2x.jpg``... trong cùng
+storage. Biến thể được tạo khi lưu ``Product``/``Category`` (xem
+``products/signals.py``) và có thể tạo lại hàng loạt bằng lệnh
+``generate_image_variants``. Template dùng ``{% picture %}`` trong
+``products/templatetags/product_images.py``.
+"""
+import logging
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+VARIANT_DIR = 'variants'
+
+# tên: (rộng, cao, cắt cho vừa khung) ở mật độ 1x
+VARIANTS = {
+    'card': (320, 200, True),
+    'cart': (80, 80, True),
+    'detail': (600, 400, False),
+}
+DENSITIES = (1, 2)
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+
+def variants_enabled():
+    return getattr(settings, 'IMAGE_VARIANTS_ENABLED', True)
+
+
+def variant_name(name, variant, density=1, ext='jpg'):
+    """Đường dẫn trong storage của một biến thể của ảnh ``name``."""
+    stem = posixpath.splitext(name)[0]
+    suffix = '' if density == 1 else f'-{density}x'
+    return f'{VARIANT_DIR}/{stem}-{variant}{suffix}.{ext}'
+
+
+def all_variant_names(name):
+    return [
+        variant_name(name, variant, density, ext)
+        for variant in VARIANTS for density in DENSITIES for ext in FORMATS
+    ]
+
+
+def _is_fresh(storage, target, source_mtime):
+    if not storage.exists(target):
+        return False
+    if source_mtime is None:
+        return True
+    try:
+        return storage.get_modified_time(target) >= source_mtime
+    except NotImplementedError:
+        return True
+
+
+def _resize(image, width, height, crop):
+    if crop:
+        return ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+    resized = image.copy()
+    resized.thumbnail((width, height), Image.Resampling.LANCZOS)
+    return resized
+
+
+def _encode(image, ext):
+    fmt, options = FORMATS[ext]
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    elif image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_variants(name, storage=None, force=False):
+    """Tạo các biến thể còn thiếu hoặc cũ hơn ảnh gốc ``name``.
+
+    Trả về ``(số file đã tạo, số file bỏ qua)``. Ảnh gốc không tồn tại hoặc
+    không đọc được thì ném ``OSError``.
+    """
+    storage = storage or default_storage
+    try:
+        source_mtime = storage.get_modified_time(name)
+    except NotImplementedError:
+        source_mtime = None
+
+    pending = []
+    for variant, (width, height, crop) in VARIANTS.items():
+        for density in DENSITIES:
+            for ext in FORMATS:
+                target = variant_name(name, variant, density, ext)
+                if force or not _is_fresh(storage, target, source_mtime):
+                    pending.append((target, width * density, height * density, crop, ext))
+    if not pending:
+        return 0, len(all_variant_names(name))
+
+    try:
+        with storage.open(name, 'rb') as source:
+            original = ImageOps.exif_transpose(Image.open(source))
+            original.load()
+    except UnidentifiedImageError as exc:
+        raise OSError(f'Không đọc được ảnh {name}: {exc}') from exc
+
+    for target, width, height, crop, ext in pending:
+        content = _encode(_resize(original, width, height, crop), ext)
+        if storage.exists(target):
+            storage.delete(target)
+        storage.save(target, content)
+    return len(pending), len(all_variant_names(name)) - len(pending)
+
+
+def delete_variants(name, storage=None):
+    storage = storage or default_storage
+    for target in all_variant_names(name):
+        if storage.exists(target):
+            storage.delete(target)
+
+
+def generate_for_field(field_file):
+    """Tạo biến thể cho một ``ImageFieldFile``; lỗi chỉ được ghi log, không ném ra."""
+    if not field_file or not variants_enabled():
+        return
+    if not field_file.storage.exists(field_file.name):
+        logger.debug('Bỏ qua ảnh thu nhỏ: không có file %s', field_file.name)
+        return
+    try:
+        generate_variants(field_file.name, field_file.storage)
+    except OSError as exc:
+        logger.warning('Không tạo được ảnh thu nhỏ cho %s: %s', field_file.name, exc)
+
+
+def has_variant(field_file, variant):
+    """Biến thể ``variant`` của ảnh đã được tạo chưa.
+
+    Ảnh tải lên trước khi chạy ``generate_image_variants``, hoặc tạo biến thể bị
+    lỗi (chỉ ghi log), thì chưa có.
+    """
+    return field_file.storage.exists(variant_name(field_file.name, variant))
+
+
+def picture_sources(field_file, variant):
+    """URL ảnh gốc và của biến thể ``variant`` cho ``<picture>`` (xem ``{% picture %}``).
+
+    Chưa có biến thể thì chỉ có ``url`` (ảnh gốc).
+    """
+    sources = {'url': field_file.url}
+    if variants_enabled() and has_variant(field_file, variant):
+        sources.update(
+            src=field_file.storage.url(variant_name(field_file.name, variant)),
+            srcset=srcset(field_file, variant, 'jpg'),
+            webp=srcset(field_file, variant, 'webp'),
+        )
+    return sources
+
+
+def srcset(field_file, variant, ext):
+    """Chuỗi ``srcset`` theo mật độ điểm ảnh cho một biến thể."""
+    storage = field_file.storage
+    return ', '.join(
+        f'{storage.url(variant_name(field_file.name, variant, density, ext))} {density}x'
+        for density in DENSITIES
+    )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.recommendations import TOP_K, RecommendationBuilder
+
+
+class Command(BaseCommand):
+    help = 'Cập nhật gợi ý "thường được mua cùng" từ các giỏ hàng mới thay đổi'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true',
+                            help='Xóa số đếm cũ và tính lại từ tất cả giỏ hàng')
+        parser.add_argument('--top-k', type=int, default=TOP_K,
+                            help=f'Số gợi ý lưu cho mỗi sản phẩm (mặc định {TOP_K})')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Số giỏ hàng mỗi lô (mặc định 1000)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0 or options['top_k'] <= 0:
+            raise CommandError('--batch-size và --top-k phải > 0')
+        builder = RecommendationBuilder(
+            top_k=options['top_k'], batch_size=options['batch_size'], full=options['full'],
+        )
+        started = time.perf_counter()
+
+        def progress(stats):
+            self.stdout.write(f"  {stats['carts']} giỏ ({stats['changed']} có sản phẩm mới)")
+
+        stats = builder.run(on_batch=progress)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats['carts']} giỏ trong {elapsed:.2f}s: {stats['changed']} có sản phẩm mới, "
+            f"{stats['pairs']} cặp được cộng, cập nhật gợi ý cho {stats['products']} sản phẩm"
+        ))
@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog_io import detect_format, export_rows, write_rows
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Xuất catalog ra CSV/JSONL (cùng định dạng với import_catalog)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', default='-',
+                            help='File đích, hoặc "-" (mặc định) để ghi ra stdout')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Định dạng (mặc định đoán theo đuôi file, stdout là csv)')
+        parser.add_argument('--category', help='Chỉ xuất sản phẩm của danh mục này (theo tên)')
+        parser.add_argument('--chunk-size', type=int, default=2000,
+                            help='Số dòng đọc từ CSDL mỗi lần (mặc định 2000)')
+
+    def handle(self, *args, **options):
+        fmt = detect_format(options['path'], options['format'])
+        queryset = Product.objects.all()
+        if options['category']:
+            queryset = queryset.filter(category__name__iexact=options['category'])
+        rows = export_rows(queryset, chunk_size=options['chunk_size'])
+
+        started = time.perf_counter()
+        if options['path'] == '-':
+            count = write_rows(rows, self.stdout, fmt)
+        else:
+            try:
+                stream = open(options['path'], 'w', newline='', encoding='utf-8')
+            except OSError as exc:
+                raise CommandError(f'Không mở được file: {exc}')
+            with stream:
+                count = write_rows(rows, stream, fmt)
+        elapsed = time.perf_counter() - started
+        self.stderr.write(f'Đã xuất {count} sản phẩm trong {elapsed:.2f}s')
@@ -0,0 +1,73 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from products.cache import bump
+from products.cards import refresh_card_data
+from products.images import generate_variants
+from products.models import Category, Product
+
+
+def _generate(name, force):
+    # Chạy trong tiến trình con: chỉ đọc/ghi storage, không dùng CSDL
+    try:
+        created, skipped = generate_variants(name, force=force)
+    except OSError as exc:
+        return name, 0, 0, str(exc)
+    return name, created, skipped, None
+
+
+class Command(BaseCommand):
+    help = 'Tạo (lại) ảnh thu nhỏ WebP/JPEG cho ảnh sản phẩm và danh mục'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Số tiến trình xử lý song song (mặc định bằng số CPU)')
+        parser.add_argument('--force', action='store_true',
+                            help='Tạo lại cả các biến thể còn mới')
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in (Product, Category):
+            names.update(
+                model.objects.exclude(image='').exclude(image__isnull=True)
+                .values_list('image', flat=True)
+            )
+        names = sorted(names)
+        # Không để tiến trình con kế thừa kết nối CSDL đang mở
+        connections.close_all()
+
+        started = time.perf_counter()
+        created = skipped = failed = 0
+        workers = max(options['workers'], 1)
+        if workers == 1:
+            results = (_generate(name, options['force']) for name in names)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            futures = [pool.submit(_generate, name, options['force']) for name in names]
+            results = (future.result() for future in as_completed(futures))
+        try:
+            for name, done, fresh, error in results:
+                if error:
+                    failed += 1
+                    self.stderr.write(f'Lỗi {name}: {error}')
+                created += done
+                skipped += fresh
+        finally:
+            if workers > 1:
+                pool.shutdown()
+
+        if created:
+            # Thẻ sản phẩm và các trang đã cache có thể còn dùng ảnh gốc
+            products = Product.objects.exclude(image='').exclude(image__isnull=True).order_by('pk')
+            refresh_card_data(products.iterator(chunk_size=1000))
+            bump('all', *('category:%s' % pk for pk in Category.objects.values_list('pk', flat=True)))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(names)} ảnh: tạo {created} biến thể, bỏ qua {skipped} còn mới, '
+            f'{failed} lỗi trong {elapsed:.2f}s'
+        ))
@@ -0,0 +1,59 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.catalog_io import CatalogImporter, detect_format, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Nhập giá, tồn kho và sản phẩm mới từ file CSV/JSONL (khớp theo sku hoặc id)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Đường dẫn file, hoặc "-" để đọc từ stdin')
+        parser.add_argument('--format', choices=['csv', 'jsonl'],
+                            help='Định dạng file (mặc định đoán theo đuôi file)')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Số dòng mỗi lô/transaction (mặc định 1000)')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Chỉ so sánh và thống kê, không ghi CSDL')
+        parser.add_argument('--no-create-categories', action='store_true',
+                            help='Báo lỗi thay vì tạo danh mục chưa có')
+        parser.add_argument('--max-errors', type=int, default=20,
+                            help='Số lỗi tối đa được in ra (mặc định 20)')
+
+    def handle(self, *args, **options):
+        if options['batch_size'] <= 0:
+            raise CommandError('--batch-size phải > 0')
+        fmt = detect_format(options['path'], options['format'])
+        importer = CatalogImporter(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run'],
+            create_categories=not options['no_create_categories'],
+        )
+        started = time.perf_counter()
+
+        def progress(stats):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"  {stats['rows']} dòng ({stats['rows'] / elapsed:.0f} dòng/s)")
+
+        if options['path'] == '-':
+            stats = importer.run(read_rows(sys.stdin, fmt), on_batch=progress)
+        else:
+            try:
+                stream = open(options['path'], newline='', encoding='utf-8-sig')
+            except OSError as exc:
+                raise CommandError(f'Không mở được file: {exc}')
+            with stream:
+                stats = importer.run(read_rows(stream, fmt), on_batch=progress)
+
+        for number, message in importer.errors[:options['max_errors']]:
+            self.stderr.write(f'Dòng {number}: {message}')
+        elapsed = time.perf_counter() - started
+        rate = stats['rows'] / elapsed if elapsed else 0
+        prefix = '[dry-run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}{stats['rows']} dòng trong {elapsed:.2f}s ({rate:.0f} dòng/s): "
+            f"tạo {stats['created']}, cập nhật {stats['updated']}, "
+            f"không đổi {stats['unchanged']}, lỗi {stats['errors']}"
+        ))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.cards import refresh_card_data
+from products.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Dựng lại dữ liệu thẻ sản phẩm (sau khi đổi CARD_DATA_VERSION, MEDIA_URL...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Số sản phẩm xử lý mỗi lượt (mặc định 1000)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        batch_size = options['batch_size']
+        products = Product.objects.order_by('pk').iterator(chunk_size=batch_size)
+        total = changed = 0
+        batch = []
+        for product in products:
+            batch.append(product)
+            if len(batch) == batch_size:
+                changed += refresh_card_data(batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            changed += refresh_card_data(batch)
+            total += len(batch)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Đã kiểm tra {total} sản phẩm, cập nhật {changed} trong {elapsed:.2f}s'
+        ))
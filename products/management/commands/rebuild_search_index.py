@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from products.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Dựng lại toàn bộ chỉ mục tìm kiếm sản phẩm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Số sản phẩm đánh chỉ mục mỗi lượt (mặc định 1000)')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = get_search_backend().rebuild(batch_size=options['batch_size'])
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Đã đánh chỉ mục {count} sản phẩm trong {elapsed:.2f}s'
+        ))
@@ -0,0 +1,54 @@
+import unicodedata
+
+from django.db import migrations
+
+# Bản chép cố định tại thời điểm viết migration (không import products.search:
+# đổi code sau này không được làm đổi việc migration này làm)
+SEARCH_TABLE = 'products_search'
+
+
+def fold_accents(text):
+    text = (text or '').replace('đ', 'd').replace('Đ', 'D')
+    decomposed = unicodedata.normalize('NFD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    Product = apps.get_model('products', 'Product')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5('
+            f"name, description, category, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        # Trọng số bm25 theo thứ tự cột: tên, mô tả, danh mục
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rank) VALUES ('rank', 'bm25(10.0, 1.0, 4.0)')"
+        )
+        rows = [
+            (p.pk, fold_accents(p.name), fold_accents(p.description), fold_accents(p.category.name))
+            for p in Product.objects.select_related('category').iterator()
+        ]
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, description, category) VALUES (%s, %s, %s, %s)',
+            rows,
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Không điền sẵn card_data: migration không phụ thuộc URLconf hay định dạng
+    # thẻ hiện tại. Thẻ trống được tính khi render cho tới khi sản phẩm được lưu
+    # hoặc chạy ``manage.py rebuild_product_cards``.
+
+    dependencies = [
+        ('products', '0006_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='card_data',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
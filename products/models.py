@@ -1,5 +1,7 @@
 from django.db import models
 
+from .cards import format_price
+
 class Category(models.Model):
     name = models.CharField(max_length=100, verbose_name="Tên danh mục")
     description = models.TextField(blank=True, verbose_name="Mô tả")
@@ -15,6 +17,7 @@ class Category(models.Model):
 
 class Product(models.Model):
     name = models.CharField(max_length=200, verbose_name="Tên sản phẩm")
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True, verbose_name="Mã SKU")
     category = models.ForeignKey(Category, on_delete=models.CASCADE, verbose_name="Danh mục")
     description = models.TextField(verbose_name="Mô tả")
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Giá (VNĐ)")
@@ -25,14 +28,113 @@ class Product(models.Model):
     is_featured = models.BooleanField(default=False, verbose_name="Sản phẩm nổi bật")
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Giá, mô tả rút gọn, URL, ảnh dựng sẵn cho thẻ sản phẩm (xem products/cards.py)
+    card_data = models.JSONField(default=dict, blank=True, editable=False)
     
     class Meta:
         verbose_name = "Sản phẩm"
         verbose_name_plural = "Sản phẩm"
         ordering = ['-created_at']
+        # Chỉ mục một phần cho các truy vấn nóng, chỉ chứa sản phẩm đang bán
+        # (kiểm tra bằng EXPLAIN trong products/tests.py)
+        indexes = [
+            # home: nổi bật mới nhất
+            models.Index(
+                fields=['-created_at'], name='product_featured_idx',
+                condition=models.Q(is_featured=True, is_available=True),
+            ),
+            # product_list: phân trang theo (created_at, id)
+            models.Index(
+                fields=['-created_at', '-id'], name='product_available_idx',
+                condition=models.Q(is_available=True),
+            ),
+            # category_detail, sản phẩm liên quan, lọc danh mục ở product_list
+            models.Index(
+                fields=['category', '-created_at', '-id'], name='product_category_idx',
+                condition=models.Q(is_available=True),
+            ),
+            # API: Last-Modified (MAX(updated_at)) và đồng bộ theo (updated_at, id)
+            models.Index(fields=['updated_at', 'id'], name='product_updated_idx'),
+            models.Index(fields=['category', 'updated_at', 'id'], name='product_category_updated_idx'),
+        ]
     
+    # Trường mà signal cần so với giá trị trong CSDL (xem ``saved_value``)
+    TRACKED_FIELDS = ('category_id', 'price')
+
     def __str__(self):
         return self.name
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_saved_values()
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._remember_saved_values(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._remember_saved_values(fields)
+
+    def _remember_saved_values(self, fields=None):
+        saved = self.__dict__.setdefault('_saved_values', {})
+        for attname in self.TRACKED_FIELDS:
+            # Bỏ qua trường bị defer (đọc sẽ tốn thêm truy vấn) hoặc không được lưu
+            if attname not in self.__dict__:
+                continue
+            if fields is None or attname in fields or attname.removesuffix('_id') in fields:
+                saved[attname] = self.__dict__[attname]
+
+    def saved_value(self, attname):
+        """Giá trị ``attname`` khi nạp từ CSDL hoặc lưu lần cuối; ``None`` nếu không rõ.
+
+        Trong ``post_save`` đây vẫn là giá trị trước lần lưu đang diễn ra.
+        """
+        return self.__dict__.get('_saved_values', {}).get(attname)
     
     def get_price_display(self):
-        return f"{self.price:,.0f} VNĐ/{self.unit}"
+        return format_price(self.price, self.unit)
+
+
+class ProductPair(models.Model):
+    """Số giỏ hàng chứa cả ``product`` và ``other`` (ma trận đồng xuất hiện thưa).
+
+    Mỗi cặp được lưu cả hai chiều; dòng ``product == other`` là số giỏ chứa sản
+    phẩm đó. Bảng do lệnh ``build_recommendations`` cập nhật.
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    other = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'other'], name='product_pair_unique'),
+        ]
+
+
+class ProductRecommendation(models.Model):
+    """Top-K sản phẩm "thường được mua cùng" của mỗi sản phẩm, theo ``rank`` tăng dần."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='recommended_by')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['rank']
+        # Cũng là chỉ mục cho lượt đọc ở product_detail (product_id = ? ORDER BY rank)
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='recommendation_rank_unique'),
+        ]
+
+
+class BasketSnapshot(models.Model):
+    """Các sản phẩm của một giỏ đã được tính vào ``ProductPair``.
+
+    Không khóa ngoại tới giỏ: giỏ bị dọn (``purge_carts``) thì số đếm vẫn giữ.
+    """
+    cart_id = models.BigIntegerField(primary_key=True)
+    product_ids = models.JSONField(default=list)
+    # updated_at của giỏ lúc tính; giá trị lớn nhất là mốc của lần chạy sau
+    cart_updated_at = models.DateTimeField(db_index=True)
@@ -0,0 +1,188 @@
+"""Phân trang theo con trỏ (keyset) cho danh sách sản phẩm.
+
+Thay vì ``OFFSET`` và ``COUNT(*)``, mỗi trang lọc theo khóa sắp xếp của phần
+tử cuối trang trước (``created_at``, ``id``), nên trang sâu tốn như trang đầu.
+Con trỏ là chuỗi base64 mờ (opaque) mã hóa khóa đó và hướng đi.
+"""
+import base64
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+DEFAULT_ORDERING = ('-created_at', '-id')
+
+
+def cached_count(queryset, timeout=300, refresh=False):
+    """``COUNT(*)`` của queryset, lưu cache theo câu SQL trong ``timeout`` giây.
+
+    ``refresh`` bỏ qua giá trị đang có trong cache và đếm lại.
+    """
+    sql = str(queryset.query).encode('utf-8')
+    key = 'queryset-count:%s' % hashlib.md5(sql).hexdigest()
+    count = None if refresh else cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+def encode_cursor(values, direction):
+    payload = json.dumps({'v': values, 'd': direction}, separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Trả về ``(values, direction)``; ném ``ValueError`` nếu con trỏ hỏng."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        values, direction = payload['v'], payload['d']
+    except (TypeError, KeyError, ValueError, UnicodeError):
+        raise ValueError('Con trỏ phân trang không hợp lệ')
+    if direction not in ('n', 'p') or not isinstance(values, list):
+        raise ValueError('Con trỏ phân trang không hợp lệ')
+    return values, direction
+
+
+class KeysetPage:
+    """Một trang kết quả, có API gần giống ``django.core.paginator.Page``."""
+
+    is_keyset = True
+
+    def __init__(self, object_list, paginator, has_next, has_previous):
+        self.object_list = object_list
+        self.paginator = paginator
+        self._has_next = has_next
+        self._has_previous = has_previous
+
+    def __repr__(self):
+        return '<KeysetPage of %s items>' % len(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+    def has_other_pages(self):
+        return self._has_next or self._has_previous
+
+    @cached_property
+    def next_cursor(self):
+        if not self._has_next or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[-1], 'n')
+
+    @cached_property
+    def previous_cursor(self):
+        if not self._has_previous or not self.object_list:
+            return None
+        return self.paginator.cursor_for(self.object_list[0], 'p')
+
+
+class KeysetPaginator:
+    """Phân trang keyset trên ``queryset`` theo ``ordering`` (trường cuối phải duy nhất)."""
+
+    def __init__(self, queryset, per_page, ordering=DEFAULT_ORDERING, count_timeout=300):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = [
+            (name.lstrip('-'), name.startswith('-')) for name in ordering
+        ]
+        self.count_timeout = count_timeout
+
+    @cached_property
+    def count(self):
+        """Tổng số phần tử (lấy từ cache, có thể trễ tối đa ``count_timeout`` giây)."""
+        return cached_count(self.queryset, self.count_timeout)
+
+    def cursor_for(self, obj, direction):
+        return encode_cursor([getattr(obj, name) for name, _ in self.ordering], direction)
+
+    def _parse_values(self, values):
+        if len(values) != len(self.ordering):
+            raise ValueError('Con trỏ phân trang không hợp lệ')
+        opts = self.queryset.model._meta
+        try:
+            return [
+                opts.get_field(name).to_python(value)
+                for (name, _), value in zip(self.ordering, values)
+            ]
+        except (LookupError, ValidationError):
+            raise ValueError('Con trỏ phân trang không hợp lệ')
+
+    def _seek_filter(self, values, forward):
+        """Điều kiện "đứng sau khóa ``values``" theo thứ tự sắp xếp (hoặc ngược lại)."""
+        condition = Q()
+        equal = Q()
+        for (name, descending), value in zip(self.ordering, values):
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= equal & Q(**{'%s__%s' % (name, lookup): value})
+            equal &= Q(**{name: value})
+        # Thêm điều kiện phạm vi trên trường đầu để SQLite dùng được chỉ mục
+        first_name, first_descending = self.ordering[0]
+        bound = 'lte' if first_descending == forward else 'gte'
+        return Q(**{'%s__%s' % (first_name, bound): values[0]}) & condition
+
+    def _order_by(self, forward):
+        return [
+            ('-' if descending == forward else '') + name
+            for name, descending in self.ordering
+        ]
+
+    def get_page(self, cursor=None):
+        """Trang sau/trước ``cursor``; con trỏ rỗng hoặc hỏng trả về trang đầu."""
+        values = direction = None
+        if cursor:
+            try:
+                raw_values, direction = decode_cursor(cursor)
+                values = self._parse_values(raw_values)
+            except ValueError:
+                values = direction = None
+
+        forward = direction != 'p'
+        queryset = self.queryset.order_by(*self._order_by(forward))
+        if values is not None:
+            queryset = queryset.filter(self._seek_filter(values, forward))
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+
+        if forward:
+            return KeysetPage(rows, self, has_next=has_more, has_previous=values is not None)
+        rows.reverse()
+        return KeysetPage(rows, self, has_next=True, has_previous=has_more)
+
+
+def paginate_products(request, queryset, per_page=12):
+    """Phân trang danh sách sản phẩm theo ``settings.PRODUCT_PAGINATION``.
+
+    ``'cursor'`` (mặc định) dùng ``KeysetPaginator`` với tham số ``?cursor=``;
+    ``'offset'`` giữ cách cũ với ``Paginator`` và ``?page=``.
+    """
+    if getattr(settings, 'PRODUCT_PAGINATION', 'cursor') == 'offset':
+        return Paginator(queryset, per_page).get_page(request.GET.get('page'))
+    return KeysetPaginator(queryset, per_page).get_page(request.GET.get('cursor'))
+
+
+def pagination_query(request):
+    """Query string hiện tại, bỏ các tham số phân trang, để nối vào link trang."""
+    params = request.GET.copy()
+    params.pop('page', None)
+    params.pop('cursor', None)
+    return params.urlencode()
@@ -0,0 +1,215 @@
+"""Gợi ý "thường được mua cùng" tính sẵn từ các giỏ hàng trong CSDL.
+
+Lệnh ``build_recommendations`` duyệt giỏ hàng theo lô, đọc ``CartItem`` của cả lô
+bằng một truy vấn sắp theo giỏ rồi đếm cặp sản phẩm trong bộ nhớ bằng ``Counter``
+(ma trận đồng xuất hiện thưa, khóa là ``(a, b)``). Số đếm được cộng dồn vào
+``ProductPair`` bằng upsert; chỉ các sản phẩm có cặp thay đổi được xếp hạng lại
+và ghi top-K vào ``ProductRecommendation``, bảng mà ``product_detail`` đọc bằng
+một truy vấn theo chỉ mục ``(product, rank)``.
+
+Chạy tăng dần: ``BasketSnapshot`` nhớ các sản phẩm đã đếm của mỗi giỏ, lần chạy
+sau chỉ đọc các giỏ có ``updated_at`` từ mốc lần trước và chỉ cộng các cặp có
+sản phẩm mới. Bỏ sản phẩm khỏi giỏ không trừ số đếm (hai sản phẩm đã từng nằm
+chung giỏ). Giỏ cookie của khách không lưu trong CSDL nên không được tính.
+
+Điểm của một cặp là độ tương tự cosine ``n(a, b) / sqrt(n(a) * n(b))`` để vài
+sản phẩm bán chạy không chiếm hết gợi ý. Điểm của sản phẩm không có cặp mới
+không được tính lại khi ``n(a)`` của hàng xóm thay đổi; ``--full`` tính lại tất cả.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import combinations, groupby
+from operator import itemgetter
+
+from django.db import connections, router, transaction
+from django.db.models import F, Max
+
+from cart.models import Cart, CartItem
+from vegetable_store.routers import use_primary
+from vegetable_store.utils import chunked
+from . import cache
+from .models import BasketSnapshot, Product, ProductPair, ProductRecommendation
+
+TOP_K = 12
+RELATED_LIMIT = 4
+# Giỏ rất lớn (mua sỉ) sinh O(n²) cặp mà ít ý nghĩa: chỉ đếm chừng này sản phẩm đầu
+MAX_BASKET = 50
+# Đọc lùi lại một chút so với mốc để không sót giỏ ghi xong muộn; đếm lại là vô hại
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+
+def recommended_queryset(product, limit=RELATED_LIMIT):
+    return Product.objects.filter(
+        recommended_by__product=product, is_available=True,
+    ).order_by('recommended_by__rank')[:limit]
+
+
+def category_queryset(product, limit=RELATED_LIMIT):
+    return Product.objects.filter(
+        category_id=product.category_id, is_available=True,
+    ).exclude(pk=product.pk)[:limit]
+
+
+def related_products(product, limit=RELATED_LIMIT):
+    """Sản phẩm thường được mua cùng; chưa có gợi ý thì lấy sản phẩm mới cùng danh mục."""
+    return list(recommended_queryset(product, limit)) or list(category_queryset(product, limit))
+
+
+async def arelated_products(product, limit=RELATED_LIMIT):
+    products = [p async for p in recommended_queryset(product, limit)]
+    return products or [p async for p in category_queryset(product, limit)]
+
+
+class RecommendationBuilder:
+    """Cập nhật ``ProductPair`` và top-K gợi ý; thống kê nằm trong ``self.stats``."""
+
+    def __init__(self, top_k=TOP_K, batch_size=1000, full=False):
+        self.top_k = top_k
+        self.batch_size = batch_size
+        self.full = full
+        # Sản phẩm có số đếm thay đổi, cần xếp hạng lại
+        self.touched = set()
+        self.stats = {'carts': 0, 'changed': 0, 'pairs': 0, 'products': 0}
+        self.db = router.db_for_write(ProductPair)
+
+    def run(self, on_batch=None):
+        # Bản sao có thể trễ; đọc lại đúng dữ liệu vừa ghi
+        with use_primary():
+            since = self.start()
+            for batch in self.cart_batches(since):
+                self.count_batch(batch)
+                if on_batch is not None:
+                    on_batch(self.stats)
+            self.rank(self.touched)
+            if self.full:
+                # Sản phẩm không còn cặp nào (vd. dữ liệu cũ đã bị xóa)
+                ProductRecommendation.objects.exclude(
+                    product__in=ProductPair.objects.values('product'),
+                ).delete()
+        return self.stats
+
+    def start(self):
+        """Mốc ``updated_at`` của giỏ cần đọc (``None`` là đọc tất cả)."""
+        if self.full:
+            with transaction.atomic(using=self.db):
+                ProductPair.objects.all().delete()
+                BasketSnapshot.objects.all().delete()
+            return None
+        last = BasketSnapshot.objects.aggregate(last=Max('cart_updated_at'))['last']
+        return last - WATERMARK_OVERLAP if last else None
+
+    def cart_batches(self, since):
+        carts = Cart.objects.order_by('pk')
+        if since is not None:
+            carts = carts.filter(updated_at__gte=since)
+        last_pk = 0
+        while True:
+            batch = list(carts.filter(pk__gt=last_pk).values_list('pk', 'updated_at')[:self.batch_size])
+            if not batch:
+                return
+            yield batch
+            last_pk = batch[-1][0]
+
+    def count_batch(self, carts):
+        cart_ids = [pk for pk, _ in carts]
+        rows = CartItem.objects.filter(cart_id__in=cart_ids).order_by('cart_id', 'created_at', 'id')
+        baskets = {
+            cart_id: [product_id for _, product_id in group]
+            for cart_id, group in groupby(rows.values_list('cart_id', 'product_id').iterator(), itemgetter(0))
+        }
+        counted = dict(BasketSnapshot.objects.filter(cart_id__in=cart_ids).values_list('cart_id', 'product_ids'))
+        # Sản phẩm đã đếm trước đây có thể đã bị xóa (khóa ngoại của ProductPair)
+        alive = set(Product.objects.filter(
+            pk__in={pk for product_ids in counted.values() for pk in product_ids},
+        ).values_list('pk', flat=True))
+
+        counts = Counter()
+        snapshots = []
+        for cart_id, updated_at in carts:
+            old = [pk for pk in counted.get(cart_id, ()) if pk in alive]
+            room = max(MAX_BASKET - len(old), 0)
+            new = [pk for pk in baskets.get(cart_id, ()) if pk not in old][:room]
+            if new:
+                self.stats['changed'] += 1
+                for pk in new:
+                    counts[pk, pk] += 1
+                for a, b in combinations(new, 2):
+                    counts[a, b] += 1
+                    counts[b, a] += 1
+                for a in old:
+                    for b in new:
+                        counts[a, b] += 1
+                        counts[b, a] += 1
+            snapshots.append(BasketSnapshot(
+                cart_id=cart_id, product_ids=old + new, cart_updated_at=updated_at,
+            ))
+
+        with transaction.atomic(using=self.db):
+            self.add_counts(counts)
+            BasketSnapshot.objects.bulk_create(
+                snapshots, update_conflicts=True, unique_fields=['cart_id'],
+                update_fields=['product_ids', 'cart_updated_at'],
+            )
+        self.touched.update(a for a, _ in counts)
+        self.stats['carts'] += len(carts)
+        self.stats['pairs'] += len(counts)
+
+    def add_counts(self, counts):
+        """Cộng ``counts`` vào ``ProductPair`` bằng ``INSERT ... ON CONFLICT DO UPDATE``."""
+        if not counts:
+            return
+        connection = connections[self.db]
+        table = connection.ops.quote_name(ProductPair._meta.db_table)
+        sql = (
+            f'INSERT INTO {table} ("product_id", "other_id", "count") VALUES (%s, %s, %s) '
+            f'ON CONFLICT ("product_id", "other_id") DO UPDATE SET "count" = {table}."count" + excluded."count"'
+        )
+        with connection.cursor() as cursor:
+            cursor.executemany(sql, [(a, b, n) for (a, b), n in counts.items()])
+
+    def rank(self, product_ids):
+        """Tính lại top-K của ``product_ids``; chỉ ghi (và xóa cache trang) khi danh sách đổi."""
+        for chunk in chunked(sorted(product_ids), 500):
+            neighbours = defaultdict(list)
+            baskets = {}
+            pairs = ProductPair.objects.filter(product_id__in=chunk).values_list('product_id', 'other_id', 'count')
+            for product_id, other_id, count in pairs.iterator():
+                if product_id == other_id:
+                    baskets[product_id] = count
+                else:
+                    neighbours[product_id].append((other_id, count))
+            others = {other_id for items in neighbours.values() for other_id, _ in items} - baskets.keys()
+            for others_chunk in chunked(sorted(others), 500):
+                baskets.update(ProductPair.objects.filter(
+                    product_id__in=others_chunk, other_id=F('product_id'),
+                ).values_list('product_id', 'count'))
+
+            current = defaultdict(list)
+            for product_id, recommended_id in ProductRecommendation.objects.filter(
+                product_id__in=chunk,
+            ).order_by('product_id', 'rank').values_list('product_id', 'recommended_id'):
+                current[product_id].append(recommended_id)
+
+            changed, rows = [], []
+            for product_id in chunk:
+                scored = [
+                    (other_id, count / math.sqrt(baskets.get(product_id, count) * baskets.get(other_id, count)), count)
+                    for other_id, count in neighbours.get(product_id, ())
+                ]
+                best = heapq.nlargest(self.top_k, scored, key=lambda item: (item[1], item[2], -item[0]))
+                if [other_id for other_id, _, _ in best] == current.get(product_id, []):
+                    continue
+                changed.append(product_id)
+                rows += [
+                    ProductRecommendation(product_id=product_id, recommended_id=other_id, rank=rank, score=score)
+                    for rank, (other_id, score, _) in enumerate(best)
+                ]
+            if not changed:
+                continue
+            with transaction.atomic(using=self.db):
+                ProductRecommendation.objects.filter(product_id__in=changed).delete()
+                ProductRecommendation.objects.bulk_create(rows)
+            cache.bump(*('product:%s' % pk for pk in changed))
+            self.stats['products'] += len(changed)
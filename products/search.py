@@ -0,0 +1,189 @@
+"""Tìm kiếm sản phẩm toàn văn, không phân biệt dấu tiếng Việt.
+
+Backend mặc định dùng bảng ảo SQLite FTS5 ``products_search`` (rowid = id sản
+phẩm) chứa tên, mô tả và tên danh mục đã bỏ dấu. Có thể thay backend qua
+``settings.PRODUCT_SEARCH_BACKEND``.
+"""
+import re
+import unicodedata
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from vegetable_store.utils import chunked
+
+SEARCH_TABLE = 'products_search'
+DEFAULT_SEARCH_LIMIT = 500
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def fold_accents(text):
+    """Bỏ dấu tiếng Việt và chuyển về chữ thường: "Cà rốt" -> "ca rot"."""
+    text = (text or '').replace('đ', 'd').replace('Đ', 'D')
+    decomposed = unicodedata.normalize('NFD', text)
+    return ''.join(c for c in decomposed if not unicodedata.combining(c)).lower()
+
+
+def tokenize(text):
+    """Tách chuỗi đã bỏ dấu thành các từ khóa."""
+    return _TOKEN_RE.findall(fold_accents(text))
+
+
+class BaseSearchBackend:
+    """Giao diện chung cho các backend tìm kiếm sản phẩm."""
+
+    def index_products(self, products, batch_size=1000):
+        """Thêm/cập nhật sản phẩm (đã nạp sẵn ``category``) vào chỉ mục."""
+
+    def remove_products(self, product_ids):
+        """Xóa sản phẩm khỏi chỉ mục."""
+
+    def clear(self):
+        """Xóa toàn bộ chỉ mục."""
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT, queryset=None):
+        """Trả về danh sách id sản phẩm, xếp theo độ liên quan giảm dần.
+
+        Có ``queryset`` thì chỉ xét sản phẩm thuộc ``queryset``; điều kiện được
+        áp dụng trước khi cắt ``limit`` nên bộ lọc không làm mất kết quả.
+        """
+        raise NotImplementedError
+
+    def filter(self, queryset, query):
+        """``queryset`` thu hẹp về các sản phẩm khớp ``query`` (không giới hạn, không xếp hạng)."""
+        raise NotImplementedError
+
+    def rebuild(self, batch_size=1000):
+        """Dựng lại toàn bộ chỉ mục, trả về số sản phẩm đã đánh chỉ mục."""
+        from .models import Product
+
+        self.clear()
+        products = Product.objects.select_related('category').order_by('pk')
+        count = 0
+        for chunk in chunked(products.iterator(chunk_size=batch_size), batch_size):
+            self.index_products(chunk, batch_size=batch_size)
+            count += len(chunk)
+        return count
+
+
+class SQLiteFTSBackend(BaseSearchBackend):
+    """Chỉ mục SQLite FTS5, xếp hạng bằng bm25 (tên > danh mục > mô tả)."""
+
+    def index_products(self, products, batch_size=1000):
+        for chunk in chunked(products, batch_size):
+            rows = [
+                (p.pk, fold_accents(p.name), fold_accents(p.description), fold_accents(p.category.name))
+                for p in chunk
+            ]
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(row[0],) for row in rows]
+                )
+                cursor.executemany(
+                    f'INSERT INTO {SEARCH_TABLE} (rowid, name, description, category) '
+                    f'VALUES (%s, %s, %s, %s)',
+                    rows,
+                )
+
+    def remove_products(self, product_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(pk,) for pk in product_ids]
+            )
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+
+    @staticmethod
+    def match_expression(query):
+        """Biểu thức MATCH của FTS5, hoặc ``None`` nếu ``query`` không có từ khóa."""
+        tokens = tokenize(query)
+        if not tokens:
+            return None
+        # Mỗi từ khóa là một tiền tố để gõ dở vẫn tìm được ("ca ro" -> "cà rốt")
+        return ' '.join(f'"{token}"*' for token in tokens)
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT, queryset=None):
+        match = self.match_expression(query)
+        if match is None:
+            return []
+        sql = f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s'
+        params = [match]
+        if queryset is not None:
+            # Lọc ngay trong câu FTS rồi mới xếp hạng và cắt LIMIT
+            subquery, subparams = queryset.order_by().values('pk').query.sql_with_params()
+            sql += f' AND rowid IN ({subquery})'
+            params.extend(subparams)
+        with connection.cursor() as cursor:
+            cursor.execute(sql + ' ORDER BY rank LIMIT %s', [*params, limit])
+            return [row[0] for row in cursor.fetchall()]
+
+    def filter(self, queryset, query):
+        match = self.match_expression(query)
+        if match is None:
+            return queryset.none()
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [match],
+        ))
+
+
+class SimpleSearchBackend(BaseSearchBackend):
+    """Dự phòng cho CSDL không có FTS5: lọc ``icontains``, ưu tiên khớp tên."""
+
+    def search(self, query, limit=DEFAULT_SEARCH_LIMIT, queryset=None):
+        from .models import Product
+
+        terms = query.split()
+        if not terms:
+            return []
+        name_match = Q()
+        for term in terms:
+            name_match &= Q(name__icontains=term)
+        products = self.filter(Product.objects.all() if queryset is None else queryset, query).annotate(
+            name_match=Case(When(name_match, then=Value(0)), default=Value(1), output_field=IntegerField())
+        )
+        return list(products.order_by('name_match', '-created_at').values_list('pk', flat=True)[:limit])
+
+    def filter(self, queryset, query):
+        condition = Q()
+        for term in query.split():
+            condition &= (
+                Q(name__icontains=term)
+                | Q(description__icontains=term)
+                | Q(category__name__icontains=term)
+            )
+        return queryset.filter(condition) if condition else queryset.none()
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """Backend theo ``settings.PRODUCT_SEARCH_BACKEND`` (mặc định theo loại CSDL)."""
+    path = getattr(settings, 'PRODUCT_SEARCH_BACKEND', None)
+    if path is None:
+        if connection.vendor == 'sqlite':
+            path = 'products.search.SQLiteFTSBackend'
+        else:
+            path = 'products.search.SimpleSearchBackend'
+    return import_string(path)()
+
+
+def search_ids(query, limit=None, queryset=None):
+    """Id sản phẩm khớp ``query`` theo thứ tự liên quan.
+
+    Không có ``queryset`` thì gồm cả sản phẩm ngừng bán; có thì điều kiện của
+    ``queryset`` được lọc trong câu tìm kiếm, trước khi cắt ``limit``.
+    """
+    if limit is None:
+        limit = getattr(settings, 'PRODUCT_SEARCH_LIMIT', DEFAULT_SEARCH_LIMIT)
+    return get_search_backend().search(query, limit=limit, queryset=queryset)
+
+
+def filter_products(queryset, query):
+    """``queryset`` thu hẹp về mọi sản phẩm khớp ``query`` (không giới hạn số kết quả)."""
+    return get_search_backend().filter(queryset, query)
@@ -0,0 +1,137 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from . import cache, cards, images
+from .models import Category, Product
+from .search import get_search_backend
+from .suggest import CATEGORY, PRODUCT, get_suggest_index
+
+# Phát sau khi lưu sản phẩm bằng bulk_create/bulk_update (không có post_save).
+# Tham số: created, updated (danh sách Product), fields (các trường đã đổi)
+products_bulk_saved = Signal()
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+def generate_image_variants(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Tạo ảnh thu nhỏ ngay khi ảnh được tải lên (bỏ qua biến thể còn mới)
+
+    Đăng ký trước ``refresh_card_data``: dữ liệu thẻ cần biết biến thể đã có chưa.
+    """
+    if raw or (update_fields is not None and 'image' not in update_fields):
+        return
+    images.generate_for_field(instance.image)
+
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, raw=False, **kwargs):
+    """Cập nhật chỉ mục tìm kiếm khi lưu sản phẩm"""
+    if raw:
+        return
+    get_search_backend().index_products([instance])
+
+
+@receiver(post_save, sender=Product)
+def refresh_card_data(sender, instance, raw=False, **kwargs):
+    """Dựng lại dữ liệu thẻ sản phẩm; chỉ ghi khi giá, mô tả, ảnh... đổi"""
+    if raw:
+        return
+    data = cards.build_card_data(instance)
+    if data != instance.card_data:
+        instance.card_data = data
+        sender.objects.filter(pk=instance.pk).update(card_data=data)
+
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """Xóa sản phẩm khỏi chỉ mục tìm kiếm"""
+    get_search_backend().remove_products([instance.pk])
+
+
+@receiver(post_save, sender=Product)
+def update_product_suggestion(sender, instance, raw=False, **kwargs):
+    """Cập nhật chỉ mục gợi ý (sản phẩm ngừng bán bị gỡ khỏi gợi ý)"""
+    if not raw:
+        get_suggest_index().update_product(instance)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_suggestion(sender, instance, **kwargs):
+    get_suggest_index().update(PRODUCT, instance.pk, None)
+
+
+@receiver(post_save, sender=Category)
+def update_category_suggestion(sender, instance, raw=False, **kwargs):
+    if not raw:
+        get_suggest_index().update(CATEGORY, instance.pk, instance.name)
+
+
+@receiver(post_delete, sender=Category)
+def remove_category_suggestion(sender, instance, **kwargs):
+    get_suggest_index().update(CATEGORY, instance.pk, None)
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created=False, raw=False, **kwargs):
+    """Tên danh mục nằm trong chỉ mục nên cần đánh lại các sản phẩm của nó"""
+    if raw or created:
+        return
+    products = Product.objects.filter(category=instance).select_related('category')
+    get_search_backend().index_products(products.iterator(chunk_size=1000))
+
+
+@receiver([post_save, post_delete], sender=Product)
+def invalidate_product_pages(sender, instance, raw=False, **kwargs):
+    """Tăng phiên bản cache của sản phẩm, danh mục của nó và toàn catalog
+
+    Sản phẩm chuyển danh mục thì trang của danh mục cũ cũng phải bỏ nó.
+    """
+    if raw:
+        return
+    cache.bump_products([instance])
+    previous = instance.saved_value('category_id')
+    if previous is not None and previous != instance.category_id:
+        cache.bump('category:%s' % previous)
+
+
+@receiver(post_delete, sender=Product)
+def record_product_deletion(sender, instance, **kwargs):
+    """Mốc xóa cho ``Last-Modified`` của API danh sách sản phẩm"""
+    cache.mark_deleted()
+
+
+@receiver([post_save, post_delete], sender=Category)
+def invalidate_category_pages(sender, instance, raw=False, **kwargs):
+    """Tăng phiên bản cache của danh mục và toàn catalog"""
+    if not raw:
+        cache.bump('all', 'category:%s' % instance.pk)
+
+
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def delete_image_variants(sender, instance, **kwargs):
+    """Xóa ảnh thu nhỏ của đối tượng đã bị xóa (nếu không còn ai dùng ảnh đó)"""
+    if instance.image and not sender.objects.filter(image=instance.image.name).exists():
+        images.delete_variants(instance.image.name, instance.image.storage)
+
+
+@receiver(products_bulk_saved, sender=Product)
+def sync_bulk_saved_products(sender, created, updated, fields, **kwargs):
+    """Đánh chỉ mục và vô hiệu hóa cache cho sản phẩm được lưu hàng loạt"""
+    reindex = list(created)
+    if fields & {'name', 'description', 'category_id'}:
+        reindex += updated
+    if reindex:
+        products = Product.objects.filter(pk__in=[p.pk for p in reindex]).select_related('category')
+        get_search_backend().index_products(products)
+    if created or fields & cards.CARD_FIELDS:
+        cards.refresh_card_data(list(created) + list(updated))
+    suggest_index = get_suggest_index()
+    if created or fields & {'name', 'is_available'}:
+        for product in list(created) + list(updated):
+            suggest_index.update_product(product)
+    cache.bump_products(list(created) + list(updated))
+    if 'category_id' in fields:
+        moved_from = {p.saved_value('category_id') for p in updated} - {None}
+        if moved_from:
+            cache.bump(*('category:%s' % pk for pk in sorted(moved_from)))
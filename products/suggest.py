@@ -0,0 +1,132 @@
+"""Gợi ý tìm kiếm khi gõ, từ chỉ mục tiền tố trong bộ nhớ của tiến trình.
+
+``SuggestIndex`` giữ một mảng đã sắp xếp các khóa ``(chuỗi đã bỏ dấu, loại, id)``
+cho tên sản phẩm đang bán và tên danh mục. Mỗi tên có một khóa cho mỗi vị trí bắt
+đầu từ ("ca rot da lat", "rot da lat", ...) nên gõ "rot" hay "da l" đều khớp; tra
+cứu là một lần ``bisect`` rồi đọc các khóa liền sau, không truy vấn CSDL.
+
+Chỉ mục được dựng khi dùng lần đầu (hai truy vấn), cập nhật từng phần qua signal
+lưu/xóa ``Product``/``Category`` (xem ``products/signals.py``) và dựng lại sau
+``MAX_AGE`` giây để thấy thay đổi do tiến trình khác ghi. Mọi thao tác đọc/ghi
+mảng đều giữ một ``threading.Lock``; việc dựng lại chạy ngoài khóa rồi mới thay.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+
+from .search import fold_accents, tokenize
+
+MAX_AGE = 300
+DEFAULT_LIMIT = 8
+# Số khóa đọc tối đa cho một tiền tố trước khi xếp hạng
+SCAN_LIMIT = 200
+PRODUCT = 'product'
+CATEGORY = 'category'
+
+
+def name_keys(name):
+    """Các khóa của ``name``: chuỗi đã bỏ dấu bắt đầu từ mỗi từ."""
+    tokens = tokenize(name)
+    return [' '.join(tokens[start:]) for start in range(len(tokens))]
+
+
+def normalize_query(query):
+    """Bỏ dấu, gộp khoảng trắng; giữ khoảng trắng cuối để "ca " không khớp "cai"."""
+    folded = ' '.join(tokenize(query))
+    if folded and query[-1:].isspace():
+        folded += ' '
+    return folded
+
+
+class SuggestIndex:
+    def __init__(self, max_age=MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._keys = []
+        # (loại, id) -> (tên, danh sách khóa)
+        self._entries = {}
+        self._built_at = None
+
+    def clear(self):
+        with self._lock:
+            self._keys, self._entries, self._built_at = [], {}, None
+
+    @property
+    def is_built(self):
+        return self._built_at is not None
+
+    def ensure_built(self):
+        built_at = self._built_at
+        if built_at is not None and time.monotonic() - built_at < self.max_age:
+            return
+        # Một thread dựng, các thread khác đợi (lần đầu) rồi dùng kết quả
+        with self._build_lock:
+            if self._built_at is built_at:
+                self.rebuild()
+
+    def rebuild(self):
+        from .models import Category, Product
+
+        entries = {}
+        for pk, name in Product.objects.filter(is_available=True).values_list('pk', 'name').iterator():
+            entries[PRODUCT, pk] = (name, name_keys(name))
+        for pk, name in Category.objects.values_list('pk', 'name'):
+            entries[CATEGORY, pk] = (name, name_keys(name))
+        keys = sorted(
+            (key, kind, pk) for (kind, pk), (_, entry_keys) in entries.items() for key in entry_keys
+        )
+        with self._lock:
+            self._keys, self._entries, self._built_at = keys, entries, time.monotonic()
+
+    def _remove(self, kind, pk):
+        entry = self._entries.pop((kind, pk), None)
+        if entry is None:
+            return
+        for key in entry[1]:
+            index = bisect_left(self._keys, (key, kind, pk))
+            if index < len(self._keys) and self._keys[index] == (key, kind, pk):
+                del self._keys[index]
+
+    def update(self, kind, pk, name):
+        """Thêm, sửa (``name``) hoặc xóa (``name=None``) một mục; bỏ qua nếu chưa dựng."""
+        with self._lock:
+            if self._built_at is None:
+                return
+            self._remove(kind, pk)
+            if name:
+                entry_keys = name_keys(name)
+                self._entries[kind, pk] = (name, entry_keys)
+                for key in entry_keys:
+                    insort(self._keys, (key, kind, pk))
+
+    def update_product(self, product):
+        self.update(PRODUCT, product.pk, product.name if product.is_available else None)
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """``[(loại, id, tên)]`` khớp tiền tố ``query``; khớp đầu tên và tên ngắn xếp trước."""
+        prefix = normalize_query(query)
+        if not prefix:
+            return []
+        self.ensure_built()
+        found = {}
+        with self._lock:
+            keys = self._keys
+            index = bisect_left(keys, (prefix,))
+            for key, kind, pk in keys[index:index + SCAN_LIMIT]:
+                if not key.startswith(prefix):
+                    break
+                name = self._entries[kind, pk][0]
+                starts_name = key == self._entries[kind, pk][1][0]
+                rank = (not starts_name, kind != CATEGORY, len(name), fold_accents(name))
+                if (kind, pk) not in found or rank < found[kind, pk][0]:
+                    found[kind, pk] = (rank, name)
+        ranked = sorted(found.items(), key=lambda item: item[1][0])
+        return [(kind, pk, name) for (kind, pk), (_, name) in ranked[:limit]]
+
+
+_index = SuggestIndex()
+
+
+def get_suggest_index():
+    return _index
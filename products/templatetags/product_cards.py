@@ -0,0 +1,37 @@
+from django import template
+from django.utils.html import format_html
+
+from products.cards import get_card_data
+from .product_images import render_picture
+
+register = template.Library()
+
+
+def _card_context(context, product, image_style):
+    """Context của thẻ: ``card_data`` dựng sẵn, ``<picture>`` và ô CSRF (tính một lần mỗi trang)."""
+    card = get_card_data(product)
+    image = None
+    if card['image']:
+        image = render_picture(dict(card['image']), 'card', {
+            'class': 'card-img-top', 'alt': product.name, 'style': image_style,
+        })
+    csrf_input = context.render_context.get('product_card_csrf')
+    if csrf_input is None:
+        token = context.get('csrf_token')
+        csrf_input = format_html(
+            '<input type="hidden" name="csrfmiddlewaretoken" value="{}">', token,
+        ) if token and token != 'NOTPROVIDED' else ''
+        context.render_context['product_card_csrf'] = csrf_input
+    return {'product': product, 'card': card, 'image': image, 'csrf_input': csrf_input}
+
+
+@register.inclusion_tag('products/_product_card.html', takes_context=True)
+def product_card(context, product):
+    """Thẻ sản phẩm của trang danh sách: ``{% product_card product %}``."""
+    return _card_context(context, product, 'height: 200px; object-fit: cover;')
+
+
+@register.inclusion_tag('products/_product_card_small.html', takes_context=True)
+def product_card_small(context, product):
+    """Thẻ nhỏ (sản phẩm nổi bật, liên quan): ``{% product_card_small product %}``."""
+    return _card_context(context, product, 'height: 150px; object-fit: cover;')
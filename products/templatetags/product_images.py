@@ -0,0 +1,43 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from products.images import VARIANTS, picture_sources, variants_enabled
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(image, variant, **attrs):
+    """``<picture>`` dùng ảnh thu nhỏ WebP (kèm JPEG dự phòng) của ``image``.
+
+    Ví dụ: ``{% picture product.image 'card' alt=product.name class='card-img-top' %}``.
+    Các tham số từ khóa còn lại thành thuộc tính của thẻ ``<img>``.
+    """
+    if not image:
+        return ''
+    return render_picture(picture_sources(image, variant), variant, attrs)
+
+
+def render_picture(sources, variant, attrs):
+    """HTML của ``<picture>`` từ ``images.picture_sources`` (có thể đã tính sẵn).
+
+    Chưa có biến thể (hoặc tắt biến thể) thì dùng ``<img>`` với ảnh gốc.
+    """
+    attrs.setdefault('loading', 'lazy')
+    attrs.setdefault('decoding', 'async')
+    if not variants_enabled() or 'webp' not in sources:
+        return format_html('<img src="{}"{}>', sources['url'], _attributes(attrs))
+
+    width, height, crop = VARIANTS[variant]
+    if crop:
+        attrs.setdefault('width', width)
+        attrs.setdefault('height', height)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img src="{}" srcset="{}"{}></picture>',
+        sources['webp'], sources['src'], sources['srcset'], _attributes(attrs),
+    )
+
+
+def _attributes(attrs):
+    return format_html_join('', ' {}="{}"', sorted(attrs.items()))
@@ -1,3 +1,1121 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.templatetags.static import static
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.template import Context, Template
+from django.urls import reverse, set_script_prefix
+from django.utils import timezone
+from PIL import Image
+
+from vegetable_store import metrics, staticfiles
+from vegetable_store.db import sqlite_database
+from vegetable_store.querystats import counts_toward_budget, fingerprint, registry
+from vegetable_store.templateprofile import profile_templates
+from vegetable_store.routers import PIN_COOKIE_NAME, CatalogReplicaRouter, PrimaryPinMiddleware, use_primary
+from vegetable_store.testing import QueryBudgetMixin, QueryPlanMixin
+
+from cart.models import Cart, CartItem
+from .cache import mark_deleted, stats as cache_stats
+from .cards import CARD_DATA_VERSION, get_card_data
+from .images import all_variant_names, variant_name
+from .models import Category, Product, ProductPair, ProductRecommendation
+from .recommendations import RecommendationBuilder
+from .search import SimpleSearchBackend, SQLiteFTSBackend, fold_accents, get_search_backend, search_ids
+from .suggest import get_suggest_index
+
+
+def make_product(category, name, **kwargs):
+    kwargs.setdefault('description', 'Rau củ tươi ngon')
+    kwargs.setdefault('price', 10000)
+    kwargs.setdefault('stock', 10)
+    kwargs.setdefault('image', 'products/test.jpg')
+    return Product.objects.create(category=category, name=name, **kwargs)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.roots = Category.objects.create(name='Củ quả')
+        self.leaves = Category.objects.create(name='Rau ăn lá')
+        self.carrot = make_product(self.roots, 'Cà rốt Đà Lạt')
+        self.spinach = make_product(self.leaves, 'Rau chân vịt', description='Giàu sắt, hợp với cà rốt')
+        self.cabbage = make_product(self.leaves, 'Bắp cải')
+
+    def search(self, query):
+        return get_search_backend().search(query)
+
+    def test_fold_accents(self):
+        self.assertEqual(fold_accents('Cà rốt Đà Lạt'), 'ca rot da lat')
+
+    def test_accent_insensitive_prefix_match(self):
+        self.assertEqual(self.search('ca rot')[0], self.carrot.pk)
+        self.assertIn(self.carrot.pk, self.search('cà rố'))
+
+    def test_name_ranks_above_description(self):
+        self.assertEqual(self.search('ca rot'), [self.carrot.pk, self.spinach.pk])
+
+    def test_category_name_is_indexed(self):
+        self.assertCountEqual(self.search('rau an la'), [self.spinach.pk, self.cabbage.pk])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.cabbage.name = 'Cải thảo'
+        self.cabbage.save()
+        self.assertEqual(self.search('cai thao'), [self.cabbage.pk])
+        self.assertEqual(self.search('bap cai'), [])
+
+        self.leaves.name = 'Rau thơm'
+        self.leaves.save()
+        self.assertCountEqual(self.search('rau thom'), [self.spinach.pk, self.cabbage.pk])
+
+        self.carrot.delete()
+        self.assertEqual(self.search('da lat'), [])
+
+    def test_rebuild_command(self):
+        get_search_backend().clear()
+        self.assertEqual(self.search('ca rot'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.search('ca rot')[0], self.carrot.pk)
+
+    def test_queryset_filter_is_applied_before_limit(self):
+        leaves = Product.objects.filter(category=self.leaves)
+        # Cà rốt xếp đầu toàn catalog nhưng không thuộc danh mục đang lọc
+        for backend, query in ((SQLiteFTSBackend(), 'ca rot'), (SimpleSearchBackend(), 'cà rốt')):
+            self.assertEqual(backend.search(query, limit=1, queryset=leaves), [self.spinach.pk])
+        self.assertEqual(search_ids('ca rot', limit=1, queryset=leaves), [self.spinach.pk])
+
+    def test_product_list_uses_ranked_results(self):
+        self.spinach.is_available = False
+        self.spinach.save()
+        response = self.client.get(reverse('products:product_list'), {'search': 'ca rot'})
+        self.assertEqual(list(response.context['page_obj']), [self.carrot])
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Rau')
+        self.products = [make_product(self.category, f'Rau {i}') for i in range(30)]
+        # Cho vài sản phẩm trùng created_at để kiểm tra khóa phụ id
+        Product.objects.filter(pk__in=[p.pk for p in self.products[10:15]]).update(
+            created_at=self.products[10].created_at
+        )
+        self.expected = list(Product.objects.order_by('-created_at', '-id'))
+
+    def walk(self, url):
+        seen = []
+        cursor = None
+        while True:
+            response = self.client.get(url, {'cursor': cursor} if cursor else {})
+            page_obj = response.context['page_obj']
+            seen.extend(page_obj)
+            if not page_obj.has_next():
+                return seen, page_obj
+            cursor = page_obj.next_cursor
+
+    def test_walks_every_product_once_in_order(self):
+        for url in (reverse('products:product_list'),
+                    reverse('products:category_detail', args=[self.category.pk])):
+            seen, _ = self.walk(url)
+            self.assertEqual(seen, self.expected)
+
+    def test_previous_cursor_returns_previous_page(self):
+        url = reverse('products:product_list')
+        first = self.client.get(url).context['page_obj']
+        second = self.client.get(url, {'cursor': first.next_cursor}).context['page_obj']
+        back = self.client.get(url, {'cursor': second.previous_cursor}).context['page_obj']
+        self.assertEqual(list(back), list(first))
+        self.assertFalse(back.has_previous())
+        self.assertEqual(list(second), self.expected[12:24])
+
+    def test_deep_page_does_not_count_or_offset(self):
+        url = reverse('products:product_list')
+        first = self.client.get(url).context['page_obj']
+        with self.assertNumQueries(2) as queries:
+            self.client.get(url, {'cursor': first.next_cursor})
+        sql = ' '.join(q['sql'] for q in queries.captured_queries)
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('products:product_list'), {'cursor': 'rác'})
+        self.assertEqual(list(response.context['page_obj']), self.expected[:12])
+
+    def test_links_keep_filters(self):
+        response = self.client.get(reverse('products:product_list'), {'category': self.category.pk})
+        self.assertContains(response, f'?category={self.category.pk}&cursor=')
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Rau')
+        self.products = [make_product(self.category, f'Rau {i}', is_featured=True) for i in range(20)]
+
+    def test_catalog_views_stay_within_budget(self):
+        self.assertQueryBudget(reverse('products:home'))
+        self.assertQueryBudget(reverse('products:product_list'))
+        self.assertQueryBudget(reverse('products:product_list'), data={'search': 'rau'})
+        self.assertQueryBudget(reverse('products:product_detail', args=[self.products[0].pk]))
+        self.assertQueryBudget(reverse('products:category_detail', args=[self.category.pk]))
+
+    def test_logged_in_catalog_views_stay_within_budget(self):
+        # Đọc phiên và user không tính vào ngân sách, không ghi cảnh báo
+        caches['catalog'].clear()
+        self.client.force_login(User.objects.create_user('khach', password='matkhau123'))
+        with self.assertNoLogs('vegetable_store.querystats', 'WARNING'):
+            self.test_catalog_views_stay_within_budget()
+
+    def test_budget_failure_lists_queries(self):
+        with self.assertRaisesMessage(AssertionError, 'vượt giới hạn 1'):
+            self.assertQueryBudget(reverse('products:home'), budget=1)
+
+    @override_settings(DEBUG=True)
+    def test_debug_header_and_registry(self):
+        registry.reset()
+        response = self.client.get(reverse('products:product_list'))
+        self.assertRegex(response['X-DB-Queries'], r'^3; time=[\d.]+ms; duplicates=0$')
+        stats = registry.snapshot()['products:product_list']
+        self.assertEqual((stats['requests'], stats['queries']), (1, 3))
+
+    def test_fingerprint_ignores_literals(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (%s, %s) AND name = 'a' LIMIT 21"),
+            fingerprint("SELECT * FROM t WHERE id IN (%s) AND name = 'b' LIMIT 21"),
+        )
+
+    def test_only_session_store_and_request_user_queries_are_unbudgeted(self):
+        unbudgeted = [
+            'SAVEPOINT "s1"',
+            'SELECT "django_session"."session_key", "django_session"."session_data" FROM "django_session" '
+            'WHERE ("django_session"."expire_date" > %s AND "django_session"."session_key" = %s) LIMIT 21',
+            'INSERT INTO "django_session" ("session_key", "session_data", "expire_date") VALUES (%s, %s, %s)',
+            'UPDATE "django_session" SET "session_data" = %s WHERE "django_session"."session_key" = %s',
+            'SELECT "auth_user"."id", "auth_user"."username" FROM "auth_user" WHERE "auth_user"."id" = 3 LIMIT 21',
+        ]
+        budgeted = [
+            'SELECT "auth_user"."id" FROM "auth_user" WHERE "auth_user"."username" = %s LIMIT 21',
+            'SELECT "checkout_order"."id", "auth_user"."username" FROM "checkout_order" '
+            'LEFT OUTER JOIN "auth_user" ON ("checkout_order"."user_id" = "auth_user"."id")',
+            'SELECT "cart_cart"."id" FROM "cart_cart" WHERE NOT EXISTS(SELECT 1 FROM "django_session" U0 '
+            'WHERE U0."session_key" = ("cart_cart"."session_key"))',
+        ]
+        for sql in unbudgeted:
+            self.assertFalse(counts_toward_budget(sql), sql)
+        for sql in budgeted:
+            self.assertTrue(counts_toward_budget(sql), sql)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        metrics.registry.reset()
+        self.category = Category.objects.create(name='Rau')
+        self.carrot = make_product(self.category, 'Cà rốt')
+
+    def test_requests_are_exported_per_view(self):
+        self.client.get(reverse('products:home'))
+        self.client.get(reverse('products:home'))
+        self.client.get(reverse('products:product_detail', args=[999]))
+        body = self.client.get('/metrics').content.decode()
+
+        self.assertIn('django_http_request_duration_seconds_count{view="products:home"} 2', body)
+        self.assertIn('django_http_request_duration_seconds_bucket{view="products:home",le="+Inf"} 2', body)
+        self.assertIn('django_http_responses_total{view="products:home",status="200"} 2', body)
+        self.assertIn('django_http_responses_total{view="products:product_detail",status="404"} 1', body)
+        self.assertIn('django_catalog_cache_requests_total{view="products:home",result="hit"} 1', body)
+        self.assertIn('django_catalog_cache_requests_total{view="products:home",result="miss"} 1', body)
+        self.assertRegex(body, r'django_db_queries_total\{view="products:home"\} [1-9]')
+        # Bucket cộng dồn, không giảm
+        buckets = [int(n) for n in re.findall(r'_bucket\{view="products:home",le="[^"]+"\} (\d+)', body)]
+        self.assertEqual(buckets, sorted(buckets))
+
+    def test_metrics_endpoint_is_restricted(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.0.0.7').status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=None):
+            response = self.client.get('/metrics', REMOTE_ADDR='10.0.0.7')
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+
+    def test_thread_buffers_add_up(self):
+        registry = metrics.MetricsRegistry(buckets=(0.1, 1))
+        registry.MAX_BUFFERS = 2
+
+        def observe(i):
+            for _ in range(100):
+                registry.observe('cart:cart_view', 200, 0.6 * (i % 3), queries=2)
+
+        for _ in range(3):
+            with ThreadPoolExecutor(max_workers=4) as pool:
+                list(pool.map(observe, range(8)))
+        counters, histograms = registry.snapshot()
+        self.assertLessEqual(len(registry._buffers), 5)
+        self.assertEqual(dict(counters)['django_db_queries_total', ('cart:cart_view',)], 4800)
+        self.assertEqual(dict(histograms)['cart:cart_view'][:3], [900, 900, 600])
+
+    def test_workers_are_aggregated_through_metrics_dir(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        other = metrics.MetricsRegistry()
+        other.process_id = 'other-worker'
+        other.observe('cart:cart_view', 200, 0.02, queries=3)
+        other.flush(directory)
+        metrics.registry.observe('cart:cart_view', 500, 0.3, queries=1)
+
+        with override_settings(METRICS_DIR=directory):
+            metrics.registry.flush()
+            body = self.client.get('/metrics').content.decode()
+        self.assertEqual(len(os.listdir(directory)), 2)
+        self.assertIn('django_http_request_duration_seconds_count{view="cart:cart_view"} 2', body)
+        self.assertIn('django_http_responses_total{view="cart:cart_view",status="500"} 1', body)
+        self.assertIn('django_db_queries_total{view="cart:cart_view"} 4', body)
+
+
+class StaticPipelineTests(TestCase):
+    @staticmethod
+    def django_application(environ, start_response):
+        start_response('404 Not Found', [])
+        return [b'django']
+
+    def test_minifiers_keep_strings_and_regexes(self):
+        self.assertEqual(
+            staticfiles.minify_css('/* c */\na :hover , b > i {\n  content : " ; " ;\n  width: calc(1px + 2px);\n}\n'),
+            'a :hover,b>i{content :" ; ";width:calc(1px + 2px)}',
+        )
+        source = (
+            '// đầu file\n'
+            'const re = /a\\/ b[/]/g;  // cuối dòng\n'
+            'if (x) {\n'
+            '    y = `${a} // vẫn là chuỗi`  /  2 + +z;\n'
+            '}\n'
+            '/* khối */\n'
+            'return /x y/.test(s)\n'
+        )
+        self.assertEqual(
+            staticfiles.minify_js(source),
+            'const re=/a\\/ b[/]/g;if(x){y=`${a} // vẫn là chuỗi` / 2 + +z;}\nreturn /x y/.test(s)',
+        )
+
+    def test_js_minifier_tells_division_from_regex(self):
+        cases = {
+            # ++/-- hậu tố: phép chia, comment phía sau vẫn bị bỏ
+            "x = a++ / 2 / b; // it's\n": 'x=a++ / 2 / b;',
+            'y = arr[i]-- / 4 /* c */ / n;\n': 'y=arr[i]-- / 4 / n;',
+            'z = (a + b) / 2; // c\n': 'z=(a + b)/ 2;',
+            # Sau toán tử hay từ khóa: regex, giữ nguyên cả khoảng trắng bên trong
+            'w = x + /a  b/.source;\n': 'w=x + /a  b/.source;',
+            'v = typeof /a  b/;\n': 'v=typeof /a  b/;',
+            'u = [/a  b/, ++k / 2];\n': 'u=[/a  b/,++k / 2];',
+        }
+        for source, expected in cases.items():
+            self.assertEqual(staticfiles.minify_js(source), expected, source)
+
+    def test_collectstatic_and_wsgi_server(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        with override_settings(STATIC_ROOT=root):
+            call_command('collectstatic', interactive=False, verbosity=0)
+            url = static('css/style.css')
+            self.assertRegex(url, r'^/static/css/style\.[0-9a-f]{12}\.css$')
+            self.assertContains(self.client.get(reverse('products:home')), url)
+            application = staticfiles.StaticFilesApplication(self.django_application)
+
+        with open(os.path.join(root, url[len('/static/'):]), encoding='utf-8') as file:
+            minified = file.read()
+        # Hash trong tên là hash của đúng byte được phục vụ (đã rút gọn)
+        self.assertIn(hashlib.md5(minified.encode('utf-8')).hexdigest()[:12], url)
+        with open(os.path.join(settings.BASE_DIR, 'static', 'css', 'style.css'), encoding='utf-8') as file:
+            self.assertLess(len(minified), len(file.read()))
+
+        def call(path, **headers):
+            captured = {}
+
+            def start_response(status, response_headers):
+                captured['status'], captured['headers'] = status, dict(response_headers)
+
+            body = b''.join(application(RequestFactory().get(path, **headers).environ, start_response))
+            return captured['status'], captured['headers'], body
+
+        status, headers, body = call(url, HTTP_ACCEPT_ENCODING='br;q=0, gzip')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Cache-Control'], staticfiles.IMMUTABLE_CACHE_CONTROL)
+        self.assertEqual((headers['Content-Encoding'], headers['Vary']), ('gzip', 'Accept-Encoding'))
+        self.assertEqual(gzip.decompress(body).decode('utf-8'), minified)
+
+        status, headers, body = call(url)
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(body.decode('utf-8'), minified)
+        self.assertEqual(call(url, HTTP_IF_NONE_MATCH=headers['ETag'])[:3:2], ('304 Not Modified', b''))
+
+        self.assertEqual(call('/static/css/style.css')[1]['Cache-Control'], 'public, max-age=60')
+        self.assertEqual(call('/static/css/khong-co.css')[2], b'django')
+
+
+class ProductCardTests(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.category = Category.objects.create(name='Rau')
+        self.carrot = make_product(
+            self.category, 'Cà rốt', price=25000, stock=7,
+            description='Cà rốt Đà Lạt tươi giòn ngọt, thu hoạch buổi sáng, giao trong ngày tới tận nhà',
+        )
+
+    def test_card_data_is_built_on_save(self):
+        self.carrot.refresh_from_db()
+        card = self.carrot.card_data
+        self.assertEqual(card['version'], CARD_DATA_VERSION)
+        # URL lưu không kèm script prefix
+        self.assertEqual(card['url'], 'product/%s/' % self.carrot.pk)
+        self.assertEqual(get_card_data(self.carrot)['url'], reverse('products:product_detail', args=[self.carrot.pk]))
+        self.assertEqual(get_card_data(self.carrot)['add_url'], reverse('cart:add_to_cart', args=[self.carrot.pk]))
+        self.assertEqual(card['price'], self.carrot.get_price_display())
+        self.assertEqual(
+            card['summary'],
+            Template('{{ d|truncatewords:10 }}').render(Context({'d': self.carrot.description})),
+        )
+        # Ảnh chưa có biến thể: thẻ dùng ảnh gốc
+        self.assertEqual(card['image'], {'url': 'media/products/test.jpg'})
+
+        self.carrot.price = 30000
+        self.carrot.unit = 'bó'
+        self.carrot.save()
+        self.carrot.refresh_from_db()
+        self.assertEqual(self.carrot.card_data['price'], '30,000 VNĐ/bó')
+        with self.assertNumQueries(0):
+            self.assertIsNot(self.carrot.card_data, None)
+
+    def test_listing_renders_from_card_data(self):
+        Product.objects.filter(pk=self.carrot.pk).update(stock=3)
+        response = self.client.get(reverse('products:product_list'))
+        self.assertContains(response, 'href="%s"' % reverse('products:product_detail', args=[self.carrot.pk]))
+        self.assertContains(response, 'action="%s"' % reverse('cart:add_to_cart', args=[self.carrot.pk]))
+        self.assertContains(response, '25,000 VNĐ/kg')
+        self.assertContains(response, 'thu hoạch buổi …')
+        self.assertContains(response, 'Còn 3 kg')
+        self.assertContains(response, '<img src="/media/products/test.jpg"')
+        self.assertContains(response, 'name="csrfmiddlewaretoken"', count=1)
+
+        # Dữ liệu cũ (khác phiên bản) được tính lại khi render, không cần ghi
+        Product.objects.filter(pk=self.carrot.pk).update(card_data={'version': 0})
+        caches['catalog'].clear()
+        response = self.client.get(reverse('products:category_detail', args=[self.category.pk]))
+        self.assertContains(response, '25,000 VNĐ/kg')
+        out = StringIO()
+        call_command('rebuild_product_cards', stdout=out)
+        self.assertIn('cập nhật 1', out.getvalue())
+
+    def test_card_urls_follow_script_prefix_of_request(self):
+        # card_data dựng ngoài request (prefix "/") vẫn đúng khi chạy dưới /shop
+        set_script_prefix('/shop/')
+        self.addCleanup(set_script_prefix, '/')
+        response = self.client.get('/products/')
+        self.assertContains(response, 'href="/shop/product/%s/"' % self.carrot.pk)
+        self.assertContains(response, 'action="/shop/cart/add/%s/"' % self.carrot.pk)
+        self.assertContains(response, 'src="/shop/media/products/test.jpg"')
+
+    def test_profiler_attributes_render_time(self):
+        make_product(self.category, 'Bắp cải')
+        with profile_templates() as profiler:
+            self.client.get(reverse('products:product_list'))
+        rows = {(row['template'], row['node']): row for row in profiler.report()}
+        card = rows['products/product_list.html', '{% product_card %}']
+        self.assertEqual(card['calls'], 2)
+        self.assertGreaterEqual(card['total_ms'], card['self_ms'])
+        self.assertEqual(rows['products/_product_card.html', '(template)']['calls'], 2)
+        self.assertIn('products/_product_card.html', profiler.format_report())
+
+        with profile_templates() as profiler:
+            pass
+        self.assertEqual(profiler.report(), [])
+
+
+class QueryPlanTests(QueryPlanMixin, TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.category = Category.objects.create(name='Rau')
+        other = Category.objects.create(name='Củ')
+        self.products = [
+            make_product(self.category if i % 2 else other, f'Rau {i}', is_featured=i % 3 == 0)
+            for i in range(30)
+        ]
+
+    def test_catalog_hot_queries_use_indexes(self):
+        self.assertNoFullScans(reverse('products:home'))
+        self.assertNoFullScans(reverse('products:product_detail', args=[self.products[1].pk]))
+        self.assertNoFullScans(reverse('products:category_detail', args=[self.category.pk]))
+        self.assertNoFullScans(reverse('products:product_list'), data={'category': self.category.pk})
+
+    def test_keyset_pages_seek_through_index(self):
+        response = self.client.get(reverse('products:product_list'))
+        cursor = response.context['page_obj'].next_cursor
+        plans = self.assertNoFullScans(reverse('products:product_list'), data={'cursor': cursor})
+        product_plans = [plan for sql, plan in plans if 'products_product' in plan]
+        self.assertTrue(any('product_available_idx' in plan for plan in product_plans), product_plans)
+
+    def test_detects_full_scans(self):
+        sql = str(Product.objects.filter(stock__gt=5).query)
+        with self.assertRaisesMessage(AssertionError, 'Quét toàn bảng products_product'):
+            self.assertPlansHaveNoFullScans([(sql, self.explain(sql))])
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        cache_stats.reset()
+        self.category = Category.objects.create(name='Rau')
+        self.carrot = make_product(self.category, 'Cà rốt', is_featured=True)
+
+    def test_second_anonymous_request_is_served_from_cache(self):
+        url = reverse('products:home')
+        self.assertEqual(self.client.get(url)['X-Catalog-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response['X-Catalog-Cache'], 'hit')
+        self.assertContains(response, 'Cà rốt')
+        self.assertEqual(cache_stats.snapshot(), {'hits': 1, 'misses': 1})
+
+    def test_product_change_invalidates_dependent_pages(self):
+        urls = [
+            reverse('products:home'),
+            reverse('products:product_list'),
+            reverse('products:product_detail', args=[self.carrot.pk]),
+            reverse('products:category_detail', args=[self.category.pk]),
+        ]
+        for url in urls:
+            self.client.get(url)
+        self.carrot.name = 'Cà rốt baby'
+        self.carrot.save()
+        for url in urls:
+            response = self.client.get(url)
+            self.assertEqual(response['X-Catalog-Cache'], 'miss', url)
+            self.assertContains(response, 'Cà rốt baby')
+
+    def test_moving_product_invalidates_old_category_page(self):
+        other = Category.objects.create(name='Trái cây')
+        old_url = reverse('products:category_detail', args=[self.category.pk])
+        new_url = reverse('products:category_detail', args=[other.pk])
+        for url in (old_url, new_url):
+            self.client.get(url)
+        carrot = Product.objects.get(pk=self.carrot.pk)
+        carrot.category = other
+        carrot.save()
+        self.assertNotContains(self.client.get(old_url), 'Cà rốt')
+        self.assertContains(self.client.get(new_url), 'Cà rốt')
+
+        # Lưu lần nữa trên cùng đối tượng: danh mục trước đó giờ là ``other``
+        self.client.get(old_url)
+        carrot.category = self.category
+        carrot.save()
+        self.assertContains(self.client.get(old_url), 'Cà rốt')
+        self.assertNotContains(self.client.get(new_url), 'Cà rốt')
+
+    def test_bump_from_another_process_invalidates_pages(self):
+        url = reverse('products:home')
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Catalog-Cache'], 'hit')
+        # Như import_catalog chạy ở tiến trình khác, trên cùng CSDL
+        code = (
+            'import django; django.setup()\n'
+            'from django.db import connection\n'
+            'connection.settings_dict["NAME"] = %r\n'
+            'from products.cache import bump; bump("all")\n'
+        ) % connection.settings_dict['NAME']
+        subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, check=True,
+            env=dict(os.environ, DJANGO_SETTINGS_MODULE='vegetable_store.settings'),
+        )
+        self.assertEqual(self.client.get(url)['X-Catalog-Cache'], 'miss')
+
+    def test_other_category_page_stays_cached(self):
+        other = Category.objects.create(name='Trái cây')
+        url = reverse('products:category_detail', args=[other.pk])
+        self.client.get(url)
+        make_product(self.category, 'Bắp cải')
+        self.assertEqual(self.client.get(url)['X-Catalog-Cache'], 'hit')
+
+    def test_authenticated_users_bypass_page_cache(self):
+        user = User.objects.create_user('khach', password='matkhau123')
+        self.client.force_login(user)
+        url = reverse('products:home')
+        self.client.get(url)
+        self.assertNotIn('X-Catalog-Cache', self.client.get(url))
+
+    def test_cached_page_carries_current_visitor_csrf_token(self):
+        url = reverse('products:product_list')
+        Client().get(url)
+        visitor = Client(enforce_csrf_checks=True)
+        response = visitor.get(url)
+        self.assertEqual(response['X-Catalog-Cache'], 'hit')
+        token = re.search(r'name="csrfmiddlewaretoken" value="([^"]+)"', response.content.decode()).group(1)
+        response = visitor.post(
+            reverse('cart:add_to_cart', args=[self.carrot.pk]),
+            {'quantity': 1, 'csrfmiddlewaretoken': token},
+        )
+        self.assertEqual(response.status_code, 302)
+
+    def test_logged_in_listing_shows_updated_card(self):
+        # Không qua cache trang: tên đọc từ sản phẩm, giá từ card_data dựng lại khi lưu
+        user = User.objects.create_user('khach', password='matkhau123')
+        self.client.force_login(user)
+        url = reverse('products:product_list')
+        self.assertContains(self.client.get(url), 'Cà rốt')
+        self.carrot.name = 'Cà rốt tím'
+        self.carrot.price = 32000
+        self.carrot.save()
+        response = self.client.get(url)
+        self.assertContains(response, 'Cà rốt tím')
+        self.assertContains(response, '32,000 VNĐ/kg')
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.category = Category.objects.create(name='Rau')
+
+    def upload(self, name='ca-rot.png', size=(1200, 900)):
+        buffer = BytesIO()
+        Image.new('RGBA', size, (200, 90, 20, 255)).save(buffer, 'PNG')
+        return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+    def test_variants_are_generated_on_upload(self):
+        product = make_product(self.category, 'Cà rốt', image=self.upload())
+        for name in all_variant_names(product.image.name):
+            self.assertTrue(default_storage.exists(name), name)
+        with default_storage.open(variant_name(product.image.name, 'card', 2, 'webp')) as f:
+            self.assertEqual(Image.open(f).size, (640, 400))
+        with default_storage.open(variant_name(product.image.name, 'detail')) as f:
+            self.assertEqual(Image.open(f).size, (533, 400))
+
+    def test_missing_source_does_not_break_saving(self):
+        product = make_product(self.category, 'Cà rốt', image='products/khong-co.jpg')
+        self.assertTrue(Product.objects.filter(pk=product.pk).exists())
+
+    def test_command_skips_fresh_variants(self):
+        product = make_product(self.category, 'Cà rốt', image=self.upload())
+        out = StringIO()
+        call_command('generate_image_variants', '--workers', '1', stdout=out)
+        self.assertIn('tạo 0 biến thể, bỏ qua 12 còn mới', out.getvalue())
+
+        stale = variant_name(product.image.name, 'cart', 1, 'jpg')
+        os.utime(default_storage.path(stale), (0, 0))
+        out = StringIO()
+        call_command('generate_image_variants', '--workers', '2', stdout=out)
+        self.assertIn('tạo 1 biến thể, bỏ qua 11 còn mới', out.getvalue())
+
+    def test_variants_are_removed_with_the_product(self):
+        product = make_product(self.category, 'Cà rốt', image=self.upload())
+        name = product.image.name
+        product.delete()
+        self.assertFalse(default_storage.exists(variant_name(name, 'card', 1, 'webp')))
+
+    def test_picture_tag(self):
+        product = make_product(self.category, 'Cà rốt', image=self.upload())
+        html = Template(
+            "{% load product_images %}{% picture product.image 'card' alt=product.name class='card-img-top' %}"
+        ).render(Context({'product': product}))
+        self.assertIn('<source type="image/webp" srcset="/media/variants/products/', html)
+        self.assertIn('-card-2x.webp 2x', html)
+        self.assertIn('alt="Cà rốt"', html)
+        self.assertIn('loading="lazy"', html)
+        self.assertIn('width="320"', html)
+
+    def test_picture_falls_back_to_original_until_variants_exist(self):
+        with override_settings(IMAGE_VARIANTS_ENABLED=False):
+            product = make_product(self.category, 'Cà rốt', image=self.upload())
+        html = Template("{% load product_images %}{% picture image 'detail' %}").render(
+            Context({'image': product.image})
+        )
+        self.assertEqual(html, '<img src="%s" decoding="async" loading="lazy">' % product.image.url)
+        product.refresh_from_db()
+        self.assertNotIn('webp', product.card_data['image'])
+
+        call_command('generate_image_variants', '--workers', '1', stdout=StringIO())
+        product.refresh_from_db()
+        self.assertIn('-card-2x.webp 2x', product.card_data['image']['webp'])
+        html = Template("{% load product_images %}{% picture image 'detail' %}").render(
+            Context({'image': product.image})
+        )
+        self.assertIn('<picture><source type="image/webp"', html)
+
+
+class CatalogImportExportTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Củ quả')
+        self.carrot = make_product(self.category, 'Cà rốt', sku='CR-01', price=15000)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def feed(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+
+    def run_import(self, path, *args):
+        out, err = StringIO(), StringIO()
+        call_command('import_catalog', path, '--batch-size', '2', *args, stdout=out, stderr=err)
+        return out.getvalue(), err.getvalue()
+
+    def test_csv_import_creates_updates_and_reports_errors(self):
+        path = self.feed('feed.csv', (
+            'sku,name,category,price,stock\n'
+            'CR-01,,,18000,40\n'
+            'BC-02,Bắp cải,Rau ăn lá,20000,5\n'
+            'XL-03,Xà lách,củ quả,abc,1\n'
+            'KT-04,,,9000,1\n'
+        ))
+        # 2 lô: danh mục, đọc, ghi, chỉ mục, dữ liệu thẻ, tổng giỏ hàng; lô cuối chỉ đọc
+        with self.assertNumQueries(13):
+            out, err = self.run_import(path)
+        self.assertIn('tạo 1, cập nhật 1, không đổi 0, lỗi 2', out)
+        self.assertIn('Dòng 4: giá không hợp lệ', err)
+
+        self.carrot.refresh_from_db()
+        self.assertEqual((self.carrot.price, self.carrot.stock), (18000, 40))
+        self.assertEqual(self.carrot.card_data['price'], '18,000 VNĐ/kg')
+        self.assertEqual(self.carrot.name, 'Cà rốt')
+        cabbage = Product.objects.get(sku='BC-02')
+        self.assertEqual(cabbage.category.name, 'Rau ăn lá')
+        self.assertEqual(get_search_backend().search('bap cai'), [cabbage.pk])
+
+    def test_import_moving_product_invalidates_old_category_page(self):
+        caches['catalog'].clear()
+        url = reverse('products:category_detail', args=[self.category.pk])
+        self.client.get(url)
+        self.run_import(self.feed('feed.csv', 'sku,category\nCR-01,Rau ăn lá\n'))
+        self.assertNotContains(self.client.get(url), 'Cà rốt')
+
+    def test_unchanged_rows_are_not_written(self):
+        path = self.feed('feed.jsonl', '{"sku": "CR-01", "price": "15000", "stock": 10}\n')
+        updated_at = self.carrot.updated_at
+        out, err = self.run_import(path)
+        self.assertIn('không đổi 1', out)
+        self.carrot.refresh_from_db()
+        self.assertEqual(self.carrot.updated_at, updated_at)
+
+    def test_dry_run_writes_nothing(self):
+        path = self.feed('feed.csv', 'sku,name,category,price\nMOI-1,Su hào,Rau mới,7000\n')
+        out, err = self.run_import(path, '--dry-run')
+        self.assertIn('[dry-run] 1 dòng', out)
+        self.assertFalse(Product.objects.filter(sku='MOI-1').exists())
+        self.assertFalse(Category.objects.filter(name='Rau mới').exists())
+
+    def test_price_import_refreshes_cart_totals(self):
+        cart = Cart.objects.create()
+        CartItem.objects.create(cart=cart, product=self.carrot, quantity=2)
+        self.run_import(self.feed('feed.csv', 'sku,price\nCR-01,20000\n'))
+        cart.refresh_from_db()
+        self.assertEqual(cart.total_price, 40000)
+
+    def test_export_round_trips_through_import(self):
+        path = os.path.join(self.directory, 'catalog.csv')
+        call_command('export_catalog', path, stderr=StringIO())
+        with open(path, encoding='utf-8') as f:
+            exported = f.read()
+        self.assertIn('CR-01,Cà rốt,Củ quả', exported)
+        out, err = self.run_import(path)
+        self.assertIn('không đổi 1', out)
+
+
+@override_settings(ROOT_URLCONF='vegetable_store.urls_async')
+class AsyncCatalogViewTests(TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.category = Category.objects.create(name='Rau')
+        self.carrot = make_product(self.category, 'Cà rốt', is_featured=True)
+        self.hidden = make_product(self.category, 'Bắp cải', is_available=False)
+
+    async def test_catalog_pages_are_served_by_async_views(self):
+        urls = [
+            reverse('products:home'),
+            reverse('products:product_list') + '?search=ca rot',
+            reverse('products:product_detail', args=[self.carrot.pk]),
+            reverse('products:category_detail', args=[self.category.pk]),
+        ]
+        for url in urls:
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertTrue(iscoroutinefunction(response.resolver_match.func), url)
+            self.assertContains(response, 'Cà rốt')
+            # Truy vấn trong thread của sync_to_async vẫn được đếm
+            self.assertGreater(response.asgi_request.query_stats.count, 0)
+
+    async def test_unavailable_product_is_404(self):
+        response = await self.async_client.get(reverse('products:product_detail', args=[self.hidden.pk]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_page_cache_and_login_bypass(self):
+        url = reverse('products:home')
+        self.assertEqual((await self.async_client.get(url))['X-Catalog-Cache'], 'miss')
+        self.assertEqual((await self.async_client.get(url))['X-Catalog-Cache'], 'hit')
+        user = await User.objects.acreate_user('khach', password='matkhau123')
+        await self.async_client.aforce_login(user)
+        self.assertNotIn('X-Catalog-Cache', await self.async_client.get(url))
+
+
+class CatalogApiTests(QueryBudgetMixin, QueryPlanMixin, TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.category = Category.objects.create(name='Rau')
+        self.products = [make_product(self.category, f'Rau {i}', sku=f'R-{i}') for i in range(5)]
+        self.hidden = make_product(self.category, 'Ngừng bán', is_available=False)
+        self.url = reverse('products:api:product_list')
+
+    def test_list_uses_default_or_requested_fields(self):
+        response = self.assertQueryBudget(self.url)
+        results = response.json()['results']
+        self.assertEqual(len(results), 5)
+        self.assertEqual(set(results[0]), {'id', 'name', 'price', 'unit', 'stock', 'category', 'image', 'updated_at'})
+        results = self.client.get(self.url, {'fields': 'sku,category_name'}).json()['results']
+        self.assertEqual(results[0], {'sku': 'R-0', 'category_name': 'Rau'})
+        self.assertEqual(self.client.get(self.url, {'fields': 'sku,password'}).status_code, 400)
+
+    def test_if_none_match_costs_one_query(self):
+        response = self.client.get(self.url)
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertIn('Last-Modified', response)
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        etag = response['ETag']
+        self.products[0].price = 12000
+        self.products[0].save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_if_modified_since_costs_one_query(self):
+        last_modified = self.client.get(self.url)['Last-Modified']
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_outside_request_cycle_change_validators(self):
+        an_hour_ago = timezone.now() - timedelta(hours=1)
+        Product.objects.update(updated_at=an_hour_ago)
+        mark_deleted(an_hour_ago)
+        response = self.client.get(self.url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        # UPDATE trực tiếp (như một tiến trình khác): không signal, không tăng phiên bản
+        Product.objects.filter(pk=self.products[0].pk).update(price=12000, updated_at=timezone.now())
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][-1]['price'], '12000.00')
+
+        # Xóa không làm tăng MAX(updated_at) nhưng vẫn đổi ETag và Last-Modified
+        Product.objects.filter(pk=self.products[0].pk).update(updated_at=an_hour_ago)
+        response = self.client.get(self.url)
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.products[1].delete()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 200)
+
+    def test_incremental_sync_and_cursor(self):
+        since = self.products[2].updated_at.isoformat()
+        self.hidden.save()
+        data = self.client.get(self.url, {'updated_since': since, 'limit': 1, 'fields': 'id,is_available'}).json()
+        seen = [row['id'] for row in data['results']]
+        while data['next']:
+            data = self.client.get(data['next']).json()
+            seen += [row['id'] for row in data['results']]
+        self.assertEqual(seen, [self.products[3].pk, self.products[4].pk, self.hidden.pk])
+        self.assertEqual(self.client.get(self.url, {'updated_since': 'hôm qua'}).status_code, 400)
+
+    def test_detail_and_category(self):
+        product = self.products[0]
+        data = self.client.get(reverse('products:api:product_detail', args=[product.pk])).json()
+        self.assertEqual((data['id'], data['price']), (product.pk, '10000.00'))
+        self.assertEqual(self.client.get(reverse('products:api:product_detail', args=[self.hidden.pk])).status_code, 404)
+        response = self.assertQueryBudget(reverse('products:api:category_detail', args=[self.category.pk]))
+        self.assertEqual(response.json()['category']['name'], 'Rau')
+        self.assertEqual(len(response.json()['results']), 5)
+        self.assertEqual(self.client.get(reverse('products:api:category_list')).json()['results'][0]['id'], self.category.pk)
+
+    def test_api_queries_use_indexes(self):
+        self.assertNoFullScans(self.url)
+        self.assertNoFullScans(self.url, data={'updated_since': '2020-01-01T00:00:00'})
+        self.assertNoFullScans(reverse('products:api:category_detail', args=[self.category.pk]))
+
+
+class SuggestTests(TestCase):
+    def setUp(self):
+        get_suggest_index().clear()
+        self.roots = Category.objects.create(name='Củ quả')
+        self.carrot = make_product(self.roots, 'Cà rốt Đà Lạt')
+        self.squash = make_product(self.roots, 'Bí đỏ')
+        make_product(self.roots, 'Cải thìa ngừng bán', is_available=False)
+        self.url = reverse('products:suggest')
+
+    def names(self, query):
+        return [name for _, _, name in get_suggest_index().search(query)]
+
+    def test_accent_folded_prefix_from_any_word(self):
+        self.assertEqual(self.names('cà r'), ['Cà rốt Đà Lạt'])
+        self.assertEqual(self.names('da lat'), ['Cà rốt Đà Lạt'])
+        self.assertEqual(self.names('cu'), ['Củ quả'])
+        self.assertEqual(self.names('ca '), ['Cà rốt Đà Lạt'])
+        self.assertEqual(self.names('cai'), [])
+
+    def test_endpoint_builds_index_once(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'q': 'bi'})
+        self.assertEqual(response.json()['results'], [{
+            'type': 'product', 'id': self.squash.pk, 'name': 'Bí đỏ',
+            'url': reverse('products:product_detail', args=[self.squash.pk]),
+        }])
+        with self.assertNumQueries(0):
+            self.assertEqual(len(self.client.get(self.url, {'q': 'c'}).json()['results']), 2)
+
+    def test_signals_update_built_index(self):
+        get_suggest_index().rebuild()
+        make_product(self.roots, 'Cà chua bi')
+        self.assertEqual(self.names('ca ch'), ['Cà chua bi'])
+        self.carrot.is_available = False
+        self.carrot.save()
+        self.squash.delete()
+        self.roots.name = 'Rau củ'
+        self.roots.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names('b'), ['Cà chua bi'])
+            self.assertEqual(self.names('cu'), ['Rau củ'])
+
+    def test_concurrent_updates_and_lookups(self):
+        index = get_suggest_index()
+        index.rebuild()
+
+        def work(worker):
+            for i in range(200):
+                index.update('product', 10000 + worker * 1000 + i, f'Rau thử {worker} {i}')
+                index.search('rau th')
+                if i % 2:
+                    index.update('product', 10000 + worker * 1000 + i, None)
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(work, range(4)))
+        self.assertEqual(self.names('rau thu 3 198'), ['Rau thử 3 198'])
+        self.assertEqual(self.names('rau thu 3 199'), [])
+        self.assertEqual(len(index._entries), 400 + 3)
+
+
+class FacetTests(QueryBudgetMixin, TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.leaves = Category.objects.create(name='Rau ăn lá')
+        self.roots = Category.objects.create(name='Củ quả')
+        self.spinach = make_product(self.leaves, 'Rau chân vịt', price=15000, unit='bó')
+        self.lettuce = make_product(self.leaves, 'Xà lách', price=25000, unit='bó', stock=0)
+        self.cabbage = make_product(self.leaves, 'Bắp cải', price=30000, is_featured=True)
+        self.carrot = make_product(self.roots, 'Cà rốt', price=35000, is_featured=True)
+        self.potato = make_product(self.roots, 'Khoai tây', price=120000)
+        make_product(self.roots, 'Củ dền', price=10000, is_available=False)
+        self.url = reverse('products:product_list')
+
+    def get(self, **params):
+        return self.client.get(self.url, params)
+
+    def counts(self, response, param):
+        group = next(group for group in response.context['facet_groups'] if group['param'] == param)
+        return {choice['value']: choice['count'] for choice in group['choices']}
+
+    def test_counts_ignore_own_facet_filter(self):
+        response = self.get(price='20k-50k')
+        self.assertEqual(response.context['result_count'], 3)
+        self.assertEqual(
+            self.counts(response, 'price'),
+            {'duoi-20k': 1, '20k-50k': 3, '50k-100k': 0, 'tren-100k': 1},
+        )
+        self.assertEqual(self.counts(response, 'category'), {str(self.leaves.pk): 2, str(self.roots.pk): 1})
+        self.assertEqual(self.counts(response, 'unit'), {'bó': 1, 'kg': 2})
+        self.assertEqual(self.counts(response, 'in_stock'), {'1': 2})
+
+    def test_filters_are_combined(self):
+        response = self.get(category=self.leaves.pk, in_stock='1', featured='1')
+        self.assertEqual(list(response.context['page_obj']), [self.cabbage])
+        self.assertEqual(self.counts(response, 'featured'), {'1': 1})
+        response = self.get(unit='bó', in_stock='1', search='rau')
+        self.assertEqual(list(response.context['page_obj']), [self.spinach])
+        self.assertEqual(response.context['result_count'], 1)
+        # Giá trị không hợp lệ bị bỏ qua
+        self.assertEqual(self.get(category='abc', price='re', in_stock='yes').context['result_count'], 5)
+
+    @override_settings(PRODUCT_SEARCH_LIMIT=1)
+    def test_search_counts_and_filters_are_not_capped_by_search_limit(self):
+        # Mọi sản phẩm đang bán đều khớp "rau" (tên, danh mục hoặc mô tả)
+        response = self.get(search='rau')
+        self.assertEqual(response.context['result_count'], 5)
+        self.assertEqual(self.counts(response, 'unit'), {'bó': 2, 'kg': 3})
+        response = self.get(search='rau', category=self.roots.pk)
+        self.assertEqual(response.context['result_count'], 2)
+        self.assertIn(list(response.context['page_obj']), [[self.carrot], [self.potato]])
+
+    def test_count_table_is_shared_across_filters_until_catalog_changes(self):
+        self.assertQueryBudget(self.url, data={'category': self.roots.pk})
+        with CaptureQueriesContext(connection) as context:
+            response = self.get(price='tren-100k', in_stock='1')
+        self.assertFalse([query for query in context.captured_queries if 'GROUP BY' in query['sql']])
+        self.assertEqual(list(response.context['page_obj']), [self.potato])
+
+        self.potato.price = 90000
+        self.potato.save()
+        self.assertEqual(self.counts(self.get(), 'price')['tren-100k'], 0)
+
+    def test_choice_links_toggle_filters(self):
+        response = self.get(price='duoi-20k', cursor='abc')
+        links = {choice['value']: choice['url'] for choice in response.context['facet_groups'][1]['choices']}
+        self.assertEqual(links['duoi-20k'], self.url)
+        self.assertEqual(links['tren-100k'], self.url + '?price=tren-100k')
+        self.assertContains(response, '1 sản phẩm')
+
+
+class RecommendationTests(QueryBudgetMixin, QueryPlanMixin, TestCase):
+    def setUp(self):
+        caches['catalog'].clear()
+        self.category = Category.objects.create(name='Rau')
+        self.a, self.b, self.c, self.d, self.e = [make_product(self.category, name) for name in 'ABCDE']
+        self.carts = [self.fill(Cart.objects.create(), *products) for products in (
+            [self.a, self.b, self.c], [self.a, self.b], [self.b, self.d],
+        )]
+
+    def fill(self, cart, *products):
+        for product in products:
+            CartItem.objects.create(cart=cart, product=product)
+        return cart
+
+    def build(self, *args):
+        call_command('build_recommendations', *args, stdout=StringIO())
+
+    def recommended(self, product):
+        return list(product.recommendations.values_list('recommended', flat=True))
+
+    def test_products_bought_together_are_ranked(self):
+        self.build()
+        self.assertEqual(self.recommended(self.a), [self.b.pk, self.c.pk])
+        # Cùng điểm và số đếm: sản phẩm có id nhỏ hơn đứng trước
+        self.assertEqual(self.recommended(self.b), [self.a.pk, self.c.pk, self.d.pk])
+        self.assertEqual(self.recommended(self.e), [])
+
+        url = reverse('products:product_detail', args=[self.a.pk])
+        response = self.assertQueryBudget(url, budget=2)
+        self.assertEqual(response.context['related_products'], [self.b, self.c])
+        self.assertNoFullScans(url, tables=self.scan_checked_tables + ('products_productrecommendation',))
+
+        self.c.is_available = False
+        self.c.save()
+        self.assertEqual(self.client.get(url).context['related_products'], [self.b])
+
+    def test_product_without_recommendations_uses_category(self):
+        self.build()
+        response = self.assertQueryBudget(reverse('products:product_detail', args=[self.e.pk]))
+        self.assertEqual(len(response.context['related_products']), 4)
+        self.assertNotIn(self.e, response.context['related_products'])
+
+    def test_incremental_run_counts_only_new_products(self):
+        self.build()
+        self.fill(self.carts[2], self.a)
+        self.fill(Cart.objects.create(), self.c, self.d)
+        builder = RecommendationBuilder()
+        stats = builder.run()
+        self.assertEqual((stats['changed'], stats['pairs']), (2, 9))
+        self.assertEqual(self.recommended(self.d), [self.c.pk, self.a.pk, self.b.pk])
+        self.assertEqual(RecommendationBuilder().run()['changed'], 0)
+
+        incremental = set(ProductPair.objects.values_list('product', 'other', 'count'))
+        ranked = set(ProductRecommendation.objects.values_list('product', 'recommended', 'rank'))
+        self.build('--full')
+        self.assertEqual(set(ProductPair.objects.values_list('product', 'other', 'count')), incremental)
+        self.assertEqual(set(ProductRecommendation.objects.values_list('product', 'recommended', 'rank')), ranked)
+
+    def test_changed_recommendations_invalidate_cached_page(self):
+        url = reverse('products:product_detail', args=[self.a.pk])
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Catalog-Cache'], 'hit')
+        self.build()
+        self.assertEqual(self.client.get(url)['X-Catalog-Cache'], 'miss')
+
+
+# Không bọc trong transaction: trong transaction mọi truy vấn đọc đều về bản chính
+class DatabaseRoutingTests(TransactionTestCase):
+    def setUp(self):
+        self.router = CatalogReplicaRouter()
+
+    def test_sqlite_connection_setup(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 20000)
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+        options = sqlite_database('replica.sqlite3', read_only=True)['OPTIONS']
+        self.assertIn('PRAGMA query_only=ON', options['init_command'])
+        self.assertNotIn('journal_mode', options['init_command'])
+
+    def test_connections_are_not_kept_under_asgi(self):
+        self.assertEqual(settings.DATABASES['default']['CONN_MAX_AGE'], 600)
+        code = (
+            'import vegetable_store.asgi\n'
+            'from django.conf import settings\n'
+            'print(settings.DATABASES["default"]["CONN_MAX_AGE"])\n'
+        )
+        output = subprocess.run(
+            [sys.executable, '-c', code], cwd=settings.BASE_DIR, check=True, capture_output=True, text=True,
+            env={k: v for k, v in os.environ.items() if not k.startswith('DJANGO_')},
+        ).stdout
+        self.assertEqual(output.strip(), '0')
+
+    @override_settings(CATALOG_READ_DATABASE='default')
+    def test_router_is_inactive_without_replica(self):
+        self.assertIsNone(self.router.db_for_read(Product))
+
+    @override_settings(CATALOG_READ_DATABASE='replica')
+    def test_catalog_reads_go_to_replica_until_a_write(self):
+        factory = RequestFactory()
+
+        def view(request):
+            reads = [self.router.db_for_read(Product), self.router.db_for_read(CartItem)]
+            with use_primary():
+                reads.append(self.router.db_for_read(Product))
+            reads.append(self.router.db_for_read(Product))
+            if request.method == 'POST':
+                reads.append(self.router.db_for_write(CartItem))
+                reads.append(self.router.db_for_read(Product))
+            response = HttpResponse()
+            response.reads = reads
+            return response
+
+        middleware = PrimaryPinMiddleware(view)
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+        response = middleware(factory.get('/'))
+        self.assertEqual(response.reads, ['replica', None, 'default', 'replica'])
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+
+        response = middleware(factory.post('/'))
+        self.assertEqual(response.reads[-2:], [None, 'default'])
+        self.assertEqual(response.cookies[PIN_COOKIE_NAME]['max-age'], settings.PRIMARY_PIN_SECONDS)
+
+        request = factory.get('/')
+        request.COOKIES[PIN_COOKIE_NAME] = '1'
+        self.assertEqual(middleware(request).reads[0], 'default')
+        self.assertEqual(self.router.db_for_write(Product), 'default')
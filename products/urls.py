@@ -1,11 +1,20 @@
-from django.urls import path
-from . import views
+from django.conf import settings
+from django.urls import include, path
+from . import async_views, views
 
 app_name = 'products'
 
-urlpatterns = [
-    path('', views.home, name='home'),
-    path('products/', views.product_list, name='product_list'),
-    path('product/<int:product_id>/', views.product_detail, name='product_detail'),
-    path('category/<int:category_id>/', views.category_detail, name='category_detail'),
-]
+
+def build_urlpatterns(module):
+    return [
+        path('', module.home, name='home'),
+        path('products/', module.product_list, name='product_list'),
+        path('products/suggest/', module.suggest, name='suggest'),
+        path('product/<int:product_id>/', module.product_detail, name='product_detail'),
+        path('category/<int:category_id>/', module.category_detail, name='category_detail'),
+        path('api/', include('products.api.urls')),
+    ]
+
+
+# Dưới ASGI (settings.ASYNC_VIEWS) dùng view async, WSGI giữ view đồng bộ
+urlpatterns = build_urlpatterns(async_views if settings.ASYNC_VIEWS else views)
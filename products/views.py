@@ -1,7 +1,18 @@
 from django.shortcuts import render, get_object_or_404
 from django.core.paginator import Paginator
+from django.http import JsonResponse
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import require_safe
+from . import recommendations
+from .cache import cache_catalog_page
+from .facets import FacetSet, default_facets
 from .models import Product, Category
+from .pagination import paginate_products, pagination_query
+from .search import filter_products, search_ids
+from .suggest import PRODUCT, get_suggest_index
 
+@cache_catalog_page('all')
 def home(request):
     """Trang chủ hiển thị sản phẩm nổi bật"""
     featured_products = Product.objects.filter(is_featured=True, is_available=True)[:6]
@@ -13,41 +24,50 @@ def home(request):
     }
     return render(request, 'products/home.html', context)
 
-def product_list(request):
-    """Danh sách tất cả sản phẩm"""
+def product_list_context(request):
+    """Context của trang danh sách sản phẩm (dùng chung cho view đồng bộ và async)"""
     products = Product.objects.filter(is_available=True)
-    categories = Category.objects.all()
-    
-    # Lọc theo danh mục
-    category_id = request.GET.get('category')
-    if category_id:
-        products = products.filter(category_id=category_id)
+    categories = list(Category.objects.all())
+    facets = FacetSet(request, default_facets(categories))
     
     # Tìm kiếm
     search = request.GET.get('search')
-    if search:
-        products = products.filter(name__icontains=search)
-    
-    # Phân trang
-    paginator = Paginator(products, 12)  # 12 sản phẩm mỗi trang
     page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    if search:
+        # Bảng đếm facet gom bằng GROUP BY trên mọi sản phẩm khớp (không giới hạn số
+        # kết quả); danh sách kết quả được lọc theo bộ lọc đang chọn ngay trong câu FTS
+        result_count, facet_groups = facets.groups(facets.table(filter_products(products, search), cache=False))
+        ranked_ids = search_ids(search, queryset=facets.filter(products))
+        # Phân trang trên danh sách id, chỉ nạp sản phẩm của trang hiện tại
+        page_obj = Paginator(ranked_ids, 12).get_page(page_number)
+        page_products = products.in_bulk(page_obj.object_list)
+        page_obj.object_list = [page_products[pk] for pk in page_obj.object_list if pk in page_products]
+    else:
+        # Lọc theo danh mục, khoảng giá, tồn kho, nổi bật, đơn vị; số đếm facet lấy từ cache
+        result_count, facet_groups = facets.groups(facets.table(products))
+        # Phân trang theo con trỏ, 12 sản phẩm mỗi trang
+        page_obj = paginate_products(request, facets.filter(products), 12)
     
-    context = {
+    return {
         'page_obj': page_obj,
         'categories': categories,
-        'current_category': category_id,
+        'current_category': facets.selected.get('category'),
+        'facet_groups': facet_groups,
+        'result_count': result_count,
         'search_query': search,
+        'pagination_query': pagination_query(request),
     }
-    return render(request, 'products/product_list.html', context)
 
+@cache_catalog_page('all')
+def product_list(request):
+    """Danh sách tất cả sản phẩm"""
+    return render(request, 'products/product_list.html', product_list_context(request))
+
+@cache_catalog_page('all', 'product:{product_id}')
 def product_detail(request, product_id):
     """Chi tiết sản phẩm"""
-    product = get_object_or_404(Product, id=product_id, is_available=True)
-    related_products = Product.objects.filter(
-        category=product.category, 
-        is_available=True
-    ).exclude(id=product_id)[:4]
+    product = get_object_or_404(Product.objects.select_related('category'), id=product_id, is_available=True)
+    related_products = recommendations.related_products(product)
     
     context = {
         'product': product,
@@ -55,18 +75,30 @@ def product_detail(request, product_id):
     }
     return render(request, 'products/product_detail.html', context)
 
+@cache_catalog_page('category:{category_id}')
 def category_detail(request, category_id):
     """Sản phẩm theo danh mục"""
     category = get_object_or_404(Category, id=category_id)
     products = Product.objects.filter(category=category, is_available=True)
     
     # Phân trang
-    paginator = Paginator(products, 12)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = paginate_products(request, products, 12)
     
     context = {
         'category': category,
         'page_obj': page_obj,
+        'pagination_query': pagination_query(request),
     }
     return render(request, 'products/category_detail.html', context)
+
+@require_safe
+def suggest(request):
+    """Gợi ý sản phẩm/danh mục khi gõ ô tìm kiếm (JSON, không truy vấn CSDL)"""
+    query = request.GET.get('q', '')[:100]
+    results = []
+    for kind, pk, name in get_suggest_index().search(query):
+        view = 'products:product_detail' if kind == PRODUCT else 'products:category_detail'
+        results.append({'type': kind, 'id': pk, 'name': name, 'url': reverse(view, args=[pk])})
+    response = JsonResponse({'query': query, 'results': results})
+    patch_cache_control(response, public=True, max_age=60)
+    return response
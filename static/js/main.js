@@ -46,49 +46,106 @@ function handleAddToCartForms() {
         form.addEventListener('submit', function(e) {
             e.preventDefault();
             
-            const formData = new FormData(form);
-            const submitButton = form.querySelector('button[type="submit"]');
-            const originalText = submitButton.innerHTML;
+            const quantityInput = form.querySelector('input[name="quantity"]');
+            const quantity = parseInt(quantityInput ? quantityInput.value : 1) || 1;
             
-            // Show loading state
-            submitButton.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Đang thêm...';
-            submitButton.disabled = true;
-            
-            fetch(form.action, {
-                method: 'POST',
-                body: formData,
-                headers: {
-                    'X-Requested-With': 'XMLHttpRequest'
-                }
+            // Gộp các lần bấm liên tiếp thành một request tới /cart/batch/
+            queueCartOperation({
+                op: 'add',
+                product_id: parseInt(form.dataset.productId),
+                quantity: quantity
             })
-            .then(response => response.json())
             .then(data => {
-                if (data.success) {
-                    // Show success message
-                    showToast('success', data.message);
-                    
-                    // Update cart count
-                    updateCartCountFromResponse(data.cart_total_items);
-                    
-                    // Reset button
-                    submitButton.innerHTML = originalText;
-                    submitButton.disabled = false;
+                const failed = data.errors.some(error => error.product_id === parseInt(form.dataset.productId));
+                if (failed) {
+                    showToast('error', 'Sản phẩm đã hết hàng.');
                 } else {
-                    showToast('error', 'Có lỗi xảy ra. Vui lòng thử lại.');
-                    submitButton.innerHTML = originalText;
-                    submitButton.disabled = false;
+                    showToast('success', 'Đã thêm vào giỏ hàng');
                 }
             })
             .catch(error => {
                 console.error('Error:', error);
                 showToast('error', 'Có lỗi xảy ra. Vui lòng thử lại.');
-                submitButton.innerHTML = originalText;
-                submitButton.disabled = false;
             });
         });
     });
 }
 
+// Batched cart operations
+const CART_BATCH_URL = '/cart/batch/';
+const CART_BATCH_DELAY = 300;
+const cartBatch = {
+    operations: new Map(),
+    waiters: [],
+    timer: null
+};
+
+// Queue an add/set/remove operation; rapid operations are coalesced into one request
+function queueCartOperation(operation) {
+    const target = operation.op === 'add' ? operation.product_id : operation.item_id;
+    const key = operation.op + ':' + target;
+    const pending = cartBatch.operations.get(key);
+    
+    if (pending && operation.op === 'add') {
+        pending.quantity += operation.quantity;
+    } else {
+        if (operation.op === 'remove') {
+            cartBatch.operations.delete('set:' + target);
+        }
+        cartBatch.operations.set(key, Object.assign({}, operation));
+    }
+    
+    clearTimeout(cartBatch.timer);
+    cartBatch.timer = setTimeout(flushCartOperations, CART_BATCH_DELAY);
+    
+    return new Promise((resolve, reject) => {
+        cartBatch.waiters.push({ resolve, reject });
+    });
+}
+
+// Send all queued operations in a single request
+function flushCartOperations() {
+    const operations = Array.from(cartBatch.operations.values());
+    const waiters = cartBatch.waiters;
+    cartBatch.operations = new Map();
+    cartBatch.waiters = [];
+    cartBatch.timer = null;
+    
+    if (operations.length === 0) {
+        return;
+    }
+    
+    fetch(CART_BATCH_URL, {
+        method: 'POST',
+        body: JSON.stringify({ operations: operations }),
+        headers: {
+            'Content-Type': 'application/json',
+            'X-CSRFToken': getCsrfToken(),
+            'X-Requested-With': 'XMLHttpRequest'
+        }
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.cart_total_items !== undefined) {
+            updateCartCountFromResponse(data.cart_total_items);
+        }
+        waiters.forEach(waiter => waiter.resolve(data));
+    })
+    .catch(error => {
+        waiters.forEach(waiter => waiter.reject(error));
+    });
+}
+
+// Get CSRF token from the page or the csrftoken cookie
+function getCsrfToken() {
+    const input = document.querySelector('input[name="csrfmiddlewaretoken"]');
+    if (input) {
+        return input.value;
+    }
+    const match = document.cookie.match(/(?:^|;\s*)csrftoken=([^;]+)/);
+    return match ? decodeURIComponent(match[1]) : '';
+}
+
 // Update cart count from AJAX response
 function updateCartCountFromResponse(count) {
     const cartCountElement = document.getElementById('cart-count');
@@ -175,21 +232,75 @@ function initMobileMenu() {
     }
 }
 
-// Search functionality
+// Search suggestions
+const SUGGEST_DELAY = 150;
+
+// Search-as-you-type: debounce keystrokes and show suggestions from /products/suggest/
 function initSearch() {
-    const searchForm = document.querySelector('form[action*="product_list"]');
-    const searchInput = searchForm?.querySelector('input[name="search"]');
+    const searchInput = document.querySelector('input[data-suggest-url]');
+    const menu = searchInput?.form.querySelector('.search-suggestions');
     
-    if (searchInput) {
-        // Add search suggestions (placeholder for future implementation)
-        searchInput.addEventListener('input', function() {
-            const query = this.value.trim();
-            if (query.length > 2) {
-                // Here you could implement search suggestions
-                console.log('Searching for:', query);
-            }
-        });
+    if (!searchInput || !menu) {
+        return;
     }
+    
+    let timer = null;
+    let controller = null;
+    
+    const hide = () => menu.classList.remove('show');
+    
+    searchInput.addEventListener('input', function() {
+        clearTimeout(timer);
+        const query = this.value;
+        if (query.trim().length < 2) {
+            hide();
+            return;
+        }
+        timer = setTimeout(() => {
+            // Bỏ request cũ chưa xong để kết quả không về sai thứ tự
+            if (controller) {
+                controller.abort();
+            }
+            controller = new AbortController();
+            const url = searchInput.dataset.suggestUrl + '?q=' + encodeURIComponent(query);
+            fetch(url, { signal: controller.signal })
+                .then(response => response.json())
+                .then(data => renderSuggestions(menu, data.results))
+                .catch(error => {
+                    if (error.name !== 'AbortError') {
+                        console.error('Error:', error);
+                    }
+                });
+        }, SUGGEST_DELAY);
+    });
+    
+    searchInput.addEventListener('keydown', function(e) {
+        if (e.key === 'Escape') {
+            hide();
+        }
+    });
+    
+    document.addEventListener('click', function(e) {
+        if (!searchInput.form.contains(e.target)) {
+            hide();
+        }
+    });
+}
+
+// Render suggestion links into the dropdown menu
+function renderSuggestions(menu, results) {
+    menu.innerHTML = '';
+    results.forEach(result => {
+        const link = document.createElement('a');
+        link.className = 'dropdown-item';
+        link.href = result.url;
+        const icon = document.createElement('i');
+        icon.className = `fas ${result.type === 'category' ? 'fa-folder' : 'fa-leaf'} me-2 text-success`;
+        link.appendChild(icon);
+        link.appendChild(document.createTextNode(result.name));
+        menu.appendChild(link);
+    });
+    menu.classList.toggle('show', results.length > 0);
 }
 
 // Quantity controls for product detail page
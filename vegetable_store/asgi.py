@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vegetable_store.settings')
+# Phục vụ bằng view async; đặt DJANGO_ASYNC_VIEWS=0 để quay về view đồng bộ
+os.environ.setdefault('DJANGO_ASYNC_VIEWS', '1')
+# Không giữ kết nối CSDL giữa các request (xem vegetable_store/db.py)
+os.environ['DJANGO_ASGI'] = '1'
 
 application = get_asgi_application()
@@ -0,0 +1,53 @@
+"""Cấu hình kết nối SQLite cho môi trường chạy thật.
+
+``sqlite_database()`` trả về một mục của ``settings.DATABASES`` với:
+
+* ``journal_mode=WAL``: đọc không bị chặn bởi transaction ghi (giỏ hàng) và
+  ngược lại, chỉ các lần ghi phải xếp hàng với nhau;
+* ``synchronous=NORMAL`` (an toàn với WAL), cache trang và ``mmap`` lớn hơn;
+* ``timeout``: chờ khóa ghi tối đa vài giây thay vì báo "database is locked" ngay;
+* ``transaction_mode=IMMEDIATE``: transaction lấy khóa ghi ngay khi bắt đầu, tránh
+  lỗi khóa khi một transaction đang đọc muốn nâng lên ghi;
+* ``CONN_MAX_AGE``: giữ kết nối giữa các request (có kiểm tra sức khỏe). Chỉ
+  dùng với WSGI: dưới ASGI code đồng bộ của mỗi request chạy trong một thread
+  riêng, kết nối giữ lại sẽ nằm mãi ở thread đó mà không được dùng lại hay đóng,
+  nên settings truyền ``persistent=False`` khi chạy qua asgi.py.
+
+Các PRAGMA được chạy qua ``OPTIONS['init_command']`` mỗi khi mở kết nối.
+"""
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    # Số âm là KiB: khoảng 32 MB cache trang cho mỗi kết nối
+    'cache_size': -32000,
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+}
+BUSY_TIMEOUT = 20
+CONN_MAX_AGE = 600
+
+
+def sqlite_database(name, read_only=False, persistent=True, **pragmas):
+    """Một mục ``DATABASES`` cho file SQLite ``name``.
+
+    ``read_only`` dành cho bản sao chỉ đọc: bật ``query_only``, không đổi
+    ``journal_mode`` (việc đó cần quyền ghi và do bản chính quyết định) và dùng
+    transaction ``DEFERRED``. ``persistent=False`` đóng kết nối cuối mỗi request.
+    """
+    pragmas = dict(SQLITE_PRAGMAS, **pragmas)
+    if read_only:
+        pragmas.pop('journal_mode', None)
+        pragmas['query_only'] = 'ON'
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': name,
+        'CONN_MAX_AGE': CONN_MAX_AGE if persistent else 0,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': BUSY_TIMEOUT,
+            # Bản sao chỉ đọc không được giữ khóa ghi
+            'transaction_mode': None if read_only else 'IMMEDIATE',
+            'init_command': ';'.join(f'PRAGMA {key}={value}' for key, value in pragmas.items()),
+        },
+    }
@@ -0,0 +1,322 @@
+"""Số liệu vận hành theo từng view, xuất ở ``/metrics`` theo định dạng văn bản Prometheus.
+
+``MetricsMiddleware`` ghi cho mỗi request: độ trễ (histogram), số response theo
+mã trạng thái, số truy vấn và thời gian CSDL (lấy từ ``request.query_stats`` của
+``QueryStatsMiddleware``) và hit/miss của cache trang catalog, theo tên URL đã
+resolve (``products:product_list``, ``cart:cart_view``...).
+
+Mỗi thread ghi vào bộ đệm riêng (``threading.local``) nên đường ghi không lấy
+khóa; ``/metrics`` cộng bộ đệm của mọi thread khi đọc. Bộ đệm của thread đã kết
+thúc được gộp vào một bộ đệm chung để danh sách không phình ra khi máy chủ tạo
+thread theo request.
+
+Khi chạy nhiều worker WSGI (gunicorn ``-w 4``...), đặt ``METRICS_DIR`` (biến môi
+trường ``DJANGO_METRICS_DIR``) trỏ tới một thư mục dùng chung: mỗi tiến trình ghi
+ảnh chụp số liệu của nó vào một file JSON ở đó sau mỗi ``METRICS_FLUSH_INTERVAL``
+giây (và khi thoát), worker nào trả lời ``/metrics`` cũng cộng số liệu của mọi
+tiến trình. File của worker đã chết được giữ lại để counter không bị giảm; xóa
+thư mục khi deploy lại.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from django.views.decorators.http import require_safe
+
+from .querystats import get_url_name
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNRESOLVED = 'none'
+
+# (tên, mô tả) của các counter, theo thứ tự xuất
+COUNTERS = (
+    ('django_http_responses_total', 'Số response theo view và mã trạng thái.'),
+    ('django_db_queries_total', 'Số truy vấn SQL theo view.'),
+    ('django_db_query_duration_seconds_total', 'Tổng thời gian chạy truy vấn SQL theo view.'),
+    ('django_catalog_cache_requests_total', 'Số lần tra cache trang catalog theo view và kết quả.'),
+)
+HISTOGRAM = ('django_http_request_duration_seconds', 'Độ trễ request theo view.')
+COUNTER_LABELS = {
+    'django_http_responses_total': ('view', 'status'),
+    'django_db_queries_total': ('view',),
+    'django_db_query_duration_seconds_total': ('view',),
+    'django_catalog_cache_requests_total': ('view', 'result'),
+}
+
+
+def get_buckets():
+    return tuple(getattr(settings, 'METRICS_LATENCY_BUCKETS', DEFAULT_BUCKETS))
+
+
+class _Buffer:
+    """Số liệu của một thread: ``counters[(tên, nhãn)]`` và ``histograms[view]``.
+
+    Một histogram là danh sách số lần rơi vào từng bucket (không cộng dồn, phần
+    tử cuối của các bucket là ``+Inf``) rồi tới tổng thời gian.
+    """
+
+    __slots__ = ('counters', 'histograms')
+
+    def __init__(self):
+        self.counters = defaultdict(float)
+        self.histograms = {}
+
+    def merge(self, counters, histograms):
+        for key, value in counters:
+            self.counters[key] += value
+        for view, values in histograms:
+            current = self.histograms.get(view)
+            if current is None:
+                self.histograms[view] = list(values)
+            else:
+                for index, value in enumerate(values):
+                    current[index] += value
+
+    def items(self):
+        """Bản sao để đọc từ thread khác; ``dict.copy``/``list()`` không bị chen ngang."""
+        counters = list(self.counters.copy().items())
+        histograms = [(view, list(values)) for view, values in self.histograms.copy().items()]
+        return counters, histograms
+
+
+class MetricsRegistry:
+    # Số bộ đệm tối đa trước khi gộp bộ đệm của các thread đã kết thúc
+    MAX_BUFFERS = 32
+
+    def __init__(self, buckets=None):
+        self._buckets = buckets
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._buffers = []
+        self._retired = _Buffer()
+        self._flush_lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+        # Tên file riêng cho mỗi lần chạy: pid có thể được dùng lại sau khi worker chết
+        self.process_id = '%d-%d' % (os.getpid(), time.time() * 1000)
+
+    @property
+    def buckets(self):
+        if self._buckets is None:
+            self._buckets = get_buckets()
+        return self._buckets
+
+    def _buffer(self):
+        buffer = getattr(self._local, 'buffer', None)
+        if buffer is None:
+            buffer = self._local.buffer = _Buffer()
+            with self._lock:
+                if len(self._buffers) >= self.MAX_BUFFERS:
+                    self._retire_dead()
+                self._buffers.append((threading.current_thread(), buffer))
+        return buffer
+
+    def _retire_dead(self):
+        alive = []
+        for thread, buffer in self._buffers:
+            if thread.is_alive():
+                alive.append((thread, buffer))
+            else:
+                self._retired.merge(*buffer.items())
+        self._buffers = alive
+
+    def observe(self, view, status, duration, queries=0, db_time=0.0, cache_status=None):
+        buffer = self._buffer()
+        view = view or UNRESOLVED
+        histogram = buffer.histograms.get(view)
+        if histogram is None:
+            histogram = buffer.histograms[view] = [0] * (len(self.buckets) + 1) + [0.0]
+        histogram[bisect_left(self.buckets, duration)] += 1
+        histogram[-1] += duration
+        counters = buffer.counters
+        counters['django_http_responses_total', (view, str(status))] += 1
+        counters['django_db_queries_total', (view,)] += queries
+        counters['django_db_query_duration_seconds_total', (view,)] += db_time
+        if cache_status is not None:
+            counters['django_catalog_cache_requests_total', (view, cache_status)] += 1
+
+    def snapshot(self):
+        """Số liệu cộng dồn của tiến trình này, dạng ``(counters, histograms)`` như ``_Buffer.items``."""
+        total = _Buffer()
+        with self._lock:
+            total.merge(*self._retired.items())
+            for _, buffer in self._buffers:
+                total.merge(*buffer.items())
+        return total.items()
+
+    def reset(self):
+        with self._lock:
+            self._buffers = []
+            self._retired = _Buffer()
+            self._local = threading.local()
+
+    # Nhiều tiến trình
+
+    def _path(self, directory):
+        return os.path.join(directory, 'metrics-%s.json' % self.process_id)
+
+    def flush(self, directory=None):
+        """Ghi ảnh chụp của tiến trình này vào ``directory`` (ghi file tạm rồi đổi tên)."""
+        directory = directory or getattr(settings, 'METRICS_DIR', None)
+        if not directory:
+            return
+        counters, histograms = self.snapshot()
+        data = {
+            'buckets': list(self.buckets),
+            'counters': [[name, list(labels), value] for (name, labels), value in counters],
+            'histograms': histograms,
+        }
+        path = self._path(directory)
+        temporary = '%s.tmp' % path
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+        os.replace(temporary, path)
+        self._flushed_at = time.monotonic()
+
+    def maybe_flush(self):
+        """Ghi file nếu đã quá ``METRICS_FLUSH_INTERVAL``; chỉ một thread ghi, các thread khác bỏ qua."""
+        if not getattr(settings, 'METRICS_DIR', None):
+            return
+        if time.monotonic() - self._flushed_at < getattr(settings, 'METRICS_FLUSH_INTERVAL', 10):
+            return
+        if self._flush_lock.acquire(blocking=False):
+            try:
+                self.flush()
+            finally:
+                self._flush_lock.release()
+
+    def collect(self):
+        """Số liệu của tiến trình này cộng với file của các tiến trình khác trong ``METRICS_DIR``."""
+        total = _Buffer()
+        total.merge(*self.snapshot())
+        directory = getattr(settings, 'METRICS_DIR', None)
+        if directory and os.path.isdir(directory):
+            own = os.path.basename(self._path(directory))
+            for name in sorted(os.listdir(directory)):
+                if name == own or not name.startswith('metrics-') or not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(directory, name), encoding='utf-8') as file:
+                        data = json.load(file)
+                except (OSError, ValueError):
+                    # File của tiến trình khác đang bị thay hoặc hỏng: bỏ qua lần này
+                    continue
+                if tuple(data['buckets']) != self.buckets:
+                    continue
+                total.merge(
+                    [((counter, tuple(labels)), value) for counter, labels, value in data['counters']],
+                    data['histograms'],
+                )
+        return total.items()
+
+
+registry = MetricsRegistry()
+
+
+def _flush_at_exit():
+    try:
+        registry.flush()
+    except OSError:
+        pass
+
+
+atexit.register(_flush_at_exit)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return '{%s}' % ','.join('%s="%s"' % (name, _escape(value)) for name, value in zip(names, values))
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render(counters, histograms, buckets):
+    """Định dạng văn bản Prometheus (0.0.4) của số liệu đã cộng."""
+    lines = []
+    name, help_text = HISTOGRAM
+    lines += ['# HELP %s %s' % (name, help_text), '# TYPE %s histogram' % name]
+    for view, values in sorted(histograms):
+        cumulative = 0
+        for bound, count in zip([*buckets, '+Inf'], values):
+            cumulative += count
+            le = bound if bound == '+Inf' else _number(float(bound))
+            lines.append('%s_bucket%s %d' % (name, _labels(('view', 'le'), (view, le)), cumulative))
+        lines.append('%s_sum%s %s' % (name, _labels(('view',), (view,)), _number(values[-1])))
+        lines.append('%s_count%s %d' % (name, _labels(('view',), (view,)), cumulative))
+
+    by_name = defaultdict(list)
+    for (counter, labels), value in counters:
+        by_name[counter].append((labels, value))
+    for counter, help_text in COUNTERS:
+        lines += ['# HELP %s %s' % (counter, help_text), '# TYPE %s counter' % counter]
+        for labels, value in sorted(by_name[counter]):
+            lines.append('%s%s %s' % (counter, _labels(COUNTER_LABELS[counter], labels), _number(value)))
+    return '\n'.join(lines) + '\n'
+
+
+def _allowed(request):
+    allowed = getattr(settings, 'METRICS_ALLOWED_IPS', None)
+    return allowed is None or request.META.get('REMOTE_ADDR') in allowed
+
+
+@require_safe
+def metrics_view(request):
+    if not _allowed(request):
+        return HttpResponseForbidden()
+    counters, histograms = registry.collect()
+    return HttpResponse(render(counters, histograms, registry.buckets), content_type=CONTENT_TYPE)
+
+
+class MetricsMiddleware:
+    """Đặt trước ``QueryStatsMiddleware`` để đo cả thời gian của mọi middleware
+    và đọc được ``request.query_stats``. Hỗ trợ cả WSGI và ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        response = self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        self.record(request, response, time.perf_counter() - started)
+        return response
+
+    @staticmethod
+    def record(request, response, duration):
+        query_stats = getattr(request, 'query_stats', None)
+        registry.observe(
+            get_url_name(request),
+            response.status_code,
+            duration,
+            queries=query_stats.count if query_stats else 0,
+            db_time=query_stats.duration if query_stats else 0.0,
+            cache_status=getattr(request, 'catalog_cache_status', None),
+        )
+        registry.maybe_flush()
@@ -0,0 +1,76 @@
+"""Paginator cho changelist admin của các bảng lớn.
+
+Mỗi lần mở changelist, Django chạy ``COUNT(*)`` để phân trang; trên bảng hàng
+triệu dòng (giỏ hàng, dòng giỏ hàng) câu này quét cả bảng. Khi changelist không
+lọc hay tìm kiếm, ``EstimatedCountPaginator`` dùng số dòng ước lượng của CSDL:
+``pg_class.reltuples`` trên PostgreSQL, ``sqlite_stat1`` (sau ``ANALYZE``) trên
+SQLite, hoặc ``COUNT(*)`` cả bảng lưu cache và đếm lại định kỳ khi SQLite chưa có
+thống kê. Bảng nhỏ hoặc khi có bộ lọc thì vẫn đếm chính xác. Nếu ước lượng cao
+hơn thực tế (xóa nhiều dòng, thống kê cũ) và trang yêu cầu rỗng, paginator đếm
+lại chính xác và trả về trang cuối thật. ModelAdmin dùng paginator này nên đặt
+``show_full_result_count = False`` để bỏ câu đếm thứ hai.
+"""
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from products.pagination import cached_count
+
+# Số giây giữ kết quả COUNT(*) cả bảng khi SQLite chưa có thống kê
+COUNT_CACHE_TIMEOUT = 600
+
+
+def _table_queryset(model, using):
+    return model._default_manager.using(using).all()
+
+
+def estimate_count(model, using, timeout=COUNT_CACHE_TIMEOUT):
+    """Số dòng ước lượng của bảng ``model``, hoặc ``None`` nếu CSDL không hỗ trợ."""
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+            row = cursor.fetchone()
+            # -1: bảng chưa từng được ANALYZE
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor != 'sqlite':
+            return None
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'")
+        if cursor.fetchone():
+            # Cột stat bắt đầu bằng số dòng của bảng, vd. "120000 3"
+            cursor.execute('SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = %s', [table])
+            row = cursor.fetchone()
+            if row and row[0] is not None:
+                return row[0]
+    # Chưa ANALYZE: quét cả bảng nhưng chỉ mỗi ``timeout`` giây một lần
+    return cached_count(_table_queryset(model, using), timeout)
+
+
+class EstimatedCountPaginator(Paginator):
+    # Dưới ngưỡng này đếm chính xác vẫn nhanh
+    exact_count_below = 10000
+    count_timeout = COUNT_CACHE_TIMEOUT
+    # ``count`` hiện là số ước lượng
+    estimated = False
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if hasattr(queryset, 'query') and not queryset.query.where:
+            estimate = estimate_count(queryset.model, queryset.db, self.count_timeout)
+            if estimate is not None and estimate >= self.exact_count_below:
+                self.estimated = True
+                return estimate
+        return super().count
+
+    def page(self, number):
+        page = super().page(number)
+        if self.estimated and not page.object_list:
+            # Ước lượng vượt số dòng thật: đếm lại (ghi đè cache) và lấy trang cuối thật
+            queryset = self.object_list
+            self.count = cached_count(_table_queryset(queryset.model, queryset.db), self.count_timeout, refresh=True)
+            self.estimated = False
+            self.__dict__.pop('num_pages', None)
+            page = super().page(min(page.number, self.num_pages))
+        return page
@@ -0,0 +1,194 @@
+"""Đo số truy vấn SQL theo từng view.
+
+``QueryStatsMiddleware`` ghi lại số truy vấn, tổng thời gian CSDL và các truy
+vấn lặp lại (cùng fingerprint) của mỗi request, cộng dồn theo tên URL đã
+resolve (``products:product_list``, ``cart:cart_view``...). Khi ``DEBUG`` bật,
+kết quả được trả về trong header ``X-DB-Queries``; view nào vượt ngân sách
+khai báo trong ``settings.QUERY_BUDGETS`` sẽ bị ghi cảnh báo vào log.
+
+Ngân sách chỉ tính truy vấn của chính view: các câu của session store (đọc,
+kiểm tra, tạo, lưu, xóa phiên) và câu nạp ``request.user`` theo id tùy vào việc
+khách đã đăng nhập hay chưa, còn lệnh savepoint tùy vào việc view có đang chạy
+trong transaction bên ngoài hay không (luôn có khi chạy test), nên không được
+tính. Chỉ đúng các câu đó bị bỏ qua: truy vấn khác có nhắc tới ``auth_user`` hay
+``django_session`` (JOIN với user, tìm user theo tên...) vẫn tính.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST_RE = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_SAVEPOINT_RE = re.compile(r'^\s*(?:SAVEPOINT|RELEASE SAVEPOINT|ROLLBACK TO SAVEPOINT)\b', re.IGNORECASE)
+# Câu của SessionStore (backends.db/cached_db): chỉ chạm bảng django_session
+_SESSION_RE = re.compile(
+    r'^\s*(?:SELECT\b.*?\bFROM "django_session" WHERE|INSERT INTO "django_session"'
+    r'|UPDATE "django_session" SET|DELETE FROM "django_session" WHERE)\s',
+    re.IGNORECASE | re.DOTALL,
+)
+# ``auth.get_user``: nạp user theo khóa chính
+_USER_RE = re.compile(
+    r'^\s*SELECT\b[^()]*?\bFROM "auth_user" WHERE "auth_user"\."id" = (?:%s|\?|\d+) LIMIT \d+\s*$',
+    re.IGNORECASE | re.DOTALL,
+)
+_QUALIFIED_TABLE_RE = re.compile(r'"(\w+)"\.')
+
+
+def fingerprint(sql):
+    """Chuẩn hóa câu SQL: thay hằng số bằng ``?`` và gộp danh sách ``IN (...)``."""
+    sql = _STRING_RE.sub('?', sql)
+    sql = _NUMBER_RE.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    return _IN_LIST_RE.sub('IN (...)', sql)
+
+
+def counts_toward_budget(sql):
+    """Câu SQL có tính vào ngân sách không (xem docstring của module)."""
+    if _SAVEPOINT_RE.match(sql):
+        return False
+    sql = _STRING_RE.sub('?', sql)
+    if _USER_RE.match(sql):
+        return False
+    return not (
+        _SESSION_RE.match(sql)
+        and sql.upper().count('SELECT') <= 1
+        and ' JOIN ' not in sql.upper()
+        and set(_QUALIFIED_TABLE_RE.findall(sql)) <= {'django_session'}
+    )
+
+
+class QueryRecorder:
+    """``execute_wrapper`` đếm truy vấn, thời gian và fingerprint."""
+
+    def __init__(self):
+        self.count = 0
+        # Số truy vấn tính vào ngân sách (bỏ session, nạp request.user và savepoint)
+        self.budgeted = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+            if counts_toward_budget(sql):
+                self.budgeted += 1
+            self.fingerprints[fingerprint(sql)] += 1
+
+    @property
+    def duplicates(self):
+        """Các fingerprint chạy nhiều hơn một lần trong cùng request."""
+        return {sql: n for sql, n in self.fingerprints.items() if n > 1}
+
+    def header_value(self):
+        return '%d; time=%.2fms; duplicates=%d' % (
+            self.count, self.duration * 1000, sum(n - 1 for n in self.duplicates.values())
+        )
+
+
+class QueryStatsRegistry:
+    """Thống kê cộng dồn theo tên URL trong tiến trình hiện tại."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, url_name, recorder):
+        with self._lock:
+            stats = self._stats.setdefault(url_name, {
+                'requests': 0, 'queries': 0, 'db_time': 0.0, 'max_queries': 0,
+                'duplicates': Counter(),
+            })
+            stats['requests'] += 1
+            stats['queries'] += recorder.count
+            stats['db_time'] += recorder.duration
+            stats['max_queries'] = max(stats['max_queries'], recorder.count)
+            stats['duplicates'].update(recorder.duplicates)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: dict(stats, duplicates=dict(stats['duplicates']))
+                for name, stats in self._stats.items()
+            }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+registry = QueryStatsRegistry()
+
+
+def get_url_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else None
+
+
+class QueryStatsMiddleware:
+    """Đặt đầu ``MIDDLEWARE`` để tính cả truy vấn của session/auth.
+
+    Hỗ trợ cả WSGI và ASGI. Kết nối CSDL gắn với từng thread, nên dưới ASGI bộ
+    đếm được gắn vào kết nối của thread chạy ``sync_to_async`` của request (mỗi
+    request có thread riêng nhờ ``ThreadSensitiveContext`` của Django).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        with self.recording(recorder):
+            response = self.get_response(request)
+        return self.finish(request, response, recorder)
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        stack = await sync_to_async(self.recording)(recorder)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(stack.close)()
+        return self.finish(request, response, recorder)
+
+    @staticmethod
+    def recording(recorder):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def finish(self, request, response, recorder):
+        request.query_stats = recorder
+
+        url_name = get_url_name(request)
+        registry.record(url_name, recorder)
+        budget = getattr(settings, 'QUERY_BUDGETS', {}).get(url_name)
+        if budget is not None and recorder.budgeted > budget:
+            logger.warning(
+                '%s chạy %d truy vấn (không tính session/request.user), vượt ngân sách %d (%s)',
+                url_name, recorder.budgeted, budget, request.path,
+            )
+        if settings.DEBUG:
+            response['X-DB-Queries'] = recorder.header_value()
+        return response
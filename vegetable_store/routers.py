@@ -0,0 +1,128 @@
+"""Chia truy vấn đọc catalog sang bản sao chỉ đọc.
+
+``CatalogReplicaRouter`` gửi truy vấn đọc của các app trong
+``settings.REPLICA_APPS`` (mặc định ``products``) tới alias
+``settings.CATALOG_READ_DATABASE``; mọi thao tác ghi (giỏ hàng, sản phẩm) vẫn
+đi vào ``default``. Đọc được chuyển về ``default`` khi:
+
+* đang ở trong transaction trên ``default`` (đọc rồi ghi phải nhất quán);
+* trong khối ``with use_primary():``;
+* request hiện tại đã ghi, hoặc request trước đó của cùng trình duyệt vừa ghi
+  trong vòng ``settings.PRIMARY_PIN_SECONDS`` giây (cookie do
+  ``PrimaryPinMiddleware`` đặt), để người dùng thấy ngay thay đổi của mình dù
+  bản sao còn trễ.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PIN_COOKIE_NAME = 'db_pin'
+
+# Trạng thái của request hiện tại: {'pinned': bool, 'wrote': bool}; None ngoài request
+_state = ContextVar('db_routing_state', default=None)
+
+
+def replica_alias():
+    return getattr(settings, 'CATALOG_READ_DATABASE', DEFAULT_DB_ALIAS)
+
+
+def replica_enabled():
+    return replica_alias() != DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_primary():
+    """Đọc từ ``default`` trong khối này (ví dụ ngay sau khi ghi ngoài request)."""
+    state = _state.get()
+    if state is None:
+        token = _state.set({'pinned': True, 'wrote': False})
+        try:
+            yield
+        finally:
+            _state.reset(token)
+        return
+    pinned = state['pinned']
+    state['pinned'] = True
+    try:
+        yield
+    finally:
+        # Đã ghi trong khối thì phần còn lại của request vẫn đọc từ bản chính
+        state['pinned'] = pinned or state['wrote']
+
+
+class CatalogReplicaRouter:
+    def routed(self, model):
+        return model._meta.app_label in getattr(settings, 'REPLICA_APPS', ('products',))
+
+    def db_for_read(self, model, **hints):
+        if not replica_enabled() or not self.routed(model):
+            return None
+        state = _state.get()
+        if (state is not None and state['pinned']) or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Phần còn lại của request (và vài giây sau đó) đọc từ bản chính
+            state['wrote'] = state['pinned'] = True
+        # Đối tượng đọc từ bản sao vẫn phải được lưu vào bản chính
+        return DEFAULT_DB_ALIAS if self.routed(model) else None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Bản sao là bản chép của file chính, không chạy migration riêng
+        if replica_enabled() and db == replica_alias():
+            return False
+        return None
+
+
+class PrimaryPinMiddleware:
+    """Đặt trước ``SessionMiddleware`` để tính cả việc ghi session."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token, state = self.start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(response, state)
+
+    async def __acall__(self, request):
+        token, state = self.start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.finish(response, state)
+
+    def start(self, request):
+        state = {'pinned': PIN_COOKIE_NAME in request.COOKIES, 'wrote': False}
+        return _state.set(state), state
+
+    def finish(self, response, state):
+        if state['wrote'] and replica_enabled():
+            response.set_cookie(
+                PIN_COOKIE_NAME, '1', max_age=getattr(settings, 'PRIMARY_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax', secure=settings.SESSION_COOKIE_SECURE,
+            )
+        return response
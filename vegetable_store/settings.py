@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from vegetable_store.db import sqlite_database
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -39,20 +42,31 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
     'products',
     'cart',
+    'checkout',
 ]
 
 MIDDLEWARE = [
+    'vegetable_store.metrics.MetricsMiddleware',
+    'vegetable_store.querystats.QueryStatsMiddleware',
+    'vegetable_store.routers.PrimaryPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'cart.middleware.CartMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'vegetable_store.urls'
 
+# View async (ORM async) cho catalog và endpoint JSON của giỏ hàng. asgi.py bật
+# mặc định qua biến môi trường; chạy WSGI thì giữ view đồng bộ.
+ASYNC_VIEWS = os.environ.get('DJANGO_ASYNC_VIEWS', '0') == '1'
+# asgi.py đặt DJANGO_ASGI=1: khi đó không giữ kết nối CSDL giữa các request
+ASGI = os.environ.get('DJANGO_ASGI') == '1'
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
@@ -74,13 +88,24 @@ WSGI_APPLICATION = 'vegetable_store.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# WAL, PRAGMA, busy timeout và kết nối lâu dài (chỉ với WSGI): xem vegetable_store/db.py
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': sqlite_database(BASE_DIR / 'db.sqlite3', persistent=not ASGI),
 }
 
+# Bản sao chỉ đọc cho catalog (file SQLite được chép/đồng bộ từ bản chính):
+# đặt DJANGO_REPLICA_DB=<đường dẫn> để bật. Xem vegetable_store/routers.py
+if os.environ.get('DJANGO_REPLICA_DB'):
+    DATABASES['replica'] = dict(
+        sqlite_database(os.environ['DJANGO_REPLICA_DB'], read_only=True, persistent=not ASGI),
+        TEST={'MIRROR': 'default'},
+    )
+DATABASE_ROUTERS = ['vegetable_store.routers.CatalogReplicaRouter']
+CATALOG_READ_DATABASE = 'replica' if 'replica' in DATABASES else 'default'
+REPLICA_APPS = ('products',)
+# Sau khi ghi, trình duyệt đó đọc từ bản chính trong ngần ấy giây
+PRIMARY_PIN_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -120,12 +145,93 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
+# collectstatic ghi vào đây: tên có hash, CSS/JS rút gọn, bản .gz/.br nén sẵn;
+# wsgi.py phục vụ thư mục này với Cache-Control immutable (xem vegetable_store/staticfiles.py)
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+# Cache-Control của file static không có hash trong tên
+STATIC_MAX_AGE = 60
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'vegetable_store.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
 
 # Media files
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Ảnh thu nhỏ WebP/JPEG trong MEDIA_ROOT/variants (xem products/images.py);
+# tắt thì template dùng ảnh gốc
+IMAGE_VARIANTS_ENABLED = True
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Trang, fragment và số phiên bản của catalog (xem products/cache.py). Bắt buộc dùng
+    # chung giữa mọi tiến trình (các worker, lệnh import_catalog...), nếu không việc
+    # vô hiệu hóa chỉ có tác dụng trong tiến trình đã ghi; chạy nhiều máy thì dùng Redis.
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CATALOG_CACHE_DIR') or BASE_DIR / 'var' / 'catalog-cache',
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Catalog
+# Phân trang danh sách sản phẩm: 'cursor' (keyset, không COUNT/OFFSET) hoặc 'offset'
+PRODUCT_PAGINATION = 'cursor'
+
+# Cache trang catalog cho khách chưa đăng nhập (xem products/cache.py)
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CACHE_TIMEOUT = 600
+# Số phiên bản hết hạn sau chừng này giây kể từ lần tăng cuối: chặn thời gian một
+# trang/ETag cũ còn được dùng nếu cache lỡ không được dùng chung
+CATALOG_VERSION_TIMEOUT = 600
+
+# Cart
+# Giỏ hàng của khách: 'cookie' (cookie ký số, không ghi CSDL) hoặc 'database' (Cart theo session)
+CART_ANONYMOUS_STORAGE = 'cookie'
+CART_COOKIE_NAME = 'cart'
+CART_COOKIE_AGE = 60 * 60 * 24 * 30
+
+# Số truy vấn SQL tối đa của mỗi view (xem vegetable_store/querystats.py), không
+# tính câu của session store, câu nạp request.user và lệnh savepoint. Với giỏ
+# hàng là trường hợp giỏ CSDL (đã đăng nhập) kể cả lần đầu tạo giỏ; giỏ cookie
+# của khách tốn ít hơn nhiều
+QUERY_BUDGETS = {
+    'products:home': 2,
+    'products:product_list': 4,  # 3 khi không tìm kiếm
+    'products:product_detail': 3,  # 2 khi đã có gợi ý tính sẵn, thêm 1 nếu phải lấy theo danh mục
+    'products:category_detail': 2,
+    'products:suggest': 2,  # chỉ lần dựng chỉ mục đầu tiên; sau đó 0
+    'products:api:product_list': 2,
+    'products:api:product_detail': 2,
+    'products:api:category_list': 2,
+    'products:api:category_detail': 3,
+    'cart:cart_view': 3,
+    'cart:add_to_cart': 6,
+    'cart:update_cart_item': 5,
+    'cart:remove_from_cart': 5,
+    'cart:batch_update': 9,  # lô 4 thao tác; mỗi thao tác là 1 câu lệnh (xóa dòng: 2)
+}
+
+# Số liệu Prometheus ở /metrics (xem vegetable_store/metrics.py). Chạy nhiều worker
+# thì đặt DJANGO_METRICS_DIR là thư mục dùng chung để cộng số liệu mọi tiến trình.
+METRICS_DIR = os.environ.get('DJANGO_METRICS_DIR') or None
+METRICS_FLUSH_INTERVAL = 10
+# Địa chỉ được đọc /metrics (None là không giới hạn); thêm IP của máy Prometheus
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
@@ -0,0 +1,368 @@
+"""Static cho môi trường chạy thật: tên file có hash, rút gọn, nén sẵn và cache lâu.
+
+``collectstatic`` với ``CompressedManifestStaticFilesStorage``:
+
+1. CSS/JS được rút gọn (bỏ comment, khoảng trắng thừa; JS giữ nguyên xuống
+   dòng để không đụng tới quy tắc tự chèn ``;``) trước khi tính hash;
+2. ``ManifestStaticFilesStorage`` chép file vào ``STATIC_ROOT`` kèm bản có hash
+   nội dung trong tên (``css/style.3f2a….css``) và ghi ``staticfiles.json``;
+   ``{% static %}`` trả về tên có hash. Hash tính trên đúng byte được phục vụ,
+   nên đổi bộ rút gọn cũng sinh tên mới;
+3. mọi file dạng văn bản được nén sẵn thành ``.gz`` và, nếu cài gói ``brotli``,
+   ``.br`` ở mức nén cao nhất, để lúc phục vụ không phải nén.
+
+``StaticFilesApplication`` bọc ứng dụng WSGI (xem ``wsgi.py``): duyệt
+``STATIC_ROOT`` một lần khi khởi động, trả file ``.br``/``.gz`` theo
+``Accept-Encoding`` và đặt ``Cache-Control: immutable`` một năm cho file có hash,
+nên tải lại trang không tải lại byte static nào. Đường dẫn không có trong
+``STATIC_ROOT`` được chuyển cho Django.
+"""
+import gzip
+import mimetypes
+import os
+import re
+from email.utils import formatdate, parsedate_to_datetime
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.map', '.svg', '.json', '.txt', '.html', '.xml', '.ico')
+# Bỏ file nén nếu tiết kiệm ít hơn chừng này so với bản gốc
+MIN_SAVING = 0.05
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+CHUNK_SIZE = 64 * 1024
+
+# Khoảng trắng cạnh các ký tự này là thừa (không có + - / . vì ``a + +b``, regex, ``1 .x``)
+_JS_TIGHT = frozenset('{}()[];,:=<>!?&|*%^~')
+# Sau các ký tự này, ``/`` mở đầu một regex thay vì phép chia
+_JS_REGEX_AFTER = frozenset('(,=:[!&|?{};+-*%<>~^')
+_JS_REGEX_KEYWORD_RE = re.compile(r'(?:^|[^\w$])(?:return|typeof|case|do|else|in|of|void|delete|new|throw)$')
+# ``a++ / 2``: ``++``/``--`` hậu tố kết thúc một biểu thức, ``/`` sau nó là phép chia
+_JS_POSTFIX_RE = re.compile(r'[\w$)\]](?:\+\+|--)$')
+# CSS: bỏ khoảng trắng sau ``:``/``(`` nhưng không trước ``:`` (``div :hover`` khác ``div:hover``)
+_CSS_TIGHT_AFTER = frozenset('{};,>~:(')
+_CSS_TIGHT_BEFORE = frozenset('{};,>~)')
+
+
+def _string_end(source, start):
+    """Vị trí ngay sau chuỗi bắt đầu ở ``start``; template literal có thể lồng ``${`...`}``."""
+    quote = source[start]
+    i, n = start + 1, len(source)
+    while i < n:
+        c = source[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == quote:
+            return i + 1
+        if quote == '`' and source.startswith('${', i):
+            i = _template_expression_end(source, i + 2)
+            continue
+        if c == '\n' and quote != '`':
+            # Chuỗi không đóng: dừng ở cuối dòng, phần còn lại giữ nguyên
+            return i
+        i += 1
+    return n
+
+
+def _template_expression_end(source, start):
+    depth, i, n = 1, start, len(source)
+    while i < n and depth:
+        c = source[i]
+        if c in '\'"`':
+            i = _string_end(source, i)
+            continue
+        if c == '{':
+            depth += 1
+        elif c == '}':
+            depth -= 1
+        i += 1
+    return i
+
+
+def _regex_end(source, start):
+    """Vị trí ngay sau regex literal (kể cả cờ), hoặc ``None`` nếu không phải regex."""
+    i, n, in_class = start + 1, len(source), False
+    while i < n:
+        c = source[i]
+        if c == '\\':
+            i += 2
+            continue
+        if c == '\n':
+            return None
+        if c == '[':
+            in_class = True
+        elif c == ']':
+            in_class = False
+        elif c == '/' and not in_class:
+            i += 1
+            while i < n and (source[i].isalnum() or source[i] == '_'):
+                i += 1
+            return i
+        i += 1
+    return None
+
+
+def _slash_starts_regex(out):
+    """``/`` mở đầu regex literal hay là phép chia, theo phần đã xuất trước nó."""
+    if not out:
+        return True
+    tail = ''.join(out[-12:])
+    if _JS_POSTFIX_RE.search(tail):
+        return False
+    return tail[-1] in _JS_REGEX_AFTER or bool(_JS_REGEX_KEYWORD_RE.search(tail))
+
+
+def _minify(source, tight_after, tight_before, keep_newlines, regex=False):
+    """Bỏ comment và khoảng trắng thừa ngoài chuỗi (và regex literal nếu ``regex``)."""
+    out = []
+    pending = None
+    i, n = 0, len(source)
+
+    def flush(next_char):
+        if pending is None or not out:
+            return
+        prev = out[-1][-1]
+        if pending == '\n':
+            if prev not in '{[(,;' and next_char not in '}])':
+                out.append('\n')
+        elif prev not in tight_after and next_char not in tight_before:
+            out.append(' ')
+
+    while i < n:
+        c = source[i]
+        if c.isspace():
+            if keep_newlines and c == '\n':
+                pending = '\n'
+            elif pending is None:
+                pending = ' '
+            i += 1
+        elif source.startswith('/*', i):
+            end = source.find('*/', i + 2)
+            end = n if end < 0 else end + 2
+            if keep_newlines and '\n' in source[i:end]:
+                pending = '\n'
+            elif pending is None:
+                pending = ' '
+            i = end
+        elif regex and source.startswith('//', i):
+            end = source.find('\n', i)
+            i = n if end < 0 else end
+        else:
+            if c in '\'"' or (regex and c == '`'):
+                end = _string_end(source, i)
+            elif regex and c == '/' and _slash_starts_regex(out):
+                end = _regex_end(source, i) or i + 1
+            else:
+                end = i + 1
+            flush(c)
+            pending = None
+            if c == '}' and not keep_newlines and out and out[-1] == ';':
+                out.pop()
+            out.append(source[i:end])
+            i = end
+    return ''.join(out)
+
+
+def minify_css(source):
+    return _minify(source, _CSS_TIGHT_AFTER, _CSS_TIGHT_BEFORE, keep_newlines=False)
+
+
+def minify_js(source):
+    """Rút gọn an toàn: bỏ comment, thụt lề, dòng trống; không đổi tên hay nối dòng."""
+    return _minify(source, _JS_TIGHT, _JS_TIGHT, keep_newlines=True, regex=True)
+
+
+MINIFIERS = {'.css': minify_css, '.js': minify_js}
+
+
+def compress(data):
+    """``{đuôi file: dữ liệu nén}`` đáng giữ của ``data`` (gzip luôn có, brotli nếu đã cài)."""
+    variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['.br'] = brotli.compress(data, quality=11)
+    return {
+        extension: compressed for extension, compressed in variants.items()
+        if len(compressed) <= len(data) * (1 - MIN_SAVING)
+    }
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """``ManifestStaticFilesStorage`` rút gọn CSS/JS trước khi hash và nén sẵn file văn bản.
+
+    Khi chưa chạy ``collectstatic`` (dev, test) thì không có manifest và
+    ``{% static %}`` trả về tên gốc thay vì báo lỗi.
+    """
+
+    def stored_name(self, name):
+        if not self.hashed_files:
+            return name
+        return super().stored_name(name)
+
+    def post_process(self, paths, dry_run=False, **options):
+        if not dry_run:
+            paths = self.minify_files(paths)
+        hashed = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(hashed | set(paths)):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(name):
+                self.compress_file(name)
+
+    def minify_files(self, paths):
+        """Ghi bản rút gọn của CSS/JS vào ``STATIC_ROOT`` (tên gốc) và trả về ``paths``
+        trỏ tới bản đó, để bước hash đọc đúng nội dung sẽ được phục vụ."""
+        paths = dict(paths)
+        for name, (storage, path) in sorted(paths.items()):
+            minifier = MINIFIERS.get(os.path.splitext(name)[1])
+            # File ``.min.`` của thư viện đã được rút gọn
+            if minifier is None or '.min.' in name:
+                continue
+            # Luôn đọc từ nguồn: bản trong STATIC_ROOT có thể đã rút gọn ở lần chạy trước
+            with storage.open(path) as file:
+                content = file.read().decode('utf-8')
+            if self.exists(name):
+                self.delete(name)
+            self._save(name, ContentFile(minifier(content).encode('utf-8')))
+            paths[name] = (self, name)
+        return paths
+
+    def compress_file(self, name):
+        with self.open(name) as file:
+            data = file.read()
+        for extension, compressed in compress(data).items():
+            if self.exists(name + extension):
+                self.delete(name + extension)
+            self._save(name + extension, ContentFile(compressed))
+
+
+def _accepted_encodings(header):
+    """Các mã hóa trong ``Accept-Encoding`` có ``q`` khác 0."""
+    accepted = set()
+    for part in header.split(','):
+        token, _, params = part.strip().partition(';')
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+class StaticFile:
+    """Một file trong ``STATIC_ROOT`` cùng các bản nén sẵn, theo thứ tự ưu tiên."""
+
+    ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+    def __init__(self, path, cache_control):
+        self.variants = []
+        for encoding, extension in self.ENCODINGS:
+            if os.path.isfile(path + extension):
+                self.variants.append((encoding, path + extension, os.stat(path + extension)))
+        self.variants.append((None, path, os.stat(path)))
+        content_type, _ = mimetypes.guess_type(path)
+        if content_type is None:
+            content_type = 'application/octet-stream'
+        elif content_type.startswith('text/') or content_type in ('application/javascript', 'application/json'):
+            content_type += '; charset=utf-8'
+        mtime = self.variants[-1][2].st_mtime
+        self.last_modified = int(mtime)
+        self.headers = [
+            ('Content-Type', content_type),
+            ('Cache-Control', cache_control),
+            ('Last-Modified', formatdate(mtime, usegmt=True)),
+        ]
+        if len(self.variants) > 1:
+            self.headers.append(('Vary', 'Accept-Encoding'))
+
+    def choose(self, accept_encoding):
+        accepted = _accepted_encodings(accept_encoding)
+        for encoding, path, stat in self.variants:
+            if encoding is None or encoding in accepted:
+                etag = '"%x-%x%s"' % (int(stat.st_mtime), stat.st_size, '-' + encoding if encoding else '')
+                return encoding, path, stat.st_size, etag
+
+
+class StaticFilesApplication:
+    """Bọc ứng dụng WSGI, phục vụ ``STATIC_URL`` từ ``STATIC_ROOT`` đã ``collectstatic``."""
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = str(root or settings.STATIC_ROOT or '')
+        self.prefix = '/' + (prefix or settings.STATIC_URL).strip('/') + '/'
+        self.files = self.scan() if self.root and os.path.isdir(self.root) else {}
+
+    def scan(self):
+        storage = ManifestStaticFilesStorage(location=self.root)
+        hashed = set(storage.hashed_files.values())
+        max_age = getattr(settings, 'STATIC_MAX_AGE', 60)
+        files = {}
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.endswith(('.gz', '.br', '.tmp')):
+                    continue
+                path = os.path.join(directory, name)
+                relative = os.path.relpath(path, self.root).replace(os.sep, '/')
+                # Chỉ file có hash mới cache vĩnh viễn; tên gốc đổi nội dung sau mỗi lần deploy
+                cache_control = IMMUTABLE_CACHE_CONTROL if relative in hashed else 'public, max-age=%d' % max_age
+                files[self.prefix + relative] = StaticFile(path, cache_control)
+        return files
+
+    def __call__(self, environ, start_response):
+        static_file = self.files.get(environ.get('PATH_INFO', ''))
+        if static_file is None or environ['REQUEST_METHOD'] not in ('GET', 'HEAD'):
+            return self.application(environ, start_response)
+        return self.serve(static_file, environ, start_response)
+
+    def serve(self, static_file, environ, start_response):
+        encoding, path, size, etag = static_file.choose(environ.get('HTTP_ACCEPT_ENCODING', ''))
+        headers = static_file.headers + [('ETag', etag)]
+        if self.not_modified(static_file, etag, environ):
+            start_response('304 Not Modified', headers)
+            return []
+        headers.append(('Content-Length', str(size)))
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        start_response('200 OK', headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return []
+        file = open(path, 'rb')
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None:
+            return file_wrapper(file, CHUNK_SIZE)
+        return _read_chunks(file)
+
+    @staticmethod
+    def not_modified(static_file, etag, environ):
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            return if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]
+        if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= static_file.last_modified
+            except (TypeError, ValueError):
+                return False
+        return False
+
+
+def _read_chunks(file):
+    with file:
+        while True:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
@@ -0,0 +1,124 @@
+"""Đo thời gian render template theo từng template, ``{% include %}``/thẻ và biến.
+
+``profile_templates()`` là context manager: trong khối ``with``, mọi lần render
+của thread hiện tại được ghi lại theo ``(template, nút)``, với nút là tên thẻ
+(``for``, ``include``, ``product_card``...) hoặc biểu thức ``{{ ... }}``::
+
+    with profile_templates() as profiler:
+        client.get('/products/')
+    print(profiler.format_report())
+
+Thời gian "riêng" của một nút không tính các nút con (``{% for %}`` chỉ còn chi
+phí vòng lặp), nên sắp theo nó là thấy ngay thẻ/biến nào tốn CPU. Lần dùng đầu
+tiên thay ``Template._render`` và ``Node.render_annotated`` bằng bản có đo; ngoài
+khối ``with`` bản thay chỉ tốn một lần đọc ``threading.local``. Dùng cho
+benchmark (``python -m benchmarks --profile-templates``) và khi điều tra, không
+bật trong môi trường chạy thật.
+"""
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.template.base import Node, Template, VariableNode
+
+_local = threading.local()
+_install_lock = threading.Lock()
+
+
+class TemplateProfiler:
+    def __init__(self):
+        # (template, nút) -> [số lần, tổng thời gian, thời gian riêng]
+        self.stats = defaultdict(lambda: [0, 0.0, 0.0])
+        self._children = []
+
+    def measure(self, key, render, *args):
+        self._children.append(0.0)
+        started = time.perf_counter()
+        try:
+            return render(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = self._children.pop()
+            if self._children:
+                self._children[-1] += elapsed
+            stats = self.stats[key]
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] += elapsed - children
+
+    def report(self, limit=None):
+        """Các dòng ``{template, node, calls, total_ms, self_ms}`` theo thời gian riêng giảm dần."""
+        rows = [
+            {
+                'template': template, 'node': node, 'calls': calls,
+                'total_ms': round(total * 1000, 3), 'self_ms': round(own * 1000, 3),
+            }
+            for (template, node), (calls, total, own) in self.stats.items()
+        ]
+        rows.sort(key=lambda row: row['self_ms'], reverse=True)
+        return rows[:limit]
+
+    def format_report(self, limit=20):
+        lines = ['%10s %10s %7s  %s' % ('riêng ms', 'tổng ms', 'lần', 'template / nút')]
+        for row in self.report(limit):
+            lines.append('%10.2f %10.2f %7d  %s  %s' % (
+                row['self_ms'], row['total_ms'], row['calls'], row['template'], row['node'],
+            ))
+        return '\n'.join(lines)
+
+
+def _template_name(origin):
+    return getattr(origin, 'template_name', None) or getattr(origin, 'name', None) or '<string>'
+
+
+def _node_label(node):
+    if isinstance(node, VariableNode):
+        return '{{ %s }}' % node.filter_expression.token
+    token = getattr(node, 'token', None)
+    if token is not None and token.contents:
+        return '{%% %s %%}' % token.contents.split()[0]
+    return type(node).__name__
+
+
+def _install():
+    # Kiểm tra chính hàm đang gắn chứ không dùng cờ: môi trường test của Django
+    # thay ``Template._render`` khi bắt đầu và trả lại bản gốc khi kết thúc
+    with _install_lock:
+        if getattr(Template._render, 'profiled', False) and getattr(Node.render_annotated, 'profiled', False):
+            return
+        template_render = Template._render
+        node_render = Node.render_annotated
+
+        def profiled_template_render(self, context):
+            profiler = getattr(_local, 'profiler', None)
+            if profiler is None:
+                return template_render(self, context)
+            return profiler.measure((_template_name(self.origin), '(template)'), template_render, self, context)
+
+        def profiled_render_annotated(self, context):
+            profiler = getattr(_local, 'profiler', None)
+            if profiler is None:
+                return node_render(self, context)
+            key = (_template_name(getattr(self, 'origin', None)), _node_label(self))
+            return profiler.measure(key, node_render, self, context)
+
+        if not getattr(template_render, 'profiled', False):
+            profiled_template_render.profiled = True
+            Template._render = profiled_template_render
+        if not getattr(node_render, 'profiled', False):
+            profiled_render_annotated.profiled = True
+            Node.render_annotated = profiled_render_annotated
+
+
+@contextmanager
+def profile_templates(profiler=None):
+    """Ghi thời gian render của thread hiện tại vào ``profiler`` (mặc định một profiler mới)."""
+    _install()
+    profiler = profiler or TemplateProfiler()
+    previous = getattr(_local, 'profiler', None)
+    _local.profiler = profiler
+    try:
+        yield profiler
+    finally:
+        _local.profiler = previous
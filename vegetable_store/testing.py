@@ -0,0 +1,86 @@
+"""Tiện ích kiểm thử ngân sách truy vấn và kế hoạch truy vấn của view."""
+import re
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+from .querystats import counts_toward_budget
+
+
+class QueryBudgetMixin:
+    """Mixin cho ``TestCase``: báo lỗi khi view chạy quá số truy vấn cho phép.
+
+    Ngân sách lấy từ ``settings.QUERY_BUDGETS`` theo tên URL, hoặc truyền
+    trực tiếp qua ``budget=``; như ``QueryStatsMiddleware``, ``assertQueryBudget``
+    không tính câu của session store, câu nạp ``request.user`` và lệnh savepoint.
+    """
+
+    @contextmanager
+    def assertMaxQueries(self, limit, using='default', budgeted_only=False):
+        with CaptureQueriesContext(connections[using]) as context:
+            yield context
+        queries = context.captured_queries
+        if budgeted_only:
+            queries = [query for query in queries if counts_toward_budget(query['sql'])]
+        executed = len(queries)
+        if executed > limit:
+            queries = '\n'.join(
+                '%d. %s' % (i, query['sql'])
+                for i, query in enumerate(queries, start=1)
+            )
+            self.fail('%d truy vấn, vượt giới hạn %d:\n%s' % (executed, limit, queries))
+
+    def assertQueryBudget(self, url, method='get', data=None, budget=None, **extra):
+        """Gọi ``url`` bằng ``self.client`` và kiểm tra ngân sách truy vấn; trả về response."""
+        url_name = resolve(urlsplit(url).path).view_name
+        if budget is None:
+            budget = settings.QUERY_BUDGETS[url_name]
+        with self.assertMaxQueries(budget, budgeted_only=True):
+            response = getattr(self.client, method)(url, data, **extra)
+        return response
+
+
+_FULL_SCAN_RE = re.compile(r'\bSCAN (\w+)\b(?! USING)')
+
+
+class QueryPlanMixin:
+    """Mixin cho ``TestCase``: chạy ``EXPLAIN QUERY PLAN`` (SQLite) cho mọi câu
+    SELECT một view thực hiện và báo lỗi nếu có bảng lớn bị quét toàn bộ.
+    """
+
+    # Các bảng có thể rất lớn; bảng nhỏ như danh mục được phép quét
+    scan_checked_tables = ('products_product', 'cart_cart', 'cart_cartitem', 'django_session')
+
+    def explain(self, sql, using='default'):
+        with connections[using].cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return '\n'.join(row[-1] for row in cursor.fetchall())
+
+    def query_plans(self, url, method='get', data=None, using='default', **extra):
+        """Gọi ``url`` và trả về danh sách ``(sql, kế hoạch)`` của các câu SELECT."""
+        with CaptureQueriesContext(connections[using]) as context:
+            getattr(self.client, method)(url, data, **extra)
+        return [
+            (query['sql'], self.explain(query['sql'], using))
+            for query in context.captured_queries
+            if query['sql'].lstrip().upper().startswith('SELECT')
+        ]
+
+    def assertPlansHaveNoFullScans(self, plans, tables=None, msg=''):
+        tables = set(tables or self.scan_checked_tables)
+        for sql, plan in plans:
+            scanned = set(_FULL_SCAN_RE.findall(plan)) & tables
+            if scanned:
+                self.fail('Quét toàn bảng %s%s:\n%s\n%s' % (', '.join(sorted(scanned)), msg, sql, plan))
+
+    def assertNoFullScans(self, url, method='get', data=None, tables=None, using='default', **extra):
+        """Gọi ``url`` và báo lỗi nếu có câu SELECT quét toàn bộ một bảng lớn."""
+        if connections[using].vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN chỉ kiểm tra trên SQLite')
+        plans = self.query_plans(url, method, data, using=using, **extra)
+        self.assertPlansHaveNoFullScans(plans, tables, ' khi gọi %s' % url)
+        return plans
@@ -0,0 +1,19 @@
+"""URLconf luôn dùng view async, bất kể ``settings.ASYNC_VIEWS``.
+
+Dùng cho test (``override_settings(ROOT_URLCONF=...)``) và benchmark ASGI để
+so sánh hai đường đi trong cùng một tiến trình.
+"""
+from django.contrib import admin
+from django.urls import path, include
+
+from cart import async_views as cart_views, urls as cart_urls
+from products import async_views as product_views, urls as product_urls
+from . import metrics
+
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include((product_urls.build_urlpatterns(product_views), 'products'))),
+    path('cart/', include((cart_urls.build_urlpatterns(cart_views), 'cart'))),
+    path('checkout/', include('checkout.urls')),
+    path('metrics', metrics.metrics_view, name='metrics'),
+]
@@ -0,0 +1,13 @@
+"""Tiện ích dùng chung cho các app."""
+
+
+def chunked(iterable, size):
+    """Chia ``iterable`` thành các list tối đa ``size`` phần tử (list cuối có thể ngắn hơn)."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
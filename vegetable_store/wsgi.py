@@ -11,6 +11,9 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from vegetable_store.staticfiles import StaticFilesApplication
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'vegetable_store.settings')
 
-application = get_wsgi_application()
+# Phục vụ STATIC_URL từ STATIC_ROOT (chạy collectstatic trước khi khởi động)
+application = StaticFilesApplication(get_wsgi_application())